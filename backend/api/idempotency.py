@@ -0,0 +1,106 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from models.models import IdempotencyKey, Run
+
+
+async def request_fingerprint(request: Request) -> str:
+    """Hash of what makes two requests "the same": method, path, query and body."""
+    body = await request.body()
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.url.path}?{request.url.query}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+async def claim_idempotency_key(
+    db: AsyncSession, scope: str, key: str, fingerprint: str
+) -> tuple[Optional[IdempotencyKey], Optional[Run]]:
+    """Reserve `key` for a new request, or find the run an earlier request created.
+
+    Returns `(record, None)` when the caller should go ahead and create a run
+    (then call `bind_idempotency_key`), or `(None, run)` to replay an earlier one.
+    Raises 422 if the key was used with a different payload and 409 if the first
+    request with this key has not created its run yet. A claim left unbound for
+    IDEMPOTENCY_CLAIM_STALE_SECONDS (the request crashed between claim and bind)
+    is taken over by the next retry.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    existing = await db.get(IdempotencyKey, (scope, key))
+    if existing and existing.expires_at <= now:
+        await db.delete(existing)
+        await db.commit()
+        existing = None
+
+    if existing is None:
+        record = IdempotencyKey(
+            scope=scope, key=key, request_hash=fingerprint,
+            expires_at=now + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS),
+        )
+        db.add(record)
+        try:
+            await db.commit()
+            return record, None
+        except IntegrityError:
+            # A concurrent request with the same key won the insert
+            await db.rollback()
+            existing = await db.get(IdempotencyKey, (scope, key))
+            if existing is None:
+                raise HTTPException(409, "Idempotency-Key is being processed, retry later")
+
+    if existing.request_hash != fingerprint:
+        raise HTTPException(422, "Idempotency-Key was already used with a different request")
+    if existing.run_id is None:
+        stale_before = now - timedelta(seconds=settings.IDEMPOTENCY_CLAIM_STALE_SECONDS)
+        if existing.created_at.replace(tzinfo=None) > stale_before:
+            raise HTTPException(409, "A request with this Idempotency-Key is still in progress")
+        # Stale claim: delete it only if nobody bound or took it over meanwhile, then claim afresh
+        result = await db.execute(
+            delete(IdempotencyKey).where(
+                IdempotencyKey.scope == scope, IdempotencyKey.key == key,
+                IdempotencyKey.run_id.is_(None), IdempotencyKey.created_at <= stale_before,
+            )
+        )
+        await db.commit()
+        if not result.rowcount:
+            raise HTTPException(409, "A request with this Idempotency-Key is still in progress")
+        db.expunge(existing)
+        return await claim_idempotency_key(db, scope, key, fingerprint)
+
+    run = await db.get(Run, existing.run_id)
+    if run is None:
+        # The run was archived/deleted: forget the key and start over
+        await db.delete(existing)
+        await db.commit()
+        return await claim_idempotency_key(db, scope, key, fingerprint)
+    return None, run
+
+
+async def bind_idempotency_key(db: AsyncSession, record: IdempotencyKey, run_id: str):
+    record.run_id = run_id
+    await db.commit()
+
+
+async def release_idempotency_key(db: AsyncSession, record: IdempotencyKey):
+    """Drop a claim whose request failed before creating a run."""
+    await db.rollback()
+    await db.execute(
+        delete(IdempotencyKey).where(
+            IdempotencyKey.scope == record.scope, IdempotencyKey.key == record.key
+        )
+    )
+    await db.commit()
+
+
+async def purge_expired_keys(db: AsyncSession) -> int:
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= now))
+    await db.commit()
+    return result.rowcount or 0
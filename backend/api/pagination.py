@@ -0,0 +1,28 @@
+import base64
+import json
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+
+
+def encode_cursor(timestamp: datetime, row_id: str) -> str:
+    """Opaque keyset cursor pointing at the last row of a page (sort timestamp + id)."""
+    raw = json.dumps([timestamp.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Inverse of `encode_cursor`. Raises 400 on malformed input."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(timestamp), str(row_id)
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+
+
+def naive_utc(value: datetime) -> datetime:
+    """SQLite stores DateTime columns without tzinfo (UTC); normalize filters to match."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
@@ -0,0 +1,26 @@
+from fastapi import Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib encoder
+    orjson = None
+
+# App-wide default: routes returning dicts/lists are encoded with orjson when installed
+DefaultJSONResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+
+def model_response(model: BaseModel, status_code: int = 200, headers: dict | None = None) -> Response:
+    """Encode a response model straight to JSON bytes with pydantic-core.
+
+    Returning a Response makes FastAPI skip re-validating the model against the
+    route's `response_model` and the intermediate dict + json.dumps pass. Keep
+    `response_model` on the route so the OpenAPI schema is unchanged.
+    """
+    return Response(
+        model.model_dump_json(),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
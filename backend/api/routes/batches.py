@@ -0,0 +1,210 @@
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from sqlalchemy.orm import selectinload
+
+from config import settings
+from db.database import get_db, async_session
+from models.models import Crew, Run, RUN_FINISHED_STATUSES, generate_uuid
+from models.schemas import BatchCreate, BatchStatusResponse
+from core.batches import BatchExecution, result_line
+from api.routes.runs import validate_runnable
+
+router = APIRouter(prefix="/api/crews/{crew_id}/batches", tags=["batches"])
+
+JSONL_MEDIA_TYPES = ("application/x-ndjson", "application/jsonl", "application/x-jsonlines", "text/plain")
+
+
+@router.post("", status_code=201)
+async def start_batch(
+    crew_id: str,
+    request: Request,
+    concurrency: Optional[int] = Query(None, ge=1),
+    stream: bool = True,
+    db: AsyncSession = Depends(get_db),
+):
+    """Run the crew once per input object.
+
+    The body is either JSON `{"inputs": [{...}, ...], "concurrency": 4}`, a
+    JSONL body (`Content-Type: application/x-ndjson`, one object per line), or
+    a multipart upload with a JSONL `file` field. Every input becomes a run
+    whose tasks can reference it as `{{name}}`.
+
+    With `stream=true` (default) the response is JSONL: a `batch` line, one
+    `result` line per run as it finishes (completed or failed) and a final
+    `summary` line. Closing the connection does not stop the batch; see
+    `GET .../batches/{batch_id}` and `.../results`.
+    """
+    result = await db.execute(
+        select(Crew)
+        .options(selectinload(Crew.agents), selectinload(Crew.tasks))
+        .where(Crew.id == crew_id)
+    )
+    crew = result.scalar_one_or_none()
+    if not crew:
+        raise HTTPException(404, "Crew not found")
+    validate_runnable(crew)
+
+    inputs, body_concurrency = await _read_inputs(request)
+    if not inputs:
+        raise HTTPException(422, "The batch has no inputs")
+    if len(inputs) > settings.BATCH_MAX_INPUTS:
+        raise HTTPException(422, f"A batch accepts at most {settings.BATCH_MAX_INPUTS} inputs")
+    concurrency = min(
+        concurrency or body_concurrency or settings.BATCH_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY
+    )
+
+    # All runs are created up front as `pending`, so progress survives a dropped connection
+    batch_id = generate_uuid()
+    runs = [
+        Run(
+            crew_id=crew.id, status="pending", batch_id=batch_id, batch_index=index,
+            inputs=json.dumps(values, ensure_ascii=False),
+        )
+        for index, values in enumerate(inputs)
+    ]
+    db.add_all(runs)
+    await db.commit()
+
+    execution = BatchExecution(batch_id, crew.id, [r.id for r in runs], concurrency)
+    queue = execution.subscribe() if stream else None
+    execution.start()
+
+    header = {
+        "type": "batch",
+        "batch_id": batch_id,
+        "crew_id": crew.id,
+        "total": len(runs),
+        "concurrency": concurrency,
+        "status_url": f"/api/crews/{crew.id}/batches/{batch_id}",
+        "results_url": f"/api/crews/{crew.id}/batches/{batch_id}/results",
+    }
+    if not stream:
+        return JSONResponse(status_code=202, content=header)
+
+    async def lines():
+        try:
+            yield _jsonl(header)
+            while True:
+                line = await queue.get()
+                yield _jsonl(line)
+                if line["type"] == "summary":
+                    return
+        finally:
+            execution.unsubscribe(queue)
+
+    return StreamingResponse(
+        lines(),
+        status_code=201,
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/{batch_id}", response_model=BatchStatusResponse)
+async def get_batch(crew_id: str, batch_id: str, db: AsyncSession = Depends(get_db)):
+    """Progress of a batch: run counts per status."""
+    rows = (await db.execute(
+        select(Run.status, func.count())
+        .where(Run.crew_id == crew_id, Run.batch_id == batch_id)
+        .group_by(Run.status)
+    )).all()
+    if not rows:
+        raise HTTPException(404, "Batch not found")
+    counts = {status: count for status, count in rows}
+    return BatchStatusResponse(
+        batch_id=batch_id,
+        crew_id=crew_id,
+        total=sum(counts.values()),
+        pending=counts.get("pending", 0),
+        running=counts.get("running", 0),
+        completed=counts.get("completed", 0),
+        failed=counts.get("failed", 0),
+        timeout=counts.get("timeout", 0),
+        active=BatchExecution.get(batch_id) is not None,
+    )
+
+
+@router.get("/{batch_id}/results")
+async def get_batch_results(crew_id: str, batch_id: str, db: AsyncSession = Depends(get_db)):
+    """JSONL of the batch's finished runs in input order (same lines as the stream)."""
+    exists = (await db.execute(
+        select(Run.id).where(Run.crew_id == crew_id, Run.batch_id == batch_id).limit(1)
+    )).scalar_one_or_none()
+    if not exists:
+        raise HTTPException(404, "Batch not found")
+
+    async def lines():
+        # Own session: the request's one is closed once the response starts streaming
+        async with async_session() as session:
+            result = await session.stream_scalars(
+                select(Run)
+                .where(
+                    Run.crew_id == crew_id,
+                    Run.batch_id == batch_id,
+                    Run.status.in_(RUN_FINISHED_STATUSES),
+                )
+                .order_by(Run.batch_index)
+            )
+            async for run in result:
+                yield _jsonl({"type": "result", **(await result_line(run))})
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.post("/{batch_id}/stop")
+async def stop_batch(crew_id: str, batch_id: str):
+    execution = BatchExecution.get(batch_id)
+    if not execution or execution.crew_id != crew_id:
+        return {"status": "ignored", "message": "Batch is not active"}
+    execution.stop()
+    return {"status": "success", "message": "Batch cancellation requested"}
+
+
+# ─── Helpers ───
+
+async def _read_inputs(request: Request) -> tuple[list[dict], Optional[int]]:
+    """(inputs, concurrency from the body) from a JSON body, a JSONL body or a multipart `file`."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "multipart/form-data":
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(422, "Multipart batches need a JSONL `file` field")
+        try:
+            # Same rules as the JSON body's `concurrency` (an integer >= 1)
+            concurrency = BatchCreate.model_validate({"inputs": [], "concurrency": form.get("concurrency") or None}).concurrency
+        except ValidationError as e:
+            raise HTTPException(422, e.errors(include_url=False, include_context=False))
+        return _parse_jsonl(await upload.read()), concurrency
+    if content_type in JSONL_MEDIA_TYPES:
+        return _parse_jsonl(await request.body()), None
+
+    try:
+        data = BatchCreate.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise HTTPException(422, e.errors(include_url=False, include_context=False))
+    return data.inputs, data.concurrency
+
+
+def _parse_jsonl(raw: bytes) -> list[dict]:
+    inputs = []
+    for number, line in enumerate(raw.decode("utf-8-sig").splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError as e:
+            raise HTTPException(422, f"Line {number}: invalid JSON ({str(e)})")
+        if not isinstance(value, dict):
+            raise HTTPException(422, f"Line {number}: each line must be a JSON object")
+        inputs.append(value)
+    return inputs
+
+
+def _jsonl(data: dict) -> str:
+    return json.dumps(data, default=str, ensure_ascii=False) + "\n"
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from config import settings
+from core import retention
+from core.scheduler import preview_load
+from core.endpoint_pool import endpoint_pools
+from core.mcp_pool import mcp_pool, server_config
 from db.database import get_db
-from models.models import LLMConfig, MCPServer
+from models.models import Crew, LLMConfig, MCPServer
 from models.schemas import (
     LLMConfigCreate, LLMConfigUpdate, LLMConfigResponse,
-    MCPServerCreate, MCPServerUpdate, MCPServerResponse
+    MCPServerCreate, MCPServerUpdate, MCPServerResponse,
+    ArchiveImportRequest,
 )
 
 router = APIRouter(prefix="/api/config", tags=["config"])
@@ -55,6 +61,17 @@ async def delete_llm(llm_id: str, db: AsyncSession = Depends(get_db)):
     await db.commit()
 
 
+@router.get("/llm-endpoints")
+async def list_llm_endpoints(check: bool = False):
+    """Health, load and latency of each endpoint of the multi-endpoint LLM pools.
+
+    Pools appear once a run has used them; `check=true` runs the health checks first.
+    """
+    if check:
+        await endpoint_pools.check_all()
+    return endpoint_pools.stats()
+
+
 # ─── MCP Servers ───
 
 @router.get("/mcp", response_model=list[MCPServerResponse])
@@ -63,6 +80,25 @@ async def list_mcp_servers(db: AsyncSession = Depends(get_db)):
     return result.scalars().all()
 
 
+@router.get("/mcp/status")
+async def mcp_status():
+    """Sessions currently open: process, restarts, tool calls and cached tool count."""
+    return mcp_pool.stats()
+
+
+@router.get("/mcp/{server_id}/tools")
+async def list_mcp_tools(server_id: str, db: AsyncSession = Depends(get_db)):
+    """Tools the server exposes (starts its session if needed)."""
+    result = await db.execute(select(MCPServer).where(MCPServer.id == server_id))
+    server = result.scalar_one_or_none()
+    if not server:
+        raise HTTPException(404, "MCP server not found")
+    try:
+        return await mcp_pool.list_tools(server_config(server))
+    except Exception as e:
+        raise HTTPException(502, f"MCP server unavailable: {str(e)}")
+
+
 @router.post("/mcp", response_model=MCPServerResponse, status_code=201)
 async def create_mcp_server(data: MCPServerCreate, db: AsyncSession = Depends(get_db)):
     server = MCPServer(**data.model_dump())
@@ -84,6 +120,8 @@ async def update_mcp_server(server_id: str, data: MCPServerUpdate, db: AsyncSess
     
     await db.commit()
     await db.refresh(server)
+    # The next call starts a session with the new command/args/env
+    await mcp_pool.close(server.id)
     return server
 
 
@@ -96,3 +134,57 @@ async def delete_mcp_server(server_id: str, db: AsyncSession = Depends(get_db)):
     
     await db.delete(server)
     await db.commit()
+    await mcp_pool.close(server_id)
+
+
+# ─── Run Retention / Maintenance ───
+
+@router.get("/maintenance")
+async def get_maintenance_report():
+    """Report of the last retention + compaction pass (null if none ran yet)."""
+    return retention.last_report
+
+
+@router.post("/maintenance/run")
+async def run_maintenance_now():
+    return await retention.run_maintenance()
+
+
+@router.get("/archives")
+async def list_archives():
+    return retention.list_archives()
+
+
+@router.post("/archives/import")
+async def import_archive(data: ArchiveImportRequest):
+    try:
+        restored = await retention.import_archive(data.file)
+    except FileNotFoundError:
+        raise HTTPException(404, "Archive not found")
+    return {"restored": restored}
+
+
+# ─── Schedule Load ───
+
+@router.get("/schedule/preview")
+async def preview_schedule_load(
+    hours: int = Query(24, ge=1, le=168),
+    spread_seconds: int | None = Query(None, ge=0, le=86400),
+    db: AsyncSession = Depends(get_db),
+):
+    """Per-minute histogram of scheduled fires, with and without the spread offsets.
+
+    `spread_seconds` previews a different window than the configured one.
+    """
+    window = settings.SCHEDULER_SPREAD_SECONDS if spread_seconds is None else spread_seconds
+    result = await db.execute(select(Crew).where(Crew.schedule_type != "none"))
+    crews = result.scalars().all()
+    preview = preview_load(crews, hours, window)
+    unspread = preview_load(crews, hours, 0)
+    return {
+        "hours": hours,
+        "spread_seconds": window,
+        "max_concurrent_runs": settings.SCHEDULER_MAX_CONCURRENT_RUNS,
+        "peak_per_minute_without_spread": unspread["peak_per_minute"],
+        **preview,
+    }
@@ -1,41 +1,92 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, func, and_, or_
 from sqlalchemy.orm import selectinload
 
+from api.http_cache import make_etag, is_not_modified, not_modified_response, etag_headers
+from api.pagination import encode_cursor, decode_cursor
+from api.responses import model_response
 from core.scheduler import scheduler
 from db.database import get_db
-from models.models import Crew, Agent, Task
+from models.models import Crew, Agent, Task, Run, utcnow, generate_uuid
 from models.schemas import (
-    CrewCreate, CrewUpdate, CrewResponse, CrewListResponse,
+    CrewCreate, CrewUpdate, CrewResponse, CrewListResponse, CrewPageResponse,
     AgentCreate, AgentUpdate, AgentResponse,
     TaskCreate, TaskUpdate, TaskResponse,
+    CrewGraphSave, CrewGraphSaveResponse, GraphPatchOp,
 )
 
 router = APIRouter(prefix="/api/crews", tags=["crews"])
 
+# Crew fields that require the scheduler job to be rebuilt
+SCHEDULE_FIELDS = {"schedule_type", "schedule_value", "schedule_overlap"}
+
+
+@router.get("", response_model=CrewPageResponse)
+async def list_crews(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    q: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Page of crews (most recently updated first) with agent/task counts and the
+    latest run, computed in one query. Each aggregate is a correlated subquery
+    over an indexed `crew_id`, so only the crews on the page are counted."""
+    agent_count = (
+        select(func.count(Agent.id)).where(Agent.crew_id == Crew.id)
+        .correlate(Crew).scalar_subquery()
+    )
+    task_count = (
+        select(func.count(Task.id)).where(Task.crew_id == Crew.id)
+        .correlate(Crew).scalar_subquery()
+    )
+    last_run = (
+        select(Run).where(Run.crew_id == Crew.id)
+        .order_by(Run.created_at.desc(), Run.id.desc()).limit(1)
+        .correlate(Crew)
+    )
+    last_run_status = last_run.with_only_columns(Run.status).scalar_subquery()
+    last_run_at = last_run.with_only_columns(Run.created_at).scalar_subquery()
+
+    query = select(
+        Crew.id, Crew.name, Crew.description, Crew.process,
+        Crew.created_at, Crew.updated_at,
+        agent_count.label("agent_count"),
+        task_count.label("task_count"),
+        last_run_status.label("last_run_status"),
+        last_run_at.label("last_run_at"),
+    )
+    if q:
+        # `%` and `_` in the search text are literal, not wildcards
+        pattern = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.where(Crew.name.ilike(f"%{pattern}%", escape="\\"))
+    if cursor:
+        last_updated_at, last_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Crew.updated_at < last_updated_at,
+            and_(Crew.updated_at == last_updated_at, Crew.id < last_id),
+        ))
 
-@router.get("", response_model=list[CrewListResponse])
-async def list_crews(db: AsyncSession = Depends(get_db)):
     result = await db.execute(
-        select(Crew).options(selectinload(Crew.agents), selectinload(Crew.tasks))
-        .order_by(Crew.updated_at.desc())
+        query.order_by(Crew.updated_at.desc(), Crew.id.desc()).limit(limit + 1)
     )
-    crews = result.scalars().all()
-    return [
-        CrewListResponse(
-            id=c.id, name=c.name, description=c.description,
-            process=c.process, agent_count=len(c.agents),
-            task_count=len(c.tasks), created_at=c.created_at,
-            updated_at=c.updated_at,
-        )
-        for c in crews
-    ]
+    rows = result.mappings().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["updated_at"], rows[-1]["id"])
+
+    return model_response(CrewPageResponse(
+        items=[CrewListResponse(**row) for row in rows],
+        next_cursor=next_cursor,
+    ))
 
 
 @router.post("", response_model=CrewResponse, status_code=201)
 async def create_crew(data: CrewCreate, db: AsyncSession = Depends(get_db)):
-    crew = Crew(name=data.name, description=data.description, process=data.process)
+    crew = Crew(**data.model_dump())
     db.add(crew)
     await db.commit()
     await db.refresh(crew)
@@ -47,16 +98,32 @@ async def create_crew(data: CrewCreate, db: AsyncSession = Depends(get_db)):
 
 
 @router.get("/{crew_id}", response_model=CrewResponse)
-async def get_crew(crew_id: str, db: AsyncSession = Depends(get_db)):
-    return await _get_crew(crew_id, db)
+async def get_crew(crew_id: str, request: Request, db: AsyncSession = Depends(get_db)):
+    # Cheap version probe first: unchanged crews are answered without loading the graph
+    updated_at = (await db.execute(
+        select(Crew.updated_at).where(Crew.id == crew_id)
+    )).scalar_one_or_none()
+    if updated_at is None:
+        raise HTTPException(404, "Crew not found")
+    etag = make_etag("crew", crew_id, updated_at.isoformat())
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    crew = await _get_crew(crew_id, db)
+    return model_response(CrewResponse.model_validate(crew), headers=etag_headers(etag))
 
 
 @router.put("/{crew_id}", response_model=CrewResponse)
 async def update_crew(crew_id: str, data: CrewUpdate, db: AsyncSession = Depends(get_db)):
     crew = await _get_crew_model(crew_id, db)
-    for key, value in data.model_dump(exclude_unset=True).items():
+    changes = data.model_dump(exclude_unset=True)
+    for key, value in changes.items():
         setattr(crew, key, value)
+    crew.version = (crew.version or 1) + 1
     await db.commit()
+
+    if SCHEDULE_FIELDS & changes.keys():
+        scheduler.schedule_crew(crew)
     return await _get_crew(crew_id, db)
 
 
@@ -65,6 +132,47 @@ async def delete_crew(crew_id: str, db: AsyncSession = Depends(get_db)):
     crew = await _get_crew_model(crew_id, db)
     await db.delete(crew)
     await db.commit()
+    scheduler.unschedule_crew(crew_id)
+
+
+# ─── Bulk Graph Save ───
+
+@router.put("/{crew_id}/graph", response_model=CrewGraphSaveResponse)
+async def save_graph(crew_id: str, data: CrewGraphSave, db: AsyncSession = Depends(get_db)):
+    """Apply crew fields, agent/task upserts, deletions and patch ops in one commit.
+
+    `base_version` must match the crew's current version, otherwise nothing is
+    applied and 409 is returned with the current version. Only rows that
+    actually changed are returned.
+    """
+    crew = await _get_crew(crew_id, db)
+
+    # Optimistic concurrency: only one writer can move the version forward
+    bumped = await db.execute(
+        update(Crew)
+        .where(Crew.id == crew_id, Crew.version == data.base_version)
+        .values(version=Crew.version + 1, updated_at=utcnow())
+    )
+    if bumped.rowcount == 0:
+        raise HTTPException(409, {"message": "Crew was modified concurrently", "version": crew.version})
+
+    graph = _GraphEditor(crew, db)
+    for op in _graph_save_ops(data):
+        await graph.apply(op)
+
+    await db.commit()
+
+    if SCHEDULE_FIELDS & graph.crew_changes.keys():
+        scheduler.schedule_crew(crew)
+    return CrewGraphSaveResponse(
+        version=data.base_version + 1,
+        crew=graph.crew_changes or None,
+        agents=[AgentResponse.model_validate(a) for a in graph.changed_agents.values()],
+        tasks=[TaskResponse.model_validate(t) for t in graph.changed_tasks.values()],
+        deleted_agent_ids=graph.deleted_agent_ids,
+        deleted_task_ids=graph.deleted_task_ids,
+        id_map=graph.id_map,
+    )
 
 
 # ─── Agents within Crew ───
@@ -74,6 +182,7 @@ async def create_agent(crew_id: str, data: AgentCreate, db: AsyncSession = Depen
     await _get_crew_model(crew_id, db)
     agent = Agent(crew_id=crew_id, **data.model_dump())
     db.add(agent)
+    await _touch_crew(crew_id, db)
     await db.commit()
     await db.refresh(agent)
     return agent
@@ -86,6 +195,7 @@ async def update_agent(crew_id: str, agent_id: str, data: AgentUpdate, db: Async
         raise HTTPException(404, "Agent not found in this crew")
     for key, value in data.model_dump(exclude_unset=True).items():
         setattr(agent, key, value)
+    await _touch_crew(crew_id, db)
     await db.commit()
     await db.refresh(agent)
     return agent
@@ -97,6 +207,7 @@ async def delete_agent(crew_id: str, agent_id: str, db: AsyncSession = Depends(g
     if agent.crew_id != crew_id:
         raise HTTPException(404, "Agent not found in this crew")
     await db.delete(agent)
+    await _touch_crew(crew_id, db)
     await db.commit()
 
 
@@ -107,6 +218,7 @@ async def create_task(crew_id: str, data: TaskCreate, db: AsyncSession = Depends
     await _get_crew_model(crew_id, db)
     task = Task(crew_id=crew_id, **data.model_dump())
     db.add(task)
+    await _touch_crew(crew_id, db)
     await db.commit()
     await db.refresh(task)
     return task
@@ -119,6 +231,7 @@ async def update_task(crew_id: str, task_id: str, data: TaskUpdate, db: AsyncSes
         raise HTTPException(404, "Task not found in this crew")
     for key, value in data.model_dump(exclude_unset=True).items():
         setattr(task, key, value)
+    await _touch_crew(crew_id, db)
     await db.commit()
     await db.refresh(task)
     return task
@@ -130,11 +243,21 @@ async def delete_task(crew_id: str, task_id: str, db: AsyncSession = Depends(get
     if task.crew_id != crew_id:
         raise HTTPException(404, "Task not found in this crew")
     await db.delete(task)
+    await _touch_crew(crew_id, db)
     await db.commit()
 
 
 # ─── Helpers ───
 
+async def _touch_crew(crew_id: str, db: AsyncSession):
+    """Bump `Crew.updated_at` and `Crew.version` so agent/task edits change the
+    crew's ETag and invalidate stale bulk saves."""
+    await db.execute(
+        update(Crew).where(Crew.id == crew_id)
+        .values(updated_at=utcnow(), version=Crew.version + 1)
+    )
+
+
 async def _get_crew(crew_id: str, db: AsyncSession) -> Crew:
     result = await db.execute(
         select(Crew)
@@ -169,3 +292,131 @@ async def _get_task_model(task_id: str, db: AsyncSession) -> Task:
     if not task:
         raise HTTPException(404, "Task not found")
     return task
+
+
+def _graph_save_ops(data: CrewGraphSave) -> list[GraphPatchOp]:
+    """Normalize the full-graph part of a bulk save into patch ops, followed by `data.patch`."""
+    ops = []
+    if data.crew:
+        for field, value in data.crew.model_dump(exclude_unset=True).items():
+            ops.append(GraphPatchOp(op="replace", path=f"/crew/{field}", value=value))
+    for kind, upserts in (("agents", data.agents), ("tasks", data.tasks)):
+        for upsert in upserts:
+            values = upsert.model_dump(exclude_unset=True, exclude={"id"})
+            ops.append(GraphPatchOp(op="add", path=f"/{kind}/{upsert.id or generate_uuid()}", value=values))
+    for agent_id in data.deleted_agent_ids:
+        ops.append(GraphPatchOp(op="remove", path=f"/agents/{agent_id}"))
+    for task_id in data.deleted_task_ids:
+        ops.append(GraphPatchOp(op="remove", path=f"/tasks/{task_id}"))
+    return ops + list(data.patch)
+
+
+class _GraphEditor:
+    """Applies graph patch ops to a loaded crew, tracking what changed."""
+
+    _kinds = {
+        "agents": (Agent, AgentCreate, AgentUpdate),
+        "tasks": (Task, TaskCreate, TaskUpdate),
+    }
+
+    def __init__(self, crew: Crew, db: AsyncSession):
+        self.crew = crew
+        self.db = db
+        self.rows = {
+            "agents": {a.id: a for a in crew.agents},
+            "tasks": {t.id: t for t in crew.tasks},
+        }
+        self.changed = {"agents": {}, "tasks": {}}
+        self.deleted = {"agents": [], "tasks": []}
+        self.crew_changes: dict = {}
+        self.id_map: dict[str, str] = {}
+
+    @property
+    def changed_agents(self):
+        return self.changed["agents"]
+
+    @property
+    def changed_tasks(self):
+        return self.changed["tasks"]
+
+    @property
+    def deleted_agent_ids(self):
+        return self.deleted["agents"]
+
+    @property
+    def deleted_task_ids(self):
+        return self.deleted["tasks"]
+
+    async def apply(self, op: GraphPatchOp):
+        parts = [p for p in op.path.split("/") if p]
+        if op.op not in ("add", "replace", "remove") or not parts:
+            raise HTTPException(422, f"Unsupported patch op: {op.op} {op.path}")
+
+        if parts[0] == "crew" and len(parts) == 2 and op.op == "replace":
+            self._set_crew_field(parts[1], op.value)
+        elif parts[0] in self._kinds and len(parts) == 2:
+            if op.op == "remove":
+                await self._remove(parts[0], parts[1])
+            else:
+                self._upsert(parts[0], parts[1], op.value or {})
+        elif parts[0] in self._kinds and len(parts) == 3 and op.op in ("add", "replace"):
+            self._set_field(parts[0], self._resolve(parts[0], parts[1]), parts[2], op.value)
+        else:
+            raise HTTPException(422, f"Unsupported patch op: {op.op} {op.path}")
+
+    def _set_crew_field(self, field: str, value):
+        if field not in CrewUpdate.model_fields:
+            raise HTTPException(422, f"Unknown crew field: {field}")
+        value = getattr(CrewUpdate.model_validate({field: value}), field)
+        if getattr(self.crew, field) != value:
+            setattr(self.crew, field, value)
+            self.crew_changes[field] = value
+
+    def _resolve(self, kind: str, row_id: str):
+        row = self.rows[kind].get(self.id_map.get(row_id, row_id))
+        if row is None:
+            raise HTTPException(422, f"{kind[:-1].capitalize()} {row_id} not found in this crew")
+        return row
+
+    def _upsert(self, kind: str, row_id: str, values: dict):
+        if self.id_map.get(row_id, row_id) in self.rows[kind]:
+            row = self._resolve(kind, row_id)
+            for field, value in values.items():
+                self._set_field(kind, row, field, value)
+            return
+
+        model, create_schema, _ = self._kinds[kind]
+        values = create_schema.model_validate(values).model_dump()
+        if kind == "tasks" and values.get("agent_id"):
+            values["agent_id"] = self._resolve("agents", values["agent_id"]).id
+        row = model(id=generate_uuid(), crew_id=self.crew.id, **values)
+        self.db.add(row)
+        self.rows[kind][row.id] = row
+        self.changed[kind][row.id] = row
+        self.id_map[row_id] = row.id
+
+    def _set_field(self, kind: str, row, field: str, value):
+        update_schema = self._kinds[kind][2]
+        if field not in update_schema.model_fields:
+            raise HTTPException(422, f"Unknown {kind[:-1]} field: {field}")
+        value = getattr(update_schema.model_validate({field: value}), field)
+        if kind == "tasks" and field == "agent_id" and value:
+            value = self._resolve("agents", value).id
+        if getattr(row, field) != value:
+            setattr(row, field, value)
+            self.changed[kind][row.id] = row
+
+    async def _remove(self, kind: str, row_id: str):
+        row = self._resolve(kind, row_id)
+        if kind == "agents":
+            # Agent.tasks cascades: its tasks are deleted with it
+            for task in list(self.rows["tasks"].values()):
+                if task.agent_id == row.id:
+                    self._forget("tasks", task)
+        self._forget(kind, row)
+        await self.db.delete(row)
+
+    def _forget(self, kind: str, row):
+        self.rows[kind].pop(row.id, None)
+        self.changed[kind].pop(row.id, None)
+        self.deleted[kind].append(row.id)
@@ -1,28 +1,92 @@
 import asyncio
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+import json
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Request, Response, Header
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from datetime import datetime, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, and_, or_
+from sqlalchemy.orm import selectinload, load_only
 
+from api.idempotency import (
+    request_fingerprint, claim_idempotency_key, bind_idempotency_key, release_idempotency_key,
+)
+from api.http_cache import make_etag, is_not_modified, not_modified_response, etag_headers
+from api.pagination import encode_cursor, decode_cursor, naive_utc
+from api.responses import model_response
 from db.database import get_db
 from models.models import Crew, Run
-from models.schemas import RunResponse
+from models.schemas import RunBase, RunCreate, RunResponse, RunSummaryResponse, RunPageResponse
 from core.orchestrator import Orchestrator
+from core.tracing import to_chrome_trace, to_otlp
+from utils.blob_store import blob_store, read_run_result_async, read_run_logs_async
 
 router = APIRouter(prefix="/api/crews/{crew_id}/runs", tags=["runs"])
 
 
-@router.get("", response_model=list[RunResponse])
-async def list_runs(crew_id: str, db: AsyncSession = Depends(get_db)):
+@router.get("", response_model=RunPageResponse)
+async def list_runs(
+    crew_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Newest-first page of run summaries. `result` and `logs` are never loaded here;
+    fetch a single run to get them."""
+    query = (
+        select(Run)
+        .options(load_only(
+            Run.id, Run.crew_id, Run.status, Run.result_preview, Run.result_size,
+            Run.tokens_used, Run.cost,
+            Run.started_at, Run.completed_at, Run.created_at,
+        ))
+        .where(Run.crew_id == crew_id)
+    )
+    if status:
+        query = query.where(Run.status == status)
+    if created_after:
+        query = query.where(Run.created_at >= naive_utc(created_after))
+    if created_before:
+        query = query.where(Run.created_at < naive_utc(created_before))
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Run.created_at < last_created_at,
+            and_(Run.created_at == last_created_at, Run.id < last_id),
+        ))
+
+    # Fetch one extra row to know whether another page exists
     result = await db.execute(
-        select(Run).where(Run.crew_id == crew_id).order_by(Run.created_at.desc())
+        query.order_by(Run.created_at.desc(), Run.id.desc()).limit(limit + 1)
     )
-    return result.scalars().all()
+    runs = result.scalars().all()
+
+    next_cursor = None
+    if len(runs) > limit:
+        runs = runs[:limit]
+        next_cursor = encode_cursor(runs[-1].created_at, runs[-1].id)
+
+    return model_response(RunPageResponse(
+        items=[RunSummaryResponse.model_validate(r) for r in runs],
+        next_cursor=next_cursor,
+    ))
 
 
 @router.post("", response_model=RunResponse, status_code=201)
-async def start_run(crew_id: str, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
+async def start_run(
+    crew_id: str,
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    data: Optional[RunCreate] = None,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Start a run. The optional body `{"inputs": {...}}` fills `{{name}}` in the task texts;
+    `"mode": "changed"` reuses the outputs of tasks that did not change since earlier runs."""
     result = await db.execute(
         select(Crew)
         .options(selectinload(Crew.agents), selectinload(Crew.tasks))
@@ -32,25 +96,33 @@ async def start_run(crew_id: str, background_tasks: BackgroundTasks, db: AsyncSe
     if not crew:
         raise HTTPException(404, "Crew not found")
 
-    if not crew.agents:
-        raise HTTPException(400, "El equipo debe tener al menos un agente")
-    
-    # Check if there are either manual tasks OR integrated tasks in agents
-    has_integrated_tasks = any(a.task_description for a in crew.agents)
-    if not crew.tasks and not has_integrated_tasks:
-        raise HTTPException(400, "El equipo debe tener al menos una tarea (ya sea como nodo independiente o integrada en un agente)")
+    validate_runnable(crew)
+    if data and data.mode not in ("full", "changed"):
+        raise HTTPException(422, "mode must be 'full' or 'changed'")
 
-    # Create run object immediately
-    run = Run(
-        crew_id=crew.id,
-        status="running",
-        started_at=datetime.now(timezone.utc),
-    )
-    db.add(run)
-    await db.commit()
-    await db.refresh(run)
+    # A retried request with the same Idempotency-Key gets the original run back
+    claim = None
+    if idempotency_key:
+        fingerprint = await request_fingerprint(request)
+        claim, replayed = await claim_idempotency_key(db, f"runs:{crew.id}", idempotency_key, fingerprint)
+        if replayed:
+            # 200 instead of 201: nothing was created by this request
+            response.status_code = 200
+            response.headers["Idempotent-Replayed"] = "true"
+            return await run_response(replayed)
 
+    # Create run object immediately
     orchestrator = Orchestrator(db)
+    try:
+        run = await orchestrator.create_run(
+            crew, inputs=data.inputs if data else None, mode=data.mode if data else "full"
+        )
+    except Exception:
+        if claim:
+            await release_idempotency_key(db, claim)
+        raise
+    if claim:
+        await bind_idempotency_key(db, claim, run.id)
     
     # Dispatch execution to background task
     background_tasks.add_task(orchestrator.process_run, run.id, crew.id)
@@ -59,7 +131,7 @@ async def start_run(crew_id: str, background_tasks: BackgroundTasks, db: AsyncSe
 
 @router.post("/{run_id}/stop")
 async def stop_run(crew_id: str, run_id: str, db: AsyncSession = Depends(get_db)):
-    success = Orchestrator.stop_run(run_id)
+    success = await Orchestrator.request_stop(db, run_id)
     if not success:
         # Check if run exists but isn't active
         result = await db.execute(select(Run).where(Run.id == run_id))
@@ -72,11 +144,121 @@ async def stop_run(crew_id: str, run_id: str, db: AsyncSession = Depends(get_db)
 
 
 @router.get("/{run_id}", response_model=RunResponse)
-async def get_run(crew_id: str, run_id: str, db: AsyncSession = Depends(get_db)):
+async def get_run(
+    crew_id: str, run_id: str, request: Request, db: AsyncSession = Depends(get_db),
+):
+    # Progress probe (status + log sequence) before loading result/logs
+    progress = (await db.execute(
+        select(Run.status, Run.log_seq).where(Run.id == run_id, Run.crew_id == crew_id)
+    )).one_or_none()
+    if not progress:
+        raise HTTPException(404, "Run not found")
+    etag = make_etag("run", run_id, progress.status, progress.log_seq)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
     result = await db.execute(
         select(Run).where(Run.id == run_id, Run.crew_id == crew_id)
     )
     run = result.scalar_one_or_none()
     if not run:
         raise HTTPException(404, "Run not found")
-    return run
+    etag = make_etag("run", run_id, run.status, run.log_seq)
+    # An offloaded result comes as its preview; the full text streams from /result
+    return await run_json_response(run, headers=etag_headers(etag), full_result=False)
+
+
+@router.get("/{run_id}/result")
+async def get_run_result(crew_id: str, run_id: str, db: AsyncSession = Depends(get_db)):
+    """Raw result text. Offloaded results are streamed straight from the blob store."""
+    result = await db.execute(
+        select(Run).where(Run.id == run_id, Run.crew_id == crew_id)
+    )
+    run = result.scalar_one_or_none()
+    if not run:
+        raise HTTPException(404, "Run not found")
+    if run.result_hash and blob_store.exists(run.result_hash):
+        return StreamingResponse(
+            blob_store.open_stream(run.result_hash),
+            media_type="text/markdown; charset=utf-8",
+        )
+    return PlainTextResponse(await read_run_result_async(run), media_type="text/markdown; charset=utf-8")
+
+
+@router.get("/{run_id}/trace")
+async def get_run_trace(
+    crew_id: str,
+    run_id: str,
+    format: Literal["chrome", "otlp"] = "chrome",
+    db: AsyncSession = Depends(get_db),
+):
+    """Span timeline of a finished run.
+
+    `chrome` (default) loads in chrome://tracing or ui.perfetto.dev; `otlp` is
+    an OTLP/JSON export request for OpenTelemetry tooling.
+    """
+    row = (await db.execute(
+        select(Run.trace).where(Run.id == run_id, Run.crew_id == crew_id)
+    )).one_or_none()
+    if not row:
+        raise HTTPException(404, "Run not found")
+    if not row.trace:
+        raise HTTPException(404, "No trace recorded for this run")
+    stored = json.loads(row.trace)
+    if format == "otlp":
+        return to_otlp(run_id, stored)
+    return to_chrome_trace(run_id, stored)
+
+
+# ─── Helpers ───
+
+def validate_runnable(crew: Crew):
+    """Reject crews that have nothing to execute (400)."""
+    if not crew.agents:
+        raise HTTPException(400, "El equipo debe tener al menos un agente")
+
+    # Check if there are either manual tasks OR integrated tasks in agents
+    has_integrated_tasks = any(a.task_description for a in crew.agents)
+    if not crew.tasks and not has_integrated_tasks:
+        raise HTTPException(400, "El equipo debe tener al menos una tarea (ya sea como nodo independiente o integrada en un agente)")
+
+
+async def run_response(run: Run) -> RunResponse:
+    """RunResponse with result/logs rehydrated from the blob store when offloaded."""
+    response = RunResponse.model_validate(run)
+    if run.result_hash:
+        response.result = await read_run_result_async(run)
+    if run.logs_hash:
+        response.logs = json.loads(await read_run_logs_async(run))
+    return response
+
+
+async def run_json_response(run: Run, headers: dict | None = None, full_result: bool = True) -> Response:
+    """Same body as `run_response`, but the stored logs JSON is spliced in verbatim.
+
+    Offloaded payloads are read off the event loop; with `full_result=False`
+    an offloaded result is left as its preview and flagged `result_truncated`.
+    """
+    result = await read_run_result_async(run) if full_result or not run.result_hash else None
+    return render_run_json(run, result, await read_run_logs_async(run), headers)
+
+
+def render_run_json(run: Run, result: str | None, logs: str, headers: dict | None = None) -> Response:
+    """Run JSON with `logs` (a JSON array string) spliced in; `result=None` sends the preview.
+
+    Long runs carry thousands of log entries; this skips parsing, validating and
+    re-encoding them on every poll while clients still get a native list.
+    """
+    head = RunBase.model_validate(run)
+    if result is None:
+        head.result = run.result_preview or ""
+        head.result_truncated = True
+    else:
+        head.result = result
+    body = head.model_dump_json()
+    logs = logs or "[]"
+    return Response(
+        f'{body[:-1]},"logs":{logs}}}',
+        headers=headers,
+        media_type="application/json",
+    )
@@ -1,17 +1,54 @@
 import json
-from fastapi import APIRouter, Depends, HTTPException, Header
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response, BackgroundTasks, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 from typing import Optional
 
-from db.database import get_db
-from models.models import Crew, Run
-from models.schemas import RunResponse
+from api.idempotency import (
+    request_fingerprint, claim_idempotency_key, bind_idempotency_key, release_idempotency_key,
+)
+from api.http_cache import make_etag, is_not_modified, not_modified_response, set_etag
+from api.pagination import naive_utc
+from config import settings
+from db.database import get_db, async_session
+from models.models import Crew, Run, RUN_FINISHED_STATUSES
 from core.orchestrator import Orchestrator
+from core.run_events import run_events
+from api.routes.runs import run_json_response, validate_runnable
+from utils.blob_store import read_run_result_async, read_run_logs_async
+from utils.cache import TTLCache
 
 router = APIRouter(prefix="/api/v1/services", tags=["External Services"])
 
+# {crew_id: (etag, payload)} for hot /latest lookups
+latest_cache = TTLCache(maxsize=512, ttl=settings.LATEST_RESULT_CACHE_TTL)
+
+# Serializes the "find in-flight run or create one" step per crew (this process only);
+# an entry lives while some request holds or waits on it
+_trigger_locks: dict[str, asyncio.Lock] = {}
+_trigger_users: dict[str, int] = {}
+
+
+@asynccontextmanager
+async def _trigger_lock(crew_id: str):
+    lock = _trigger_locks.setdefault(crew_id, asyncio.Lock())
+    _trigger_users[crew_id] = _trigger_users.get(crew_id, 0) + 1
+    try:
+        async with lock:
+            yield
+    finally:
+        _trigger_users[crew_id] -= 1
+        if not _trigger_users[crew_id]:
+            del _trigger_users[crew_id]
+            _trigger_locks.pop(crew_id, None)
+
+
 async def get_public_crew(crew_id: str, db: AsyncSession):
     result = await db.execute(
         select(Crew)
@@ -24,57 +61,241 @@ async def get_public_crew(crew_id: str, db: AsyncSession):
     return crew
 
 @router.get("/{crew_id}/latest")
-async def get_latest_result(crew_id: str, db: AsyncSession = Depends(get_db)):
+async def get_latest_result(crew_id: str, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
     """Get the latest completed run result for a public crew."""
-    await get_public_crew(crew_id, db)
+    cached = latest_cache.get(crew_id)
+    if cached is None:
+        await _check_public_crew(crew_id, db)
+
+        result = await db.execute(
+            select(Run).where(Run.crew_id == crew_id, Run.status == "completed")
+            .order_by(Run.created_at.desc()).limit(1)
+        )
+        run = result.scalar_one_or_none()
+        if not run:
+            raise HTTPException(status_code=404, detail="No completed runs found for this service")
+
+        payload = {
+            "crew_id": crew_id,
+            "run_id": run.id,
+            "status": run.status,
+            "result": await read_run_result_async(run),
+            "completed_at": run.completed_at
+        }
+        cached = (make_etag("latest", crew_id, run.id), payload)
+        latest_cache.set(crew_id, cached)
+
+    etag, payload = cached
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    set_etag(response, etag)
+    return payload
+
+@router.api_route("/{crew_id}/run", methods=["GET", "POST"], status_code=202)
+async def trigger_run(
+    crew_id: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Start a run for a public crew and return its ID immediately (202).
+
+    Triggers arriving while a run of the same crew started less than
+    SERVICE_COALESCE_WINDOW_SECONDS ago is still in flight get that run instead
+    of a new one. Use `/wait` (long-poll) or `/events` (SSE) to get the result.
+    A repeated `Idempotency-Key` returns the run created by the first request.
+    """
+    crew = await get_public_crew(crew_id, db)
+    validate_runnable(crew)
+
+    claim = None
+    if idempotency_key:
+        fingerprint = await request_fingerprint(request)
+        claim, replayed = await claim_idempotency_key(db, f"services:{crew_id}", idempotency_key, fingerprint)
+        if replayed:
+            return _accepted_response(replayed, coalesced=False, replayed=True)
+
+    try:
+        async with _trigger_lock(crew_id):
+            run = await _find_inflight_run(crew_id, db)
+            coalesced = run is not None
+            if not coalesced:
+                orchestrator = Orchestrator(db)
+                run = await orchestrator.create_run(crew)
+                background_tasks.add_task(orchestrator.process_run, run.id, crew.id)
+    except Exception:
+        if claim:
+            await release_idempotency_key(db, claim)
+        raise
+    if claim:
+        await bind_idempotency_key(db, claim, run.id)
+
+    return _accepted_response(run, coalesced=coalesced)
+
+
+@router.get("/{crew_id}/run/{run_id}/wait")
+async def wait_for_run(
+    crew_id: str,
+    run_id: str,
+    timeout: float = Query(30, ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    """Long-poll until the run finishes or `timeout` seconds pass.
+
+    Returns 200 with the result when finished, 202 with the current status otherwise.
+    """
+    await _check_public_crew(crew_id, db)
+    deadline = asyncio.get_running_loop().time() + min(timeout, settings.SERVICE_WAIT_MAX_SECONDS)
+    event = run_events.subscribe(run_id)
+    try:
+        while True:
+            # Fresh session each round so we see commits from the executing task; only
+            # the status is read while waiting, the full row once the run has finished
+            async with async_session() as session:
+                status = (await session.execute(
+                    select(Run.status).where(Run.id == run_id, Run.crew_id == crew_id)
+                )).scalar_one_or_none()
+                if status is None:
+                    raise HTTPException(status_code=404, detail="Run not found")
+                if status in RUN_FINISHED_STATUSES:
+                    return await _finished_payload(await session.get(Run, run_id))
+
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return JSONResponse(status_code=202, content={"run_id": run_id, "status": status})
+            event.clear()
+            try:
+                # Wake on in-process progress; poll anyway in case another worker runs it
+                await asyncio.wait_for(event.wait(), timeout=min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        run_events.unsubscribe(run_id, event)
+
+
+@router.get("/{crew_id}/run/{run_id}/events")
+async def stream_run_events(crew_id: str, run_id: str, db: AsyncSession = Depends(get_db)):
+    """Server-Sent Events: one `log` event per new log entry, then a final `completed` event."""
+    await _check_public_crew(crew_id, db)
+
+    async def event_stream():
+        event = run_events.subscribe(run_id)
+        sent_logs = 0
+        seen_seq = None
+        try:
+            while True:
+                async with async_session() as session:
+                    progress = (await session.execute(
+                        select(Run.status, Run.log_seq).where(Run.id == run_id, Run.crew_id == crew_id)
+                    )).one_or_none()
+                    if not progress:
+                        yield _sse("error", {"detail": "Run not found"})
+                        return
+                    finished = progress.status in RUN_FINISHED_STATUSES
+                    if progress.log_seq != seen_seq or finished:
+                        run = await session.get(Run, run_id)
+                        logs = json.loads(await read_run_logs_async(run))
+                        for entry in logs[sent_logs:]:
+                            yield _sse("log", entry)
+                        sent_logs = len(logs)
+                        seen_seq = progress.log_seq
+                        if finished:
+                            yield _sse("completed", await _finished_payload(run))
+                            return
+
+                event.clear()
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=2.0)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            run_events.unsubscribe(run_id, event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/{crew_id}/run/{run_id}")
+async def get_run_status(crew_id: str, run_id: str, db: AsyncSession = Depends(get_db)):
+    """Check the status of a specific run."""
+    await _check_public_crew(crew_id, db)
     
+    run = await db.get(Run, run_id)
+    if not run or run.crew_id != crew_id:
+        raise HTTPException(status_code=404, detail="Run not found")
+        
+    return await run_json_response(run)
+
+
+# ─── Helpers ───
+
+async def _check_public_crew(crew_id: str, db: AsyncSession):
+    """Like `get_public_crew` but without loading agents and tasks."""
+    is_public = (await db.execute(
+        select(Crew.is_public).where(Crew.id == crew_id)
+    )).scalar_one_or_none()
+    if not is_public:
+        raise HTTPException(status_code=404, detail="Public service not found")
+
+
+async def _find_inflight_run(crew_id: str, db: AsyncSession) -> Run | None:
+    window = settings.SERVICE_COALESCE_WINDOW_SECONDS
+    if window <= 0:
+        return None
+    since = naive_utc(datetime.now(timezone.utc) - timedelta(seconds=window))
     result = await db.execute(
-        select(Run).where(Run.crew_id == crew_id, Run.status == "completed")
+        select(Run)
+        .where(
+            Run.crew_id == crew_id,
+            Run.status.in_(("pending", "running")),
+            Run.created_at >= since,
+        )
         .order_by(Run.created_at.desc()).limit(1)
     )
-    run = result.scalar_one_or_none()
-    if not run:
-        raise HTTPException(status_code=404, detail="No completed runs found for this service")
-    
-    return {
-        "crew_id": crew_id,
-        "run_id": run.id,
-        "status": run.status,
-        "result": run.result,
-        "completed_at": run.completed_at
-    }
+    return result.scalar_one_or_none()
 
-@router.api_route("/{crew_id}/run", methods=["GET", "POST"])
-async def trigger_run(crew_id: str, db: AsyncSession = Depends(get_db)):
-    """Trigger a new run for a public crew and return the run ID."""
-    crew = await get_public_crew(crew_id, db)
-    
-    orchestrator = Orchestrator(db)
-    run = await orchestrator.execute_crew(crew)
-    
+
+def _accepted_response(run: Run, coalesced: bool, replayed: bool = False) -> JSONResponse:
+    base = f"/api/v1/services/{run.crew_id}/run/{run.id}"
+    headers = {"Location": base}
+    if replayed:
+        headers["Idempotent-Replayed"] = "true"
+    return JSONResponse(
+        status_code=202,
+        headers=headers,
+        content={
+            "message": "Run accepted",
+            "run_id": run.id,
+            "status": run.status,
+            "coalesced": coalesced,
+            "status_url": base,
+            "wait_url": f"{base}/wait",
+            "events_url": f"{base}/events",
+        },
+    )
+
+
+async def _finished_payload(run: Run) -> dict:
     # Try to parse result as JSON for structured consumption
-    parsed_result = run.result
+    parsed_result = await read_run_result_async(run)
     try:
-        parsed_result = json.loads(run.result)
+        parsed_result = json.loads(parsed_result)
     except Exception:
         pass
 
-    return {
+    return jsonable_encoder({
         "message": "Run finished",
         "run_id": run.id,
         "status": run.status,
         "result": parsed_result,
         "tokens_used": run.tokens_used,
-        "cost": run.cost
-    }
+        "cost": run.cost,
+        "completed_at": run.completed_at,
+    })
 
-@router.get("/{crew_id}/run/{run_id}")
-async def get_run_status(crew_id: str, run_id: str, db: AsyncSession = Depends(get_db)):
-    """Check the status of a specific run."""
-    await get_public_crew(crew_id, db)
-    
-    run = await db.get(Run, run_id)
-    if not run or run.crew_id != crew_id:
-        raise HTTPException(status_code=404, detail="Run not found")
-        
-    return RunResponse.from_orm(run)
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str, ensure_ascii=False)}\n\n"
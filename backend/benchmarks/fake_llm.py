@@ -0,0 +1,334 @@
+"""Fake OpenAI- and Ollama-compatible LLM server for offline load tests.
+
+Serves the endpoints LiteLLM calls for `openai/<model>` (with `api_base=<url>/v1`)
+and `ollama/<model>` / `ollama_chat/<model>` (with `api_base=<url>`), replying
+with synthetic text after a configurable latency and token rate. Errors can be
+injected at a fixed rate with a seeded RNG so runs are repeatable.
+
+    python -m benchmarks.fake_llm --port 9911 --latency-ms 200 --tokens-per-second 80
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "agente tarea resultado análisis datos informe resumen mercado cliente "
+    "estrategia riesgo métrica tendencia propuesta equipo objetivo"
+).split()
+
+
+@dataclass
+class FakeLLMOptions:
+    latency_ms: float = 100.0
+    tokens_per_second: float = 0.0          # 0 = whole completion after latency_ms
+    completion_tokens: int = 64
+    error_rate: float = 0.0                  # fraction of requests answered with error_status
+    error_status: int = 500
+    seed: int = 1234
+    # Report prompt_tokens_details.cached_tokens for the prefix shared with recent prompts
+    prefix_cache: bool = False
+    # When the request offers tools, call this many of them per round for tool_rounds rounds
+    tool_calls: int = 0
+    tool_rounds: int = 1
+    # Answer 400 to tool calls in the history sent without `tools=`, as Anthropic does
+    strict_tools: bool = False
+    models: list[str] = field(default_factory=lambda: ["fake-llama:latest"])
+
+
+@dataclass
+class FakeLLMStats:
+    requests: int = 0
+    errors: int = 0
+    cached_tokens: int = 0
+    tool_calls: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+
+def message_text(message: dict) -> str:
+    """Text of a chat message whose content is a string or a list of content blocks."""
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return str(content)
+
+
+def create_app(options: FakeLLMOptions | None = None) -> FastAPI:
+    options = options or FakeLLMOptions()
+    rng = random.Random(options.seed)
+    app = FastAPI(title="Fake LLM")
+    app.state.options = options
+    app.state.stats = stats = FakeLLMStats()
+
+    def completion_text() -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(options.completion_tokens))
+
+    def prompt_tokens(text: str) -> int:
+        return max(1, len(text) // 4)
+
+    recent_prompts: list[str] = []
+
+    def cached_prefix_tokens(prompt: str) -> int:
+        """Tokens of the longest prefix shared with one of the last 64 prompts."""
+        if not options.prefix_cache:
+            return 0
+        best = 0
+        for previous in recent_prompts:
+            shared = len(os.path.commonprefix([previous, prompt]))
+            best = max(best, shared)
+        recent_prompts.append(prompt)
+        del recent_prompts[:-64]
+        stats.cached_tokens += best // 4
+        return best // 4
+
+    def fake_arguments(schema: dict) -> dict:
+        """Placeholder values for the required parameters of a JSON schema."""
+        samples = {"string": "agente", "integer": 1, "number": 1, "boolean": True, "array": [], "object": {}}
+        properties = schema.get("properties", {})
+        return {
+            name: samples.get(properties.get(name, {}).get("type"), "agente")
+            for name in schema.get("required", [])
+        }
+
+    def requested_tool_calls(body: dict) -> list[dict]:
+        tools = body.get("tools") or []
+        rounds_done = sum(1 for m in body.get("messages", []) if m.get("role") == "assistant" and m.get("tool_calls"))
+        if not options.tool_calls or not tools or body.get("tool_choice") == "none" or rounds_done >= options.tool_rounds:
+            return []
+        calls = []
+        for tool in tools[:options.tool_calls]:
+            function = tool.get("function", {})
+            calls.append({
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {
+                    "name": function.get("name"),
+                    "arguments": json.dumps(fake_arguments(function.get("parameters") or {})),
+                },
+            })
+        stats.tool_calls += len(calls)
+        return calls
+
+    async def generate_delay():
+        delay = options.latency_ms / 1000
+        if options.tokens_per_second > 0:
+            delay += options.completion_tokens / options.tokens_per_second
+        await asyncio.sleep(delay)
+
+    def should_fail() -> bool:
+        return options.error_rate > 0 and rng.random() < options.error_rate
+
+    async def admit():
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+
+    def error_response():
+        stats.errors += 1
+        return JSONResponse(
+            status_code=options.error_status,
+            content={"error": {"message": "Injected failure", "type": "server_error"}},
+        )
+
+    async def paced_tokens(text: str):
+        """Yield words after the first-token latency, spaced at tokens_per_second."""
+        await asyncio.sleep(options.latency_ms / 1000)
+        gap = 1 / options.tokens_per_second if options.tokens_per_second > 0 else 0
+        for index, word in enumerate(text.split(" ")):
+            if gap:
+                await asyncio.sleep(gap)
+            yield word if index == 0 else f" {word}"
+
+    # ─── OpenAI ───
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await admit()
+        streaming = False
+        try:
+            if should_fail():
+                return error_response()
+            if options.strict_tools and not body.get("tools") and any(
+                m.get("role") == "tool" or m.get("tool_calls") for m in body.get("messages", [])
+            ):
+                stats.errors += 1
+                return JSONResponse(
+                    status_code=400,
+                    content={"error": {"message": "Tool calls in messages without tools=", "type": "invalid_request_error"}},
+                )
+            prompt = "".join(message_text(m) for m in body.get("messages", []))
+            text = completion_text()
+            usage = {
+                "prompt_tokens": prompt_tokens(prompt),
+                "completion_tokens": options.completion_tokens,
+                "total_tokens": prompt_tokens(prompt) + options.completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_prefix_tokens(prompt)},
+            }
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            model = body.get("model", "fake")
+
+            if body.get("stream"):
+                async def stream():
+                    try:
+                        async for token in paced_tokens(text):
+                            chunk = {
+                                "id": completion_id, "object": "chat.completion.chunk",
+                                "created": int(time.time()), "model": model,
+                                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                            }
+                            yield f"data: {json.dumps(chunk)}\n\n"
+                        final = {
+                            "id": completion_id, "object": "chat.completion.chunk",
+                            "created": int(time.time()), "model": model,
+                            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                            "usage": usage,
+                        }
+                        yield f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n"
+                    finally:
+                        stats.in_flight -= 1
+
+                streaming = True  # the generator releases the in-flight slot
+                return StreamingResponse(stream(), media_type="text/event-stream")
+
+            await generate_delay()
+            tool_calls = requested_tool_calls(body)
+            message = {"role": "assistant", "content": None if tool_calls else text}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if tool_calls else "stop",
+                }],
+                "usage": usage,
+            }
+        finally:
+            if not streaming:
+                stats.in_flight -= 1
+
+    @app.get("/v1/models")
+    async def openai_models():
+        return {"object": "list", "data": [{"id": m, "object": "model"} for m in options.models]}
+
+    # ─── Ollama ───
+
+    @app.get("/api/tags")
+    async def ollama_tags():
+        return {"models": [{"name": m, "model": m, "size": 0} for m in options.models]}
+
+    # Models count as loaded in memory once they have served a request
+    loaded: set[str] = set()
+
+    @app.get("/api/ps")
+    async def ollama_ps():
+        return {"models": [{"name": m, "model": m, "size": 0} for m in sorted(loaded)]}
+
+    @app.post("/api/generate")
+    async def ollama_generate(request: Request):
+        body = await request.json()
+        return await _ollama_reply(body, body.get("prompt", ""), chat=False)
+
+    @app.post("/api/chat")
+    async def ollama_chat(request: Request):
+        body = await request.json()
+        prompt = "".join(message_text(m) for m in body.get("messages", []))
+        return await _ollama_reply(body, prompt, chat=True)
+
+    async def _ollama_reply(body: dict, prompt: str, chat: bool):
+        await admit()
+        streaming = False
+        try:
+            if should_fail():
+                return error_response()
+            text = completion_text()
+            model = body.get("model", "fake")
+            loaded.add(model)
+
+            def payload(content: str, done: bool) -> dict:
+                data = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"), "done": done}
+                if chat:
+                    data["message"] = {"role": "assistant", "content": content}
+                else:
+                    data["response"] = content
+                if done:
+                    data.update(prompt_eval_count=prompt_tokens(prompt), eval_count=options.completion_tokens)
+                return data
+
+            if body.get("stream"):
+                async def stream():
+                    try:
+                        async for token in paced_tokens(text):
+                            yield json.dumps(payload(token, False)) + "\n"
+                        yield json.dumps(payload("", True)) + "\n"
+                    finally:
+                        stats.in_flight -= 1
+
+                streaming = True
+                return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+            await generate_delay()
+            return payload(text, True)
+        finally:
+            if not streaming:
+                stats.in_flight -= 1
+
+    @app.get("/_stats")
+    async def get_stats():
+        return stats.__dict__
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9911)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--tool-calls", type=int, default=0,
+                        help="call this many of the offered tools before answering")
+    parser.add_argument("--tool-rounds", type=int, default=1,
+                        help="rounds of tool calls before answering")
+    parser.add_argument("--strict-tools", action="store_true",
+                        help="reject tool messages sent without tools= (like Anthropic)")
+    parser.add_argument("--prefix-cache", action="store_true",
+                        help="report cached prompt tokens for prefixes shared with recent prompts")
+    args = parser.parse_args()
+
+    options = FakeLLMOptions(
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed,
+        prefix_cache=args.prefix_cache,
+        tool_calls=args.tool_calls,
+        tool_rounds=args.tool_rounds,
+        strict_tools=args.strict_tools,
+    )
+    uvicorn.run(create_app(options), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Fake MCP server (JSON-RPC 2.0 over stdio) for testing MCP tools offline.
+
+Register it in Settings > MCP with command `python` and args
+`["-m", "benchmarks.fake_mcp", "--startup-ms", "500"]` (run the backend from
+`backend/`). Tools: `echo`, `add`, `slow` (sleeps `ms`) and `crash` (exits the
+process, to exercise restarts). `--startup-ms` simulates a slow server start.
+
+    python -m benchmarks.fake_mcp --startup-ms 500
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+TOOLS = [
+    {
+        "name": "echo",
+        "description": "Devuelve el texto recibido.",
+        "inputSchema": {"type": "object", "properties": {"text": {"type": "string"}}, "required": ["text"]},
+    },
+    {
+        "name": "add",
+        "description": "Suma dos números.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {"a": {"type": "number"}, "b": {"type": "number"}},
+            "required": ["a", "b"],
+        },
+    },
+    {
+        "name": "slow",
+        "description": "Espera `ms` milisegundos y responde.",
+        "inputSchema": {"type": "object", "properties": {"ms": {"type": "integer"}}},
+    },
+    {
+        "name": "crash",
+        "description": "Termina el proceso del servidor.",
+        "inputSchema": {"type": "object", "properties": {}},
+    },
+]
+
+
+def call_tool(name: str, arguments: dict) -> dict:
+    if name == "echo":
+        text = str(arguments.get("text", ""))
+    elif name == "add":
+        text = str(arguments.get("a", 0) + arguments.get("b", 0))
+    elif name == "slow":
+        time.sleep(int(arguments.get("ms", 100)) / 1000)
+        text = f"pid {os.getpid()} listo"
+    elif name == "crash":
+        sys.exit(1)
+    else:
+        return {"content": [{"type": "text", "text": f"Unknown tool {name}"}], "isError": True}
+    return {"content": [{"type": "text", "text": text}]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--startup-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    time.sleep(args.startup_ms / 1000)
+    for line in sys.stdin:
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        if "id" not in message:
+            continue  # notifications
+        method = message.get("method")
+        params = message.get("params") or {}
+        if method == "initialize":
+            result = {
+                "protocolVersion": params.get("protocolVersion", "2024-11-05"),
+                "capabilities": {"tools": {}},
+                "serverInfo": {"name": "fake-mcp", "version": "0.1.0"},
+            }
+        elif method == "tools/list":
+            result = {"tools": TOOLS}
+        elif method == "tools/call":
+            result = call_tool(params.get("name"), params.get("arguments") or {})
+        elif method == "ping":
+            result = {}
+        else:
+            reply = {"jsonrpc": "2.0", "id": message["id"], "error": {"code": -32601, "message": "Method not found"}}
+            print(json.dumps(reply), flush=True)
+            continue
+        print(json.dumps({"jsonrpc": "2.0", "id": message["id"], "result": result}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
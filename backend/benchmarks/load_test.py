@@ -0,0 +1,345 @@
+"""Offline load test for the backend, driven against a fake LLM.
+
+Starts the fake OpenAI/Ollama server and the backend in-process on free local
+ports, with a throwaway SQLite database, registers an `LLMConfig` whose
+`base_url` points at the fake server, and fires runs at a fixed concurrency.
+Nothing leaves 127.0.0.1, so results are repeatable without network access.
+
+    cd backend
+    python -m benchmarks.load_test --scenario runs --runs 100 --concurrency 20
+    python -m benchmarks.load_test --scenario services --crews 10 --pollers 5 --output report.json
+
+Scenarios:
+  runs      POST /api/crews/{id}/runs, then poll GET .../runs/{run_id} (with ETag) until finished
+  services  POST /api/v1/services/{id}/run (202), then long-poll .../wait until finished
+
+`--pollers` adds clients hammering the read endpoints (run list, /latest)
+during the test. DB lock waits are measured by timing write statements and
+commits on the backend engine (SQLite busy waits happen inside them) and by
+counting "database is locked" errors.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMOptions, create_app as create_fake_llm
+
+def percentile(values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile; None for an empty sample."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(values: list[float]) -> dict:
+    """Count plus p50/p95/p99/max, in milliseconds (input in seconds)."""
+    ms = [v * 1000 for v in values]
+    return {
+        "count": len(ms),
+        "p50_ms": _round(percentile(ms, 50)),
+        "p95_ms": _round(percentile(ms, 95)),
+        "p99_ms": _round(percentile(ms, 99)),
+        "max_ms": _round(max(ms) if ms else None),
+    }
+
+
+def _round(value: float | None) -> float | None:
+    return round(value, 2) if value is not None else None
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServerThread:
+    """Runs a uvicorn server on its own event loop in a daemon thread."""
+
+    def __init__(self, app, port: int):
+        import uvicorn
+
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self, timeout: float = 30):
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError(f"Server on port {self.port} did not start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+class DBProbe:
+    """Times write statements and commits on the backend engine."""
+
+    def __init__(self):
+        self.writes: list[float] = []
+        self.commits: list[float] = []
+        self.lock_errors = 0
+        self._lock = threading.Lock()
+
+    def attach(self, engine):
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("bench_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_execute(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info["bench_started"].pop()
+            if statement.lstrip()[:6].upper() in ("INSERT", "UPDATE", "DELETE"):
+                with self._lock:
+                    self.writes.append(time.perf_counter() - started)
+
+        @event.listens_for(engine, "handle_error")
+        def on_error(context):
+            conn = context.connection
+            if conn is not None and conn.info.get("bench_started"):
+                conn.info["bench_started"].pop()
+            if "database is locked" in str(context.original_exception):
+                with self._lock:
+                    self.lock_errors += 1
+
+        @event.listens_for(Session, "before_commit")
+        def before_commit(session):
+            session.info["bench_commit"] = time.perf_counter()
+
+        @event.listens_for(Session, "after_commit")
+        def after_commit(session):
+            started = session.info.pop("bench_commit", None)
+            if started is not None:
+                with self._lock:
+                    self.commits.append(time.perf_counter() - started)
+
+    def report(self) -> dict:
+        return {
+            "write_statements": summarize(self.writes),
+            "commits": summarize(self.commits),
+            "lock_errors": self.lock_errors,
+        }
+
+
+def prepare_environment(workdir: str):
+    """Point the backend at throwaway storage before `main` is imported."""
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{workdir}/bench.db"
+    os.environ["SCHEDULER_JOBSTORE_URL"] = f"sqlite:///{workdir}/jobs.db"
+    os.environ["BLOB_STORE_PATH"] = os.path.join(workdir, "blobs")
+    os.environ["RUN_ARCHIVE_PATH"] = os.path.join(workdir, "archive")
+    os.environ["MAINTENANCE_INTERVAL_MINUTES"] = "0"
+    # Keep LiteLLM from fetching its model price map from GitHub
+    os.environ["LITELLM_LOCAL_MODEL_COST_MAP"] = "True"
+    os.environ["SMTP_USER"] = ""
+
+
+async def setup_crews(client: httpx.AsyncClient, args, llm_urls: list[str]) -> list[str]:
+    # Several fake servers (--endpoints) form one multi-endpoint pool
+    if args.provider == "openai":
+        llm = {"name": "Fake OpenAI", "model_id": "fake-gpt", "provider": "openai",
+               "base_url": ",".join(f"{url}/v1" for url in llm_urls), "api_key": "sk-fake"}
+    else:
+        llm = {"name": "Fake Ollama", "model_id": "fake-llama:latest", "provider": "ollama",
+               "base_url": ",".join(llm_urls)}
+    (await client.post("/api/config/llms", json=llm)).raise_for_status()
+
+    crew_ids = []
+    for i in range(args.crews):
+        crew = (await client.post("/api/crews", json={
+            "name": f"Bench crew {i}", "is_public": args.scenario == "services",
+        })).json()
+        for j in range(args.tasks):
+            agent = (await client.post(f"/api/crews/{crew['id']}/agents", json={
+                "name": f"Agente {j}", "role": "Analista", "goal": "Resumir datos",
+                "llm_model": llm["model_id"],
+            })).json()
+            (await client.post(f"/api/crews/{crew['id']}/tasks", json={
+                "name": f"Tarea {j}", "description": "Analiza el mercado y resume.",
+                "expected_output": "Un resumen", "agent_id": agent["id"], "order": j,
+            })).raise_for_status()
+        crew_ids.append(crew["id"])
+    return crew_ids
+
+
+async def run_via_runs_api(client: httpx.AsyncClient, crew_id: str, poll_interval: float, stats: dict) -> str:
+    # Imported here: backend modules must load after prepare_environment() points them at the temp DB
+    from models.models import RUN_FINISHED_STATUSES
+
+    response = await client.post(f"/api/crews/{crew_id}/runs")
+    response.raise_for_status()
+    run = response.json()
+    url = f"/api/crews/{crew_id}/runs/{run['id']}"
+    etag = None
+    while run["status"] not in RUN_FINISHED_STATUSES:
+        await asyncio.sleep(poll_interval)
+        response = await client.get(url, headers={"If-None-Match": etag} if etag else {})
+        stats["polls"] += 1
+        if response.status_code == 304:
+            stats["not_modified"] += 1
+            continue
+        response.raise_for_status()
+        etag = response.headers.get("ETag")
+        run = response.json()
+    return run["status"]
+
+
+async def run_via_services_api(client: httpx.AsyncClient, crew_id: str, poll_interval: float, stats: dict) -> str:
+    response = await client.post(f"/api/v1/services/{crew_id}/run")
+    response.raise_for_status()
+    accepted = response.json()
+    if accepted.get("coalesced"):
+        stats["coalesced"] += 1
+    while True:
+        response = await client.get(accepted["wait_url"], params={"timeout": 30})
+        stats["polls"] += 1
+        if response.status_code == 200:
+            return response.json()["status"]
+        response.raise_for_status()
+
+
+async def poller(client: httpx.AsyncClient, crew_ids: list[str], scenario: str,
+                 stop: asyncio.Event, latencies: list[float]):
+    i = 0
+    while not stop.is_set():
+        crew_id = crew_ids[i % len(crew_ids)]
+        url = f"/api/v1/services/{crew_id}/latest" if scenario == "services" else f"/api/crews/{crew_id}/runs"
+        started = time.perf_counter()
+        await client.get(url)
+        latencies.append(time.perf_counter() - started)
+        i += 1
+
+
+async def drive(base_url: str, llm_urls: list[str], args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency + args.pollers + 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        crew_ids = await setup_crews(client, args, llm_urls)
+        run_once = run_via_runs_api if args.scenario == "runs" else run_via_services_api
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies: list[float] = []
+        statuses: Counter[str] = Counter()
+        stats = {"polls": 0, "not_modified": 0, "coalesced": 0, "client_errors": 0}
+
+        async def one(i: int):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    status = await run_once(client, crew_ids[i % len(crew_ids)], args.poll_interval, stats)
+                except httpx.HTTPError:
+                    stats["client_errors"] += 1
+                    return
+                latencies.append(time.perf_counter() - started)
+                statuses[status] += 1
+
+        stop = asyncio.Event()
+        poll_latencies: list[float] = []
+        pollers = [
+            asyncio.create_task(poller(client, crew_ids, args.scenario, stop, poll_latencies))
+            for _ in range(args.pollers)
+        ]
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.runs)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*pollers)
+        endpoints = (await client.get("/api/config/llm-endpoints")).json()
+
+    finished = sum(statuses.values())
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "runs_per_sec": round(finished / elapsed, 3) if elapsed else None,
+        "statuses": dict(statuses),
+        "end_to_end": summarize(latencies),
+        "read_requests": summarize(poll_latencies),
+        **stats,
+        "llm_endpoints": endpoints,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test against a fake LLM")
+    parser.add_argument("--scenario", choices=("runs", "services"), default="runs")
+    parser.add_argument("--runs", type=int, default=50, help="total runs to trigger")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--crews", type=int, default=5, help="runs are spread round-robin over this many crews")
+    parser.add_argument("--tasks", type=int, default=2, help="agents/tasks per crew")
+    parser.add_argument("--pollers", type=int, default=0, help="extra clients hitting read endpoints")
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument("--provider", choices=("ollama", "openai"), default="ollama")
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--endpoints", type=int, default=1, help="fake LLM servers behind one pooled base_url")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="agentforge-bench-") as workdir:
+        prepare_environment(workdir)
+        fake_options = FakeLLMOptions(
+            latency_ms=args.latency_ms,
+            tokens_per_second=args.tokens_per_second,
+            completion_tokens=args.completion_tokens,
+            error_rate=args.error_rate,
+            seed=args.seed,
+        )
+        fake_apps = [create_fake_llm(fake_options) for _ in range(args.endpoints)]
+        fake_servers = [ServerThread(app, free_port()) for app in fake_apps]
+        for server in fake_servers:
+            server.start()
+
+        import main as backend
+        from db.database import engine
+
+        probe = DBProbe()
+        probe.attach(engine.sync_engine)
+        backend_server = ServerThread(backend.app, free_port())
+        backend_server.start()
+
+        try:
+            results = asyncio.run(drive(
+                f"http://127.0.0.1:{backend_server.port}",
+                [f"http://127.0.0.1:{server.port}" for server in fake_servers],
+                args,
+            ))
+        finally:
+            backend_server.stop()
+            for server in fake_servers:
+                server.stop()
+
+    report = {
+        "scenario": args.scenario,
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        **results,
+        "db": probe.report(),
+        "fake_llm": [app.state.stats.__dict__ for app in fake_apps] if len(fake_apps) > 1
+        else fake_apps[0].state.stats.__dict__,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
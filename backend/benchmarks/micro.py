@@ -0,0 +1,302 @@
+"""Micro-benchmarks for the pure-Python hot spots of a run.
+
+Each case is timed with `timeit` (auto-ranged loop, best of several repeats
+reported as median/min per call) and compared against a stored JSON
+baseline, so a change shows up as a ratio instead of a feeling.
+
+    cd backend
+    python -m benchmarks.micro                      # compare with baselines/micro.json
+    python -m benchmarks.micro --filter add_log     # only matching cases
+    python -m benchmarks.micro --save               # record a new baseline
+    python -m benchmarks.micro --check              # exit 1 if any case regressed
+
+`--corpus DIR` times `extract_text` on saved `*.html` pages instead of the
+built-in synthetic ones. Baselines are machine-specific: record them on the
+machine you compare on.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import timeit
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from api.routes.runs import render_run_json
+from core.orchestrator import Orchestrator
+from core.semantic_cache import VectorIndex, embed
+from models.models import Agent, Crew, Run, Task
+from models.schemas import CrewResponse, RunResponse
+from pydantic import field_validator
+from tools.scraper import extract_text
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "micro.json"
+
+LOREM = (
+    "El equipo analizó las tendencias del mercado y preparó un resumen con las "
+    "métricas principales, los riesgos detectados y una propuesta de acción. "
+)
+
+
+class StringLogsRunResponse(RunResponse):
+    """RunResponse as served before logs became a native list (for comparison)."""
+    logs: str
+
+    @field_validator("logs", mode="before")
+    @classmethod
+    def parse_logs(cls, value):
+        return value
+
+
+def fastapi_default_encode(model) -> bytes:
+    """What FastAPI does with a returned model: dump to dicts, then stdlib json."""
+    return json.dumps(
+        model.model_dump(mode="json"), ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+    ).encode("utf-8")
+
+
+# ─── Fixtures ───
+
+def make_crew(n_agents: int, n_tasks: int, public: bool = False) -> Crew:
+    now = datetime.now(timezone.utc)
+    crew = Crew(
+        id=str(uuid.uuid4()), name="Bench crew", description=LOREM, process="hierarchical",
+        schedule_type="none", schedule_value=None, schedule_overlap="skip", is_public=public,
+        output_email=None, canvas_state="{}", version=1, created_at=now, updated_at=now,
+    )
+    skills = json.dumps([
+        {"type": "tool", "name": f"Herramienta {i}", "description": LOREM[:80]} for i in range(3)
+    ])
+    agents = [
+        Agent(
+            id=str(uuid.uuid4()), crew_id=crew.id, name=f"Agente {i}", role="Analista",
+            goal=LOREM, backstory=LOREM * 2, llm_model="ollama/gemma3:latest", temperature=0.7,
+            max_tokens=4096, position_x=0, position_y=i * 100, skills=skills,
+            is_manager=(i == 0), task_description=None, task_expected_output=None,
+            web_search_enabled=False, created_at=now,
+        )
+        for i in range(n_agents)
+    ]
+    tasks = [
+        Task(
+            id=str(uuid.uuid4()), crew_id=crew.id, agent_id=agents[i % n_agents].id,
+            name=f"Tarea {i}", description=LOREM * 3, expected_output="Un informe",
+            order=i, position_x=200, position_y=i * 100, created_at=now,
+        )
+        for i in range(n_tasks)
+    ]
+    crew.agents = agents
+    crew.tasks = tasks
+    return crew
+
+
+def make_results(n: int, output_chars: int) -> list[dict]:
+    output = (LOREM * (output_chars // len(LOREM) + 1))[:output_chars]
+    return [{"task": f"Tarea {i}", "agent": f"Agente {i}", "output": output} for i in range(n)]
+
+
+def make_logs(n: int) -> str:
+    return json.dumps([
+        {"timestamp": datetime.now(timezone.utc).isoformat(), "agent": "Agente",
+         "level": "info", "message": f"🚀 Iniciando tarea: Tarea {i}"}
+        for i in range(n)
+    ])
+
+
+def synthetic_page(index: int) -> str:
+    """A news-like page: navigation, inline scripts/styles, article body and a table."""
+    nav = "".join(f'<li><a href="/s{i}">Sección {i}</a></li>' for i in range(30))
+    paragraphs = "".join(f"<p>{LOREM * (1 + (index + i) % 4)}</p>" for i in range(40))
+    rows = "".join(f"<tr><td>Fila {i}</td><td>{i * 3.5}</td><td>{LOREM[:40]}</td></tr>" for i in range(50))
+    script = "var data = " + json.dumps({"items": list(range(200))}) + ";"
+    return (
+        f"<!DOCTYPE html><html><head><title>Página {index}</title>"
+        f"<style>body {{ font-family: sans-serif; }} .x{index} {{ color: red; }}</style>"
+        f"<script>{script}</script></head><body>"
+        f"<header><nav><ul>{nav}</ul></nav></header>"
+        f"<main><article><h1>Informe {index}</h1>{paragraphs}</article>"
+        f"<table>{rows}</table></main>"
+        f"<footer>  Aviso legal  |  Contacto  </footer><script>{script}</script></body></html>"
+    )
+
+
+def load_corpus(directory: str | None) -> list[str]:
+    if directory:
+        pages = [p.read_text(encoding="utf-8", errors="replace") for p in sorted(Path(directory).glob("*.html"))]
+        if not pages:
+            raise SystemExit(f"No *.html pages found in {directory}")
+        return pages
+    return [synthetic_page(i) for i in range(8)]
+
+
+# ─── Cases ───
+
+def build_cases(corpus: list[str]) -> dict:
+    """{name: zero-arg callable}. Setup happens here, outside the timed call."""
+    orchestrator = Orchestrator()
+    cases = {}
+
+    for size in (100, 1000, 5000):
+        run = Run(crew_id="bench", logs="[]", log_seq=0)
+        base_logs = make_logs(size)
+
+        def add_log(run=run, base_logs=base_logs):
+            run.logs = base_logs
+            run.add_log("✅ Tarea completada: Tarea", agent_name="Agente", level="success")
+
+        cases[f"add_log/{size}_entries"] = add_log
+
+    for n_previous in (1, 10):
+        crew = make_crew(10, 10, public=True)
+        run = Run(crew_id=crew.id)
+        run.crew = crew
+        task, agent = crew.tasks[-1], crew.agents[-1]
+        previous = make_results(n_previous, 4000)
+        scraping = "\n\n### Contenido extraído:\n" + LOREM * 40
+
+        def build_prompts(task=task, agent=agent, previous=previous, run=run, scraping=scraping):
+            orchestrator._build_prompts(task, agent, previous, run, scraping)
+
+        cases[f"prompt_assembly/{n_previous}_previous"] = build_prompts
+
+    for n_results in (10, 100):
+        results = make_results(n_results, 4000)
+        cases[f"final_result_join/{n_results}_results"] = (
+            lambda results=results: Orchestrator._format_final_result(results)
+        )
+
+    for n_agents in (50, 500):
+        crew = make_crew(n_agents, 1)
+        worst = Task(agent_id=crew.agents[-1].id)
+        agents = list(crew.agents)
+        cases[f"find_agent_for_task/{n_agents}_agents"] = (
+            lambda worst=worst, agents=agents: orchestrator._find_agent_for_task(worst, agents)
+        )
+
+    def extract_corpus(corpus=corpus):
+        for page in corpus:
+            extract_text(page)
+
+    cases[f"scrape_extract/{len(corpus)}_pages"] = extract_corpus
+
+    for size in (50, 500):
+        crew = make_crew(size, size)
+        cases[f"crew_response/{size}_agents_tasks"] = (
+            lambda crew=crew: CrewResponse.model_validate(crew).model_dump_json()
+        )
+        cases[f"crew_response_fastapi_default/{size}_agents_tasks"] = (
+            lambda crew=crew: fastapi_default_encode(CrewResponse.model_validate(crew))
+        )
+
+    # Semantic prompt cache: embedding a prompt and the nearest-neighbour scan
+    prompt = "\n".join(f"- {LOREM} {i}" for i in range(60))
+    cases["semantic_embed/prompt_60_lines"] = lambda prompt=prompt: embed(prompt)
+    index = VectorIndex()
+    for i in range(2000):
+        index.add(embed(f"{LOREM} variante {i} " + "x" * (i % 7)), {"completion": "", "tokens": 0})
+    query = embed(prompt)
+    cases["semantic_lookup/2000_entries"] = lambda index=index, query=query: index.nearest(query)
+
+    # Server encode + client decode of a long run: logs as a JSON string vs native list
+    run = Run(
+        id=str(uuid.uuid4()), crew_id="bench", status="completed", result=LOREM * 20,
+        logs=make_logs(5000), result_size=0, tokens_used=1000, cost=0.01,
+        started_at=datetime.now(timezone.utc), completed_at=datetime.now(timezone.utc),
+        created_at=datetime.now(timezone.utc),
+    )
+
+    def string_logs(run=run):
+        body = json.loads(fastapi_default_encode(StringLogsRunResponse.model_validate(run)))
+        json.loads(body["logs"])
+
+    def native_logs(run=run):
+        json.loads(render_run_json(run, run.result, run.logs).body)
+
+    cases["run_payload/string_logs_5000_entries"] = string_logs
+    cases["run_payload/native_logs_5000_entries"] = native_logs
+
+    return cases
+
+
+# ─── Runner ───
+
+def measure(fn, repeat: int) -> dict:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    per_call = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "median_us": round(statistics.median(per_call), 3),
+        "min_us": round(min(per_call), 3),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def load_baseline(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f).get("results", {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for orchestrator internals")
+    parser.add_argument("--filter", help="only run cases whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--corpus", help="directory of saved *.html pages for scrape_extract")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="median ratio above which a case counts as a regression")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 on regressions")
+    args = parser.parse_args()
+
+    baseline_path = Path(args.baseline)
+    baseline = load_baseline(baseline_path)
+    cases = build_cases(load_corpus(args.corpus))
+
+    results = {}
+    regressions = []
+    print(f"{'case':45} {'median':>12} {'baseline':>12} {'ratio':>7}")
+    for name, fn in cases.items():
+        if args.filter and args.filter not in name:
+            continue
+        result = measure(fn, args.repeat)
+        results[name] = result
+        previous = baseline.get(name)
+        ratio = result["median_us"] / previous["median_us"] if previous and previous["median_us"] else None
+        flag = ""
+        if ratio is not None and ratio > args.threshold:
+            regressions.append(name)
+            flag = "  ⚠️ slower"
+        print(
+            f"{name:45} {result['median_us']:>10.2f}us "
+            f"{(str(previous['median_us']) + 'us') if previous else '-':>12} "
+            f"{(f'{ratio:.2f}x') if ratio is not None else '-':>7}{flag}"
+        )
+
+    if args.save:
+        saved = load_baseline(baseline_path)
+        saved.update(results)
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(baseline_path, "w") as f:
+            json.dump({
+                "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": dict(sorted(saved.items())),
+            }, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"Baseline written to {baseline_path}")
+
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than {args.threshold}x baseline: {', '.join(regressions)}")
+        if args.check:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""Startup-time benchmark: `import main` and time to the first healthy response.
+
+Every sample uses a fresh interpreter. The health probe starts uvicorn as a
+subprocess on a throwaway SQLite database and polls `/api/health` until it
+answers 200, so it measures what a container restart or a new autoscaled
+worker pays before serving traffic.
+
+    cd backend
+    python -m benchmarks.startup                 # 5 samples of each
+    python -m benchmarks.startup --samples 10 --top 15 --output startup.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.load_test import free_port
+from core.warmup import HEAVY_MODULES
+
+IMPORT_SNIPPET = (
+    "import sys, time; started = time.perf_counter(); import main; "
+    "print(time.perf_counter() - started); "
+    f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+)
+
+
+def bench_env(workdir: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite+aiosqlite:///{workdir}/startup.db",
+        "SCHEDULER_JOBSTORE_URL": f"sqlite:///{workdir}/jobs.db",
+        "BLOB_STORE_PATH": os.path.join(workdir, "blobs"),
+        "RUN_ARCHIVE_PATH": os.path.join(workdir, "archive"),
+        "MAINTENANCE_INTERVAL_MINUTES": "0",
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+    })
+    return env
+
+
+def measure_import(env: dict) -> tuple[float, list[str]]:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], env=env, capture_output=True, text=True, check=True,
+    ).stdout.splitlines()
+    return float(output[0]), [m for m in output[1].split(",") if m]
+
+
+def top_imports(env: dict, top: int) -> list[dict]:
+    """Slowest modules imported directly by `main`, by cumulative time (`python -X importtime`)."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        env=env, capture_output=True, text=True, check=True,
+    ).stderr
+    # Children are printed before their parent: collect depth-2 entries until `main` closes
+    packages: dict[str, int] = {}
+    pending: dict[str, int] = {}
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        if not match:
+            continue
+        depth = (len(match.group(2)) - 1) // 2
+        if depth == 1:
+            pending[match.group(3)] = int(match.group(1))
+        elif depth == 0:
+            if match.group(3) == "main":
+                packages = pending
+            pending = {}
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for name, us in ranked]
+
+
+def measure_first_healthy(env: dict, timeout: float = 60) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=1) as client:
+            while time.perf_counter() - started < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError("uvicorn exited before becoming healthy")
+                try:
+                    if client.get(f"http://127.0.0.1:{port}/api/health").status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+        raise RuntimeError(f"/api/health not ready after {timeout}s")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def summarize(samples: list[float]) -> dict:
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "min_ms": round(min(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+        "samples": len(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup-time benchmark")
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imported packages to list")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="agentforge-startup-") as workdir:
+        env = bench_env(workdir)
+        imports, loaded = [], []
+        for _ in range(args.samples):
+            seconds, loaded = measure_import(env)
+            imports.append(seconds)
+        healthy = [measure_first_healthy(env) for _ in range(args.samples)]
+        report = {
+            "import_main": summarize(imports),
+            "first_healthy_response": summarize(healthy),
+            # Heavy libraries pulled in by `import main` (should be empty: they load lazily)
+            "heavy_modules_at_import": loaded,
+            "top_imports": top_imports(env, args.top),
+        }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
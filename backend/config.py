@@ -8,6 +8,119 @@ class Settings:
     APP_NAME: str = "AgentsRichard"
     APP_VERSION: str = "0.1.0"
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./data/agentforge.db")
+
+    # Large run results/logs are offloaded to a compressed, content-addressed store
+    BLOB_STORE_PATH: str = os.getenv("BLOB_STORE_PATH", "./data/blobs")
+    BLOB_INLINE_MAX_BYTES: int = int(os.getenv("BLOB_INLINE_MAX_BYTES", "16384"))
+
+    # Run retention defaults (per-crew settings override these; empty = keep forever)
+    RUN_RETENTION_KEEP_LAST: int | None = int(os.getenv("RUN_RETENTION_KEEP_LAST")) if os.getenv("RUN_RETENTION_KEEP_LAST") else None
+    RUN_RETENTION_DAYS: int | None = int(os.getenv("RUN_RETENTION_DAYS")) if os.getenv("RUN_RETENTION_DAYS") else None
+    RUN_RETENTION_FAILED_DAYS: int | None = int(os.getenv("RUN_RETENTION_FAILED_DAYS", "30"))
+    RUN_ARCHIVE_PATH: str = os.getenv("RUN_ARCHIVE_PATH", "./data/archives")
+    # Seconds a public /latest response is served from the in-process cache
+    LATEST_RESULT_CACHE_TTL: float = float(os.getenv("LATEST_RESULT_CACHE_TTL", "10"))
+
+    # Public service API: triggers of the same crew within this window share one run
+    SERVICE_COALESCE_WINDOW_SECONDS: int = int(os.getenv("SERVICE_COALESCE_WINDOW_SECONDS", "30"))
+    SERVICE_WAIT_MAX_SECONDS: int = int(os.getenv("SERVICE_WAIT_MAX_SECONDS", "60"))
+
+    # How long an Idempotency-Key is remembered for run-triggering endpoints
+    IDEMPOTENCY_TTL_HOURS: int = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+    # A claim still without a run after this long belongs to a request that died: retries take it over
+    IDEMPOTENCY_CLAIM_STALE_SECONDS: int = int(os.getenv("IDEMPOTENCY_CLAIM_STALE_SECONDS", "60"))
+
+    # Scheduler: persistent job store + leader lease so only one worker fires jobs.
+    # APScheduler reads the store synchronously on the event loop, so with SQLite it
+    # gets its own file instead of contending for the app database's lock
+    SCHEDULER_JOBSTORE_URL: str = os.getenv(
+        "SCHEDULER_JOBSTORE_URL",
+        "sqlite:///" + os.path.join(os.path.dirname(DATABASE_URL.split("///", 1)[-1]) or ".", "scheduler_jobs.db")
+        if DATABASE_URL.startswith("sqlite") else DATABASE_URL.replace("+asyncpg", ""),
+    )
+    SCHEDULER_LEASE_SECONDS: int = int(os.getenv("SCHEDULER_LEASE_SECONDS", "30"))
+    SCHEDULER_SYNC_SECONDS: int = int(os.getenv("SCHEDULER_SYNC_SECONDS", "30"))
+    SCHEDULER_MISFIRE_GRACE_SECONDS: int = int(os.getenv("SCHEDULER_MISFIRE_GRACE_SECONDS", "300"))
+    # Cron/interval fires are shifted by a per-crew offset within this window (0 = off)
+    SCHEDULER_SPREAD_SECONDS: int = int(os.getenv("SCHEDULER_SPREAD_SECONDS", "300"))
+    # Max scheduled runs executing at once; extra fires wait their turn (0 = unlimited)
+    SCHEDULER_MAX_CONCURRENT_RUNS: int = int(os.getenv("SCHEDULER_MAX_CONCURRENT_RUNS", "0"))
+    # Fires of a "queue" crew allowed to wait behind its running one; more are skipped
+    SCHEDULER_QUEUE_MAX: int = int(os.getenv("SCHEDULER_QUEUE_MAX", "1"))
+
+    # Per-run span timelines (GET /api/crews/{id}/runs/{run_id}/trace)
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    # Optional OTLP/JSON file (one export request per line) for a local collector
+    TRACE_OTLP_FILE: str = os.getenv("TRACE_OTLP_FILE", "")
+    TRACE_SERVICE_NAME: str = os.getenv("TRACE_SERVICE_NAME", "agentforge")
+
+    # Map-reduce tasks: defaults for items processed at once, retries per item,
+    # partial outputs combined per reduce call and the character budget of one call
+    MAP_CONCURRENCY: int = int(os.getenv("MAP_CONCURRENCY", "4"))
+    MAP_RETRIES: int = int(os.getenv("MAP_RETRIES", "2"))
+    MAP_MAX_ITEMS: int = int(os.getenv("MAP_MAX_ITEMS", "200"))
+    REDUCE_BATCH_SIZE: int = int(os.getenv("REDUCE_BATCH_SIZE", "8"))
+    REDUCE_MAX_CHARS: int = int(os.getenv("REDUCE_MAX_CHARS", "12000"))
+
+    # Batches: default and max runs executing at once, max inputs per batch
+    BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", "4"))
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+    BATCH_MAX_INPUTS: int = int(os.getenv("BATCH_MAX_INPUTS", "1000"))
+
+    # Semantic prompt cache (opt-in per crew): default cosine-similarity threshold,
+    # entry lifetime and max entries kept per model + agent
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    SEMANTIC_CACHE_TTL_HOURS: int = int(os.getenv("SEMANTIC_CACHE_TTL_HOURS", "168"))
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+
+    # LLM calls: retries of transient errors (timeouts, 429, 5xx) with jittered
+    # exponential backoff, and a per-model circuit breaker that fails fast after
+    # LLM_BREAKER_THRESHOLD consecutive failures for LLM_BREAKER_COOLDOWN_SECONDS
+    LLM_RETRIES: int = int(os.getenv("LLM_RETRIES", "2"))
+    LLM_RETRY_BASE_DELAY: float = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+    LLM_RETRY_MAX_DELAY: float = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+    LLM_BREAKER_THRESHOLD: int = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+    LLM_BREAKER_COOLDOWN_SECONDS: float = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+    # Several base URLs in OLLAMA_API_BASE or an LLM's base_url (comma-separated) form
+    # a pool: health check interval/timeout, and ejection after consecutive errors
+    LLM_ENDPOINT_CHECK_INTERVAL: float = float(os.getenv("LLM_ENDPOINT_CHECK_INTERVAL", "15"))
+    LLM_ENDPOINT_CHECK_TIMEOUT: float = float(os.getenv("LLM_ENDPOINT_CHECK_TIMEOUT", "3"))
+    LLM_ENDPOINT_EJECT_AFTER: int = int(os.getenv("LLM_ENDPOINT_EJECT_AFTER", "3"))
+    LLM_ENDPOINT_EJECT_SECONDS: float = float(os.getenv("LLM_ENDPOINT_EJECT_SECONDS", "30"))
+
+    # MCP servers (Settings > MCP): one long-lived session per server, started with the
+    # app (or on first use), and the tool-calling limits of an agent per task (rounds,
+    # calls in total, calls of one round running at the same time)
+    MCP_START_ON_BOOT: bool = os.getenv("MCP_START_ON_BOOT", "true").lower() == "true"
+    MCP_STARTUP_TIMEOUT: float = float(os.getenv("MCP_STARTUP_TIMEOUT", "30"))
+    MCP_CALL_TIMEOUT: float = float(os.getenv("MCP_CALL_TIMEOUT", "60"))
+    MCP_MAX_MESSAGE_BYTES: int = int(os.getenv("MCP_MAX_MESSAGE_BYTES", str(16 * 1024 * 1024)))
+    TOOL_MAX_ROUNDS: int = int(os.getenv("TOOL_MAX_ROUNDS", "5"))
+    TOOL_MAX_CALLS: int = int(os.getenv("TOOL_MAX_CALLS", "20"))
+    TOOL_PARALLEL_CALLS: int = int(os.getenv("TOOL_PARALLEL_CALLS", "4"))
+    TOOL_RESULT_MAX_CHARS: int = int(os.getenv("TOOL_RESULT_MAX_CHARS", "10000"))
+
+    # Deadlines (crews can override them): whole run and each task, in seconds (0 = none),
+    # and the longest a single scrape or web search may take
+    RUN_TIMEOUT_SECONDS: int = int(os.getenv("RUN_TIMEOUT_SECONDS", "3600"))
+    # How often a run checks whether another worker asked to stop it
+    RUN_CANCEL_POLL_SECONDS: float = float(os.getenv("RUN_CANCEL_POLL_SECONDS", "5"))
+    TASK_TIMEOUT_SECONDS: int = int(os.getenv("TASK_TIMEOUT_SECONDS", "0"))
+    SCRAPE_TIMEOUT_SECONDS: float = float(os.getenv("SCRAPE_TIMEOUT_SECONDS", "10"))
+    SEARCH_TIMEOUT_SECONDS: float = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "10"))
+
+    # Runs started with mode "changed" look for reusable task outputs in this many recent runs
+    RERUN_LOOKBACK_RUNS: int = int(os.getenv("RERUN_LOOKBACK_RUNS", "5"))
+
+    # Send Anthropic-style cache_control breakpoints on the stable prompt prefix
+    PROMPT_CACHE_BREAKPOINTS: bool = os.getenv("PROMPT_CACHE_BREAKPOINTS", "true").lower() == "true"
+
+    # Import litellm/bs4/duckduckgo_search/markdown2 in the background after startup
+    # (false = only on first use)
+    WARMUP_IMPORTS: bool = os.getenv("WARMUP_IMPORTS", "true").lower() == "true"
+
+    MAINTENANCE_INTERVAL_MINUTES: int = int(os.getenv("MAINTENANCE_INTERVAL_MINUTES", "360"))
     
     # LLM Provider Keys
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
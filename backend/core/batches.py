@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import selectinload
+
+from db.database import async_session
+from models.models import Crew, Run
+from core.orchestrator import Orchestrator, CrewPlan
+from utils.blob_store import read_run_result_async
+
+logger = logging.getLogger(__name__)
+
+
+class BatchExecution:
+    """Executes the pending runs of one batch with bounded parallelism.
+
+    The crew is loaded once into a `CrewPlan` shared by every run. Each
+    finished run is published as a result line to the subscribers (the
+    streaming response); a failed run does not stop the others.
+    """
+
+    # Batches executing in this process: {batch_id: BatchExecution}
+    _active: dict[str, "BatchExecution"] = {}
+
+    def __init__(self, batch_id: str, crew_id: str, run_ids: list[str], concurrency: int):
+        self.batch_id = batch_id
+        self.crew_id = crew_id
+        self.run_ids = run_ids
+        self.concurrency = concurrency
+        self.completed = 0
+        self.failed = 0
+        self._listeners: set[asyncio.Queue] = set()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    @classmethod
+    def get(cls, batch_id: str) -> "BatchExecution | None":
+        return cls._active.get(batch_id)
+
+    def start(self):
+        BatchExecution._active[self.batch_id] = self
+        self._task = asyncio.create_task(self.execute())
+
+    def stop(self) -> bool:
+        if self._task and not self._task.done():
+            self._stopping = True
+            self._task.cancel()
+            return True
+        return False
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self._listeners.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._listeners.discard(queue)
+
+    def _publish(self, line: dict):
+        for queue in self._listeners:
+            queue.put_nowait(line)
+
+    async def execute(self):
+        started = time.perf_counter()
+        try:
+            async with async_session() as session:
+                crew = (await session.execute(
+                    select(Crew)
+                    .options(selectinload(Crew.agents), selectinload(Crew.tasks))
+                    .where(Crew.id == self.crew_id)
+                )).scalar_one()
+            # Closing the session detaches the crew with its agents/tasks loaded
+            plan = CrewPlan(crew)
+            slots = asyncio.Semaphore(self.concurrency)
+            await asyncio.gather(*(
+                self._run_one(plan, slots, index, run_id) for index, run_id in enumerate(self.run_ids)
+            ))
+        except asyncio.CancelledError:
+            await self._fail_pending("Lote detenido antes de iniciar esta ejecución.")
+            raise
+        except Exception as e:
+            logger.error(f"Batch {self.batch_id} failed: {str(e)}")
+            await self._fail_pending(f"Error: {str(e)}")
+        finally:
+            BatchExecution._active.pop(self.batch_id, None)
+            self._publish({
+                "type": "summary",
+                "batch_id": self.batch_id,
+                "total": len(self.run_ids),
+                "completed": self.completed,
+                "failed": self.failed,
+                "stopped": self._stopping,
+                "elapsed_s": round(time.perf_counter() - started, 3),
+            })
+
+    async def _run_one(self, plan: CrewPlan, slots: asyncio.Semaphore, index: int, run_id: str):
+        async with slots:
+            try:
+                run = await Orchestrator(plan=plan).process_run(run_id, self.crew_id)
+                line = await result_line(run, index) if run else {
+                    "index": index, "run_id": run_id, "status": "failed", "error": "Run not found",
+                }
+            except asyncio.CancelledError:
+                # This run was stopped on its own (POST .../runs/{id}/stop); the batch goes on
+                if self._stopping:
+                    raise
+                line = {"index": index, "run_id": run_id, "status": "failed", "error": "cancelled"}
+            except Exception as e:
+                line = {"index": index, "run_id": run_id, "status": "failed", "error": str(e)}
+
+        if line["status"] == "completed":
+            self.completed += 1
+        else:
+            self.failed += 1
+        self._publish({
+            "type": "result",
+            **line,
+            "progress": {"done": self.completed + self.failed, "total": len(self.run_ids)},
+        })
+
+    async def _fail_pending(self, message: str):
+        async with async_session() as session:
+            await session.execute(
+                update(Run)
+                .where(Run.batch_id == self.batch_id, Run.status == "pending")
+                .values(status="failed", result=message, completed_at=datetime.now(timezone.utc))
+            )
+            await session.commit()
+
+
+async def fail_interrupted_batches() -> int:
+    """Fail the batch runs a previous process left pending or running. Returns how many.
+
+    A batch only executes in the process that started it, so after a restart
+    nothing would ever pick these up and the batch would report itself in
+    progress forever. Called once at startup, before any batch can start here.
+    """
+    async with async_session() as session:
+        result = await session.execute(
+            update(Run)
+            .where(Run.batch_id.is_not(None), Run.status.in_(("pending", "running")))
+            .values(
+                status="failed",
+                result="Lote interrumpido: el servidor se reinició antes de terminar esta ejecución.",
+                completed_at=datetime.now(timezone.utc),
+            )
+        )
+        await session.commit()
+    if result.rowcount:
+        logger.warning(f"Failed {result.rowcount} batch run(s) left unfinished by a previous process")
+    return result.rowcount or 0
+
+
+async def result_line(run: Run, index: int | None = None) -> dict:
+    """One JSONL result entry for a finished batch run."""
+    line = {
+        "index": run.batch_index if index is None else index,
+        "run_id": run.id,
+        "status": run.status,
+        "inputs": json.loads(run.inputs) if run.inputs else None,
+        "result": await read_run_result_async(run),
+        "tokens_used": run.tokens_used,
+        "cost": run.cost,
+    }
+    if run.status != "completed":
+        line["error"] = line["result"]
+    return line
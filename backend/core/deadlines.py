@@ -0,0 +1,51 @@
+import asyncio
+
+
+class DeadlineExceeded(Exception):
+    """A run or task ran out of time; the run ends as `timeout` rather than `failed`."""
+
+    def __init__(self, scope: str, seconds: float, task_name: str | None = None):
+        self.scope = scope  # "run" | "task"
+        self.seconds = seconds
+        self.task_name = task_name  # the task that was cut off, if any
+        if scope == "task":
+            message = f"La tarea '{task_name}' superó su límite de {seconds:g}s"
+        else:
+            message = f"La ejecución superó su límite de {seconds:g}s"
+            if task_name:
+                message += f" durante la tarea '{task_name}'"
+        super().__init__(message)
+
+
+class Deadline:
+    """An absolute end time on the event loop clock (`at` is None when there is no limit).
+
+    Created once per run and narrowed per task, so every LLM call, scrape and
+    search gets the time that is actually left instead of its own fixed timeout.
+    """
+
+    def __init__(self, seconds: float | None, scope: str = "run", task_name: str | None = None):
+        self.seconds = seconds or None
+        self.scope = scope
+        self.task_name = task_name
+        self.at = asyncio.get_running_loop().time() + seconds if seconds else None
+
+    def within(self, seconds: float | None, task_name: str) -> "Deadline":
+        """The sooner of this deadline and `seconds` from now (a task inside the run)."""
+        task = Deadline(seconds, "task", task_name)
+        if task.at is None or (self.at is not None and self.at <= task.at):
+            return self
+        return task
+
+    def remaining(self, cap: float | None = None) -> float | None:
+        """Seconds left (never below a millisecond), at most `cap`; None if unlimited and no cap."""
+        if self.at is None:
+            return cap
+        left = max(0.001, self.at - asyncio.get_running_loop().time())
+        return left if cap is None else min(cap, left)
+
+    def expired(self) -> bool:
+        return self.at is not None and asyncio.get_running_loop().time() >= self.at
+
+    def error(self, task_name: str | None = None) -> DeadlineExceeded:
+        return DeadlineExceeded(self.scope, self.seconds or 0, task_name or self.task_name)
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import random
+import time
+
+from config import settings
+from core.llm_resilience import is_transient
+
+logger = logging.getLogger(__name__)
+
+# A host that would have to load the model first counts as this many extra requests in flight
+COLD_PENALTY = 2
+
+
+def split_endpoints(api_base: str | None) -> list[str]:
+    """Base URLs of a `base_url` / OLLAMA_API_BASE value ("http://a:11434, http://b:11434")."""
+    if not api_base:
+        return []
+    return [url.strip().rstrip("/") for url in api_base.replace("\n", ",").split(",") if url.strip()]
+
+
+def _model_tag(model: str) -> str:
+    """Ollama tag of a LiteLLM model name: "ollama/llama3" -> "llama3:latest"."""
+    name = model.split("/", 1)[1] if "/" in model else model
+    return name if ":" in name else f"{name}:latest"
+
+
+class NoHealthyEndpointError(ConnectionError):
+    """Every endpoint of the pool is ejected or unhealthy (transient: retried, counts for the breaker)."""
+
+
+class Endpoint:
+    """One base URL of a pool with its health, load and latency."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = True            # last health check answered
+        self.ejected_until = 0.0       # monotonic time; ejected after consecutive errors
+        self.ejections = 0
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.latency_ms: float | None = None  # EWMA of successful calls
+        self.available: set[str] | None = None  # models the host has (None = not checked yet)
+        self.loaded: set[str] = set()          # models in memory (/api/ps or served recently)
+        self.last_check: float | None = None
+        self.last_error: str | None = None
+
+    def usable(self, now: float) -> bool:
+        return self.healthy and now >= self.ejected_until
+
+    def as_dict(self, now: float) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "ejected": now < self.ejected_until,
+            "ejected_for_s": round(max(0.0, self.ejected_until - now), 1),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "loaded_models": sorted(self.loaded),
+            "available_models": sorted(self.available) if self.available is not None else None,
+            "last_error": self.last_error,
+            "last_check": self.last_check,
+        }
+
+
+class EndpointPool:
+    """Several base URLs serving the same model.
+
+    Each call goes to the usable endpoint with the fewest outstanding requests
+    (hosts without the model loaded count COLD_PENALTY extra) and, on a tie,
+    the lowest latency. An endpoint that fails LLM_ENDPOINT_EJECT_AFTER calls
+    in a row is ejected for LLM_ENDPOINT_EJECT_SECONDS (doubling on repeated
+    ejections); one that fails its health check is skipped until it passes.
+    """
+
+    def __init__(self, model: str, urls: list[str]):
+        self.model = model
+        self.tag = _model_tag(model)
+        self.ollama = model.startswith(("ollama/", "ollama_chat/"))
+        self.endpoints = [Endpoint(url) for url in urls]
+
+    def pick(self) -> Endpoint:
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e.usable(now)]
+        if not candidates:
+            raise NoHealthyEndpointError(f"Ningún endpoint disponible para {self.model}")
+        # Hosts known not to have the model are last resort only
+        with_model = [e for e in candidates if e.available is None or self.tag in e.available]
+        candidates = with_model or candidates
+        return min(candidates, key=lambda e: (
+            e.outstanding + (0 if self.tag in e.loaded else COLD_PENALTY),
+            e.latency_ms if e.latency_ms is not None else 0.0,
+            random.random(),
+        ))
+
+    async def call(self, request):
+        """`await request(base_url)` on the chosen endpoint, recording load, latency and errors."""
+        endpoint = self.pick()
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        started = time.perf_counter()
+        try:
+            result = await request(endpoint.url)
+        except Exception as e:
+            if is_transient(e):
+                self._record_error(endpoint, e)
+            raise
+        finally:
+            endpoint.outstanding -= 1
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        endpoint.latency_ms = elapsed_ms if endpoint.latency_ms is None else 0.8 * endpoint.latency_ms + 0.2 * elapsed_ms
+        endpoint.consecutive_errors = 0
+        endpoint.ejections = 0
+        endpoint.loaded.add(self.tag)
+        return result
+
+    def _record_error(self, endpoint: Endpoint, error: BaseException):
+        endpoint.errors += 1
+        endpoint.consecutive_errors += 1
+        endpoint.last_error = str(error)[:200]
+        if endpoint.consecutive_errors >= settings.LLM_ENDPOINT_EJECT_AFTER:
+            seconds = settings.LLM_ENDPOINT_EJECT_SECONDS * 2 ** min(endpoint.ejections, 5)
+            endpoint.ejected_until = time.monotonic() + seconds
+            endpoint.ejections += 1
+            endpoint.consecutive_errors = 0
+            endpoint.loaded.discard(self.tag)
+            logger.warning(f"Endpoint {endpoint.url} ejected from {self.model} pool for {seconds:g}s: {str(error)}")
+
+    async def check(self, client):
+        await asyncio.gather(*(self._check_one(client, e) for e in self.endpoints))
+
+    async def _check_one(self, client, endpoint: Endpoint):
+        """Ollama: /api/tags (what the host has) and /api/ps (what is in memory); others: /models."""
+        try:
+            if self.ollama:
+                response = await client.get(f"{endpoint.url}/api/tags")
+                response.raise_for_status()
+                endpoint.available = {m.get("name") or m.get("model") for m in response.json().get("models", [])}
+                try:
+                    running = await client.get(f"{endpoint.url}/api/ps")
+                    if running.status_code == 200:
+                        endpoint.loaded = {m.get("name") or m.get("model") for m in running.json().get("models", [])}
+                except Exception:
+                    pass  # older Ollama without /api/ps: keep what we learned from served requests
+            else:
+                response = await client.get(f"{endpoint.url}/models")
+                response.raise_for_status()
+        except Exception as e:
+            if endpoint.healthy:
+                logger.warning(f"Endpoint {endpoint.url} failed its health check: {str(e)}")
+            endpoint.healthy = False
+            endpoint.last_error = str(e)[:200] or type(e).__name__
+        else:
+            if not endpoint.healthy:
+                logger.info(f"Endpoint {endpoint.url} is back in the {self.model} pool")
+            endpoint.healthy = True
+        endpoint.last_check = time.time()
+
+
+class EndpointPools:
+    """The pools of every multi-endpoint model, and the background health checks."""
+
+    def __init__(self):
+        self._pools: dict[tuple[str, str], EndpointPool] = {}
+        self._task: asyncio.Task | None = None
+        self._checks: set[asyncio.Task] = set()
+
+    def get(self, model: str, api_base: str | None) -> EndpointPool | None:
+        """The pool for this model and base URL list, or None when there is a single endpoint."""
+        urls = split_endpoints(api_base)
+        if len(urls) < 2:
+            return None
+        key = (model, ",".join(urls))
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = EndpointPool(model, urls)
+            if self._task is not None:
+                # First check right away instead of at the next interval
+                check = asyncio.create_task(self.check_all([pool]))
+                self._checks.add(check)
+                check.add_done_callback(self._checks.discard)
+        return pool
+
+    async def check_all(self, pools: list[EndpointPool] | None = None):
+        import httpx
+
+        async with httpx.AsyncClient(timeout=settings.LLM_ENDPOINT_CHECK_TIMEOUT) as client:
+            await asyncio.gather(*(pool.check(client) for pool in (pools or list(self._pools.values()))))
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(settings.LLM_ENDPOINT_CHECK_INTERVAL)
+            try:
+                await self.check_all()
+            except Exception as e:
+                logger.error(f"Endpoint health checks failed: {str(e)}")
+
+    def start(self):
+        if self._task is None and settings.LLM_ENDPOINT_CHECK_INTERVAL > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {"model": pool.model, "endpoints": [e.as_dict(now) for e in pool.endpoints]}
+            for pool in self._pools.values()
+        ]
+
+
+endpoint_pools = EndpointPools()
@@ -0,0 +1,65 @@
+import hashlib
+import json
+
+from core.inputs import render_inputs
+
+# Bump when the prompt layout changes, so outputs produced with the old one are not reused
+FINGERPRINT_VERSION = 1
+
+# Everything of an agent or task that ends up in its prompt or in how it is executed
+AGENT_FIELDS = (
+    "name", "role", "goal", "backstory", "llm_model", "temperature", "max_tokens",
+    "skills", "is_manager", "web_search_enabled", "tool_mode",
+)
+TASK_FIELDS = (
+    "name", "description", "expected_output", "kind", "map_source", "map_input", "reduce_batch_size",
+)
+
+
+def output_hash(output: str) -> str:
+    return hashlib.sha256((output or "").encode("utf-8")).hexdigest()
+
+
+def tool_context_hash(task, agent, inputs: dict) -> str:
+    """What the agent's tools are pointed at: scraped pages, web search query, MCP servers.
+
+    Hashes the targets, not what they return: re-running with `changed` does
+    not fetch anything, so a page that changed on its own is not detected.
+    """
+    try:
+        skills = json.loads(agent.skills or "[]")
+    except ValueError:
+        skills = []
+    context = {
+        "pages": [render_inputs(s["target"], inputs) for s in skills if s.get("type") == "scraping" and s.get("target")],
+        "mcp": [s["target"] for s in skills if s.get("type") == "mcp" and s.get("target")],
+        "search": render_inputs(task.description, inputs)[:200] if agent.web_search_enabled else None,
+        "mode": agent.tool_mode or "prefetch",
+    }
+    return hashlib.sha256(json.dumps(context, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def task_fingerprint(crew, task, agent, inputs: dict, previous_results: list[dict]) -> str:
+    """sha256 of everything a task's output depends on.
+
+    Agent config, task text, run inputs, tool context, the crew settings that
+    shape the prompt, and the hashes of the upstream outputs it receives as
+    context. Two executions with the same fingerprint get the same prompt, so
+    a `changed` run can reuse the earlier output instead of calling the LLM.
+    """
+    manager = next((a for a in crew.agents if a.is_manager), None)
+    payload = {
+        "version": FINGERPRINT_VERSION,
+        "agent": {field: getattr(agent, field, None) for field in AGENT_FIELDS},
+        "task": {field: getattr(task, field, None) for field in TASK_FIELDS},
+        "crew": {
+            "process": crew.process,
+            "manager": [manager.name, manager.role] if manager and manager is not agent else None,
+            "public": bool(crew.is_public),
+        },
+        "inputs": inputs,
+        "tools": tool_context_hash(task, agent, inputs),
+        "upstream": [[r["task"], r["agent"], output_hash(r["output"])] for r in previous_results],
+    }
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
@@ -0,0 +1,27 @@
+import json
+import re
+
+# {{name}} placeholders in task texts, filled from the run's inputs
+PLACEHOLDER = re.compile(r"\{\{\s*([A-Za-z_][\w.-]*)\s*\}\}")
+
+
+def format_value(value) -> str:
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def render_inputs(text: str | None, inputs: dict) -> str:
+    """Replace `{{name}}` with the input value; unknown names are left as they are."""
+    if not text or not inputs:
+        return text or ""
+    return PLACEHOLDER.sub(
+        lambda m: format_value(inputs[m.group(1)]) if m.group(1) in inputs else m.group(0),
+        text,
+    )
+
+
+def unreferenced_inputs(inputs: dict, *texts: str | None) -> dict:
+    """Inputs that no placeholder in `texts` mentions (they are listed in the prompt instead)."""
+    if not inputs:
+        return {}
+    used = {name for text in texts if text for name in PLACEHOLDER.findall(text)}
+    return {k: v for k, v in inputs.items() if k not in used}
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import random
+import time
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+TRANSIENT_STATUS = {408, 409, 425, 429}
+
+# LiteLLM exception names (matched by name, so litellm is not imported here)
+TRANSIENT_ERRORS = {
+    "Timeout", "APITimeoutError", "APIConnectionError", "RateLimitError",
+    "ServiceUnavailableError", "InternalServerError", "BadGatewayError",
+}
+
+
+class CircuitOpenError(Exception):
+    """The model's circuit is open: calls fail at once until the cooldown ends."""
+
+    def __init__(self, key: str, retry_in: float):
+        self.key = key
+        self.retry_in = retry_in
+        super().__init__(f"Proveedor no disponible para {key} (circuito abierto, reintento en {retry_in:.0f}s)")
+
+
+class TaskFailedError(Exception):
+    """A task could not produce an output; the run stops instead of passing an error downstream."""
+
+    def __init__(self, task_name: str, cause: BaseException | str, tokens: int = 0):
+        self.task_name = task_name
+        self.cause = cause
+        self.tokens = tokens  # spent before failing (e.g. map items that did complete)
+        super().__init__(f"Tarea '{task_name}' falló: {cause}")
+
+
+def is_transient(error: BaseException) -> bool:
+    """True for errors a retry may fix (network, timeouts, 429 and 5xx); False for auth, bad requests..."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status in TRANSIENT_STATUS or status >= 500
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+def backoff_delay(attempt: int, base: float | None = None, cap: float | None = None) -> float:
+    """Exponential backoff with full jitter: uniform in [0, min(cap, base * 2^attempt)]."""
+    base = settings.LLM_RETRY_BASE_DELAY if base is None else base
+    cap = settings.LLM_RETRY_MAX_DELAY if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker for one model endpoint.
+
+    `closed` lets everything through. After `threshold` transient failures in
+    a row it goes `open` and rejects calls for `cooldown` seconds; then one
+    probe call is let through (`half_open`): success closes it, failure opens
+    it again.
+    """
+
+    def __init__(self, key: str, threshold: int, cooldown: float):
+        self.key = key
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def before_call(self):
+        if self.state == "closed":
+            return
+        if self.state == "open":
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(self.key, remaining)
+            self.state = "half_open"
+        if self._probing:
+            raise CircuitOpenError(self.key, 0)
+        self._probing = True
+
+    def release(self):
+        """End a call that says nothing about the provider's health (cancelled, bad request)."""
+        self._probing = False
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info(f"Circuit for {self.key} closed")
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self._probing = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                logger.warning(f"Circuit for {self.key} opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def as_dict(self) -> dict:
+        return {"key": self.key, "state": self.state, "failures": self.failures}
+
+
+# One breaker per model + api_base, shared by every run in the process
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def breaker_for(model: str, api_base: str | None) -> CircuitBreaker:
+    key = f"{model}@{api_base}" if api_base else model
+    breaker = _breakers.get(key)
+    if breaker is None:
+        breaker = _breakers[key] = CircuitBreaker(
+            key, settings.LLM_BREAKER_THRESHOLD, settings.LLM_BREAKER_COOLDOWN_SECONDS
+        )
+    return breaker
+
+
+def breaker_states() -> list[dict]:
+    return [b.as_dict() for b in _breakers.values()]
+
+
+async def call_with_retries(breaker: CircuitBreaker, call, retries: int, on_retry=None):
+    """`await call()` through the breaker, retrying transient errors with jittered backoff.
+
+    Permanent errors (auth, bad request) are raised at once and do not count
+    against the breaker. `on_retry(attempt, error, delay)` is called before
+    each wait. Returns `(result, attempts)`.
+    """
+    for attempt in range(retries + 1):
+        breaker.before_call()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            if not is_transient(e):
+                breaker.release()
+                raise
+            breaker.record_failure()
+            if attempt == retries or breaker.state == "open":
+                raise
+            delay = backoff_delay(attempt)
+            if on_retry:
+                on_retry(attempt + 1, e, delay)
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        return result, attempt + 1
@@ -0,0 +1,321 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import re
+import time
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = "2024-11-05"
+
+
+class MCPError(Exception):
+    """The MCP server answered a request with a JSON-RPC error."""
+
+
+class MCPSessionClosed(ConnectionError):
+    """The server process exited (or never started); the pool restarts it on next use.
+
+    `sent` tells whether the request had already been written: if so the
+    server may have acted on it before dying, so it must not be re-sent blindly.
+    """
+
+    def __init__(self, message: str, sent: bool = False):
+        super().__init__(message)
+        self.sent = sent
+
+
+def server_config(server) -> dict:
+    """Plain dict of an `MCPServer` row (args/env parsed), safe to keep outside a DB session."""
+    return {
+        "id": server.id,
+        "name": server.name,
+        "command": server.command,
+        "args": json.loads(server.args or "[]"),
+        "env": json.loads(server.env or "{}"),
+    }
+
+
+class MCPSession:
+    """One long-lived MCP server subprocess speaking JSON-RPC 2.0 over stdio.
+
+    Requests are multiplexed by id, so concurrent tool calls share the
+    process. The tool list is fetched once and kept until the server says it
+    changed (`notifications/tools/list_changed`) or the process restarts.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.process: asyncio.subprocess.Process | None = None
+        self.started_at: float | None = None
+        self.calls = 0
+        self.errors = 0
+        self._ids = itertools.count(1)
+        self._pending: dict[int, asyncio.Future] = {}
+        self._reader: asyncio.Task | None = None
+        self._stderr: asyncio.Task | None = None
+        self._tools: list[dict] | None = None
+
+    @property
+    def alive(self) -> bool:
+        return (
+            self.process is not None and self.process.returncode is None
+            and self._reader is not None and not self._reader.done()
+        )
+
+    @property
+    def tool_count(self) -> int | None:
+        return len(self._tools) if self._tools is not None else None
+
+    async def start(self):
+        env = {**os.environ, **{k: str(v) for k, v in self.config["env"].items()}}
+        self.process = await asyncio.create_subprocess_exec(
+            self.config["command"], *self.config["args"],
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=env,
+            limit=settings.MCP_MAX_MESSAGE_BYTES,
+        )
+        self._reader = asyncio.create_task(self._read_loop())
+        self._stderr = asyncio.create_task(self._drain_stderr())
+        try:
+            await self.request("initialize", {
+                "protocolVersion": PROTOCOL_VERSION,
+                "capabilities": {},
+                "clientInfo": {"name": settings.APP_NAME, "version": settings.APP_VERSION},
+            }, timeout=settings.MCP_STARTUP_TIMEOUT)
+            await self._send({"jsonrpc": "2.0", "method": "notifications/initialized"})
+        except BaseException:
+            await self.close()
+            raise
+        self.started_at = time.time()
+
+    async def _send(self, message: dict):
+        if not self.alive:
+            raise MCPSessionClosed(f"MCP server '{self.config['name']}' is not running")
+        self.process.stdin.write(json.dumps(message).encode("utf-8") + b"\n")
+        try:
+            await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as e:
+            # Part of the message may have reached the server
+            raise MCPSessionClosed(f"MCP server '{self.config['name']}' closed its input", sent=True) from e
+
+    async def request(self, method: str, params: dict | None = None, timeout: float | None = None):
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._send({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}})
+            return await asyncio.wait_for(future, timeout or settings.MCP_CALL_TIMEOUT)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _read_loop(self):
+        try:
+            while True:
+                line = await self.process.stdout.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue  # servers sometimes log to stdout
+                if "id" in message and ("result" in message or "error" in message):
+                    future = self._pending.get(message["id"])
+                    if future is None or future.done():
+                        continue
+                    if "error" in message:
+                        error = message["error"] or {}
+                        future.set_exception(MCPError(error.get("message") or json.dumps(error)))
+                    else:
+                        future.set_result(message["result"])
+                elif "id" in message and "method" in message:
+                    # Server -> client request (ping, sampling...): only ping is supported
+                    reply = {"jsonrpc": "2.0", "id": message["id"]}
+                    if message["method"] == "ping":
+                        reply["result"] = {}
+                    else:
+                        reply["error"] = {"code": -32601, "message": "Method not found"}
+                    await self._send(reply)
+                elif message.get("method") == "notifications/tools/list_changed":
+                    self._tools = None
+        except Exception as e:
+            logger.warning(f"MCP server '{self.config['name']}' reader stopped: {str(e)}")
+        finally:
+            closed = MCPSessionClosed(f"MCP server '{self.config['name']}' exited", sent=True)
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(closed)
+
+    async def _drain_stderr(self):
+        while True:
+            line = await self.process.stderr.readline()
+            if not line:
+                return
+            logger.debug(f"[mcp:{self.config['name']}] {line.decode('utf-8', 'replace').rstrip()}")
+
+    async def list_tools(self) -> list[dict]:
+        if self._tools is None:
+            tools, cursor = [], None
+            while True:
+                result = await self.request("tools/list", {"cursor": cursor} if cursor else {})
+                tools.extend(result.get("tools", []))
+                cursor = result.get("nextCursor")
+                if not cursor:
+                    break
+            self._tools = tools
+        return self._tools
+
+    async def call_tool(self, name: str, arguments: dict, timeout: float | None = None) -> tuple[str, bool]:
+        """(text of the result, is_error)."""
+        self.calls += 1
+        result = await self.request("tools/call", {"name": name, "arguments": arguments}, timeout=timeout)
+        parts = []
+        for block in result.get("content", []):
+            if block.get("type") == "text":
+                parts.append(block.get("text", ""))
+            elif block.get("type") == "resource" and "text" in block.get("resource", {}):
+                parts.append(block["resource"]["text"])
+            else:
+                parts.append(json.dumps(block, ensure_ascii=False))
+        if result.get("isError"):
+            self.errors += 1
+        return "\n".join(parts), bool(result.get("isError"))
+
+    async def close(self):
+        if self.process is not None and self.process.returncode is None:
+            try:
+                self.process.stdin.close()
+                await asyncio.wait_for(self.process.wait(), 2)
+            except Exception:
+                self.process.kill()
+                await self.process.wait()
+        for task in (self._reader, self._stderr):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+class MCPPool:
+    """Long-lived MCP sessions keyed by server id, shared by every task and run of the process.
+
+    A session starts on first use (or at startup with MCP_START_ON_BOOT); if
+    its process dies it is started again on the next call. A call is only
+    retried if the session died before the request was written. Editing or deleting a server closes
+    its session.
+    """
+
+    def __init__(self):
+        self._sessions: dict[str, MCPSession] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._restarts: dict[str, int] = {}
+
+    async def session(self, config: dict) -> MCPSession:
+        session = self._sessions.get(config["id"])
+        if session is not None and session.alive and session.config == config:
+            return session
+        async with self._locks.setdefault(config["id"], asyncio.Lock()):
+            session = self._sessions.get(config["id"])
+            if session is not None and session.alive and session.config == config:
+                return session
+            if session is not None:
+                if session.config == config:
+                    self._restarts[config["id"]] = self._restarts.get(config["id"], 0) + 1
+                    logger.warning(f"Restarting MCP server '{config['name']}'")
+                await session.close()
+            session = MCPSession(config)
+            await session.start()
+            self._sessions[config["id"]] = session
+            return session
+
+    async def list_tools(self, config: dict) -> list[dict]:
+        return await (await self.session(config)).list_tools()
+
+    async def call_tool(self, config: dict, name: str, arguments: dict, timeout: float | None = None) -> tuple[str, bool]:
+        """Call a tool, on a restarted session if the old one was found dead before sending.
+
+        A call cut by a crash after it was sent is not repeated (tools may have
+        side effects): the error is raised and the next call restarts the server.
+        """
+        for attempt in range(2):
+            session = await self.session(config)
+            try:
+                return await session.call_tool(name, arguments, timeout=timeout)
+            except MCPSessionClosed as e:
+                if e.sent or attempt == 1:
+                    raise
+
+    async def start_all(self, configs: list[dict]):
+        for config in configs:
+            try:
+                await self.session(config)
+            except Exception as e:
+                logger.error(f"Could not start MCP server '{config['name']}': {str(e)}")
+
+    async def close(self, server_id: str):
+        session = self._sessions.pop(server_id, None)
+        if session is not None:
+            await session.close()
+
+    async def close_all(self):
+        for server_id in list(self._sessions):
+            await self.close(server_id)
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                "id": server_id,
+                "name": session.config["name"],
+                "alive": session.alive,
+                "pid": session.process.pid if session.process else None,
+                "started_at": session.started_at,
+                "restarts": self._restarts.get(server_id, 0),
+                "calls": session.calls,
+                "errors": session.errors,
+                "tools": session.tool_count,
+            }
+            for server_id, session in self._sessions.items()
+        ]
+
+
+def tool_function_name(server_name: str, tool_name: str) -> str:
+    """Function name exposed to the LLM: `<server>__<tool>`, limited to [a-zA-Z0-9_-]{1,64}."""
+    server = re.sub(r"[^a-zA-Z0-9_-]+", "_", server_name).strip("_") or "mcp"
+    return f"{server}__{re.sub(r'[^a-zA-Z0-9_-]+', '_', tool_name)}"[:64]
+
+
+async def mcp_tools(configs: list[dict]) -> dict[str, tuple[dict, object]]:
+    """LLM tools for these servers: {function name: (OpenAI tool schema, async call(arguments, timeout) -> str)}.
+
+    A server that cannot start is skipped (logged); its tools are simply not offered.
+    """
+    tools = {}
+    for config in configs:
+        try:
+            listed = await mcp_pool.list_tools(config)
+        except Exception as e:
+            logger.error(f"MCP server '{config['name']}' unavailable: {str(e)}")
+            continue
+        for tool in listed:
+            name = tool_function_name(config["name"], tool["name"])
+
+            async def call(arguments: dict, timeout: float | None = None, config=config, tool_name=tool["name"]) -> str:
+                text, is_error = await mcp_pool.call_tool(config, tool_name, arguments, timeout=timeout)
+                return f"Error: {text}" if is_error else text
+
+            tools[name] = ({
+                "type": "function",
+                "function": {
+                    "name": name,
+                    "description": (tool.get("description") or tool["name"])[:1024],
+                    "parameters": tool.get("inputSchema") or {"type": "object", "properties": {}},
+                },
+            }, call)
+    return tools
+
+
+mcp_pool = MCPPool()
@@ -1,18 +1,91 @@
 import json
 import asyncio
+import functools
+import logging
+import re
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from models.models import Crew, Run, Agent, Task, LLMConfig
+from sqlalchemy import select, update
+from models.models import Crew, Run, Agent, Task, LLMConfig, MCPServer
 
-import litellm
 from config import settings
 from utils.email import send_workflow_report
+from utils.blob_store import offload_run_payloads_async
+from core.run_events import run_events
+from core.tracing import start_run_trace, span, set_attributes
+from core.inputs import render_inputs, unreferenced_inputs, format_value
+from core.semantic_cache import semantic_cache, cache_namespace, embed, new_stats, summarize_stats
+from core.deadlines import Deadline, DeadlineExceeded
+from core.fingerprints import task_fingerprint
+from core.endpoint_pool import endpoint_pools, split_endpoints
+from core.mcp_pool import mcp_tools, server_config
+from core.llm_resilience import (
+    TaskFailedError, breaker_for, call_with_retries, backoff_delay, is_transient,
+)
 
 # Configure Ollama API base for LiteLLM
 import os
-os.environ["OLLAMA_API_BASE"] = settings.OLLAMA_API_BASE
+# (the first one when OLLAMA_API_BASE lists several; calls pick theirs from the pool)
+os.environ["OLLAMA_API_BASE"] = (split_endpoints(settings.OLLAMA_API_BASE) or [settings.OLLAMA_API_BASE])[0]
 
+logger = logging.getLogger(__name__)
+
+# A provider timeout this close to the task deadline was caused by the deadline
+DEADLINE_SLACK_SECONDS = 0.05
+
+
+def supports_cache_control(model: str) -> bool:
+    """Models that take Anthropic-style `cache_control` breakpoints in message content."""
+    provider, _, name = model.rpartition("/")
+    return provider.split("/")[0] == "anthropic" or "claude" in name
+
+
+def prompt_messages(model: str, system_prompt: str, user_segments: list[str]) -> list[dict]:
+    """Chat messages with the stable prefix first.
+
+    For models that support it, the system prompt and every user segment but
+    the last (volatile) one end in a cache breakpoint (at most 3 of the 4
+    Anthropic allows). Other providers get plain strings; they cache prefixes
+    on their own.
+    """
+    segments = [s for s in user_segments if s]
+    if not settings.PROMPT_CACHE_BREAKPOINTS or not supports_cache_control(model):
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": "".join(segments)},
+        ]
+    breakpoint = {"type": "ephemeral"}
+    blocks = [{"type": "text", "text": s} for s in segments]
+    for block in blocks[:-1]:
+        block["cache_control"] = breakpoint
+    return [
+        {"role": "system", "content": [{"type": "text", "text": system_prompt, "cache_control": breakpoint}]},
+        {"role": "user", "content": blocks},
+    ]
+
+
+def cached_prompt_tokens(usage) -> tuple[int, int]:
+    """(prompt tokens read from the provider cache, tokens written to it) from a LiteLLM usage."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or getattr(usage, "cache_read_input_tokens", None) or 0
+    written = getattr(usage, "cache_creation_input_tokens", None) or 0
+    return int(cached), int(written)
+
+
+@dataclass
+class CrewPlan:
+    """A crew loaded once and shared read-only by many runs (e.g. the runs of a batch).
+
+    `crew` must have its agents and tasks loaded; it stays detached from the
+    runs' sessions. LLM settings, MCP server configs and tool results are
+    cached per plan, so a batch looks each model up once and fetches each
+    URL/query once.
+    """
+    crew: Crew
+    llm_settings: dict[str, tuple] = field(default_factory=dict)
+    mcp_servers: dict[str, dict | None] = field(default_factory=dict)
+    tool_results: dict[tuple, asyncio.Future] = field(default_factory=dict)
 
 
 class Orchestrator:
@@ -21,15 +94,50 @@ class Orchestrator:
     # Global registry for active execution tasks: {run_id: asyncio.Task}
     _active_tasks: dict[str, asyncio.Task] = {}
 
-    def __init__(self, db: AsyncSession = None):
+    def __init__(self, db: AsyncSession = None, plan: CrewPlan | None = None):
         self.db = db
+        self.plan = plan
+        self.inputs: dict = {}
+        # Set per run when the crew opts into the semantic prompt cache
+        self.crew_id: str | None = None
+        self.semantic_threshold: float | None = None
+        self.semantic_stats = new_stats()
+        # Provider prompt-cache usage: one entry per executed task
+        self.task_usage: dict | None = None
+        self.prompt_usage: list[dict] = []
+        # Time budget: the run's deadline, narrowed to the current task's while it executes
+        self.deadline: Deadline | None = None
+        self.task_deadline: Deadline | None = None
+        # Scrape/search results of this run (the plan's cache is used instead when there is one)
+        self.tool_results: dict[tuple, asyncio.Future] = {}
+        # Output and fingerprint of every finished task, stored on the run for later `changed` runs
+        self.task_outputs: list[dict] = []
+        # Set for `changed` runs: tasks reused from earlier runs instead of executed
+        self.reuse_stats: dict | None = None
         self._ws_connections: dict[str, list] = {}
 
+    async def create_run(
+        self, crew: Crew, inputs: dict | None = None, mode: str = "full", status: str = "running",
+    ) -> Run:
+        """Persist a new Run for the crew using `self.db` (`pending` ones start in process_run)."""
+        run = Run(
+            crew_id=crew.id,
+            status=status,
+            inputs=json.dumps(inputs, ensure_ascii=False) if inputs else None,
+            mode=mode,
+            started_at=datetime.now(timezone.utc),
+        )
+        self.db.add(run)
+        await self.db.commit()
+        await self.db.refresh(run)
+        return run
+
     async def process_run(self, run_id: str, crew_id: str):
         """Execute all tasks in a crew sequentially (background task) with self-managed session."""
         from db.database import async_session
         from sqlalchemy import select
         from sqlalchemy.orm import selectinload
+        from sqlalchemy.orm.attributes import set_committed_value
         
         async with async_session() as session:
             self.db = session
@@ -38,17 +146,35 @@ class Orchestrator:
             result = await session.execute(select(Run).where(Run.id == run_id))
             run = result.scalar_one_or_none()
             
-            result_crew = await session.execute(
-                select(Crew)
-                .options(selectinload(Crew.agents), selectinload(Crew.tasks))
-                .where(Crew.id == crew_id)
-            )
-            crew = result_crew.scalar_one_or_none()
+            if self.plan:
+                # Shared, already-loaded crew: attach it to the run without adding it to this session
+                crew = self.plan.crew
+                if run:
+                    set_committed_value(run, "crew", crew)
+            else:
+                result_crew = await session.execute(
+                    select(Crew)
+                    .options(selectinload(Crew.agents), selectinload(Crew.tasks))
+                    .where(Crew.id == crew_id)
+                )
+                crew = result_crew.scalar_one_or_none()
             
             if not run or not crew:
                 print(f"❌ Error: Run {run_id} or Crew {crew_id} not found in background task.")
                 return
 
+            self.inputs = json.loads(run.inputs) if run.inputs else {}
+            self.crew_id = crew.id
+            if crew.semantic_cache_enabled:
+                self.semantic_threshold = (
+                    crew.semantic_cache_threshold if crew.semantic_cache_threshold is not None
+                    else settings.SEMANTIC_CACHE_THRESHOLD
+                )
+            if run.status == "pending":
+                # Queued by a batch: starts now
+                run.status = "running"
+                run.started_at = datetime.now(timezone.utc)
+
             # Register core task for cancellation
             try:
                 current_task = asyncio.current_task()
@@ -57,13 +183,32 @@ class Orchestrator:
             except Exception:
                 pass
 
+            # The clock starts when the run starts executing, not when it was queued
+            self.deadline = Deadline(
+                crew.run_timeout_seconds if crew.run_timeout_seconds is not None else settings.RUN_TIMEOUT_SECONDS
+            )
+            task_timeout = (
+                crew.task_timeout_seconds if crew.task_timeout_seconds is not None else settings.TASK_TIMEOUT_SECONDS
+            )
+
+            trace = start_run_trace(run.id, crew_id=crew.id, crew_name=crew.name)
+            # Stop requests from other workers arrive through the run's row
+            cancel_watch = asyncio.create_task(self._watch_cancel(run.id, current_task)) if current_task else None
+            task_items = []
+            results = []
+            total_tokens = 0
             try:
+                # Outputs of earlier runs by fingerprint: a `changed` run only executes what changed
+                reusable = {}
+                if run.mode == "changed":
+                    reusable = await self._reusable_outputs(crew.id, run.id)
+                    self.reuse_stats = {"reused": 0, "executed": 0, "saved_tokens": 0, "tasks": []}
+
                 # 1. Prepare tasks
                 if crew.tasks:
                     sorted_tasks = sorted(crew.tasks, key=lambda t: t.order)
                     task_items = [(task, self._find_agent_for_task(task, crew.agents)) for task in sorted_tasks]
                 else:
-                    task_items = []
                     for agent in crew.agents:
                         if agent.task_description:
                             v_task = Task(
@@ -74,9 +219,6 @@ class Orchestrator:
                             task_items.append((v_task, agent))
 
                 # 2. Execute tasks
-                results = []
-                total_tokens = 0
-
                 for task, agent in task_items:
                     if not agent:
                         run.add_log(
@@ -85,35 +227,63 @@ class Orchestrator:
                         )
                         agent = crew.agents[0]
 
-                    run.add_log(
-                        f"🚀 Iniciando tarea: {task.name}",
-                        agent_name=agent.name,
-                        level="info"
-                    )
-                    await self.db.commit()
+                    if self.deadline.expired():
+                        raise self.deadline.error()
 
-                    # Execute the task with the assigned agent
-                    result, tokens = await self._execute_task(task, agent, results, run)
+                    with span("task", task=task.name, agent=agent.name, model=agent.llm_model) as task_span:
+                        fingerprint = task_fingerprint(crew, task, agent, self.inputs, results)
+                        reused = reusable.get(fingerprint)
+                        if reused is not None:
+                            # Same agent, text, inputs, tools and upstream outputs: same prompt, same answer
+                            set_attributes(task_span, reused=True, output_chars=len(reused["output"]))
+                            results.append({"task": task.name, "agent": agent.name, "output": reused["output"]})
+                            self._record_task_output(run, results[-1], fingerprint, reused.get("tokens", 0), reused=True)
+                            run.add_log(
+                                f"♻️ Tarea sin cambios, se reutiliza su resultado anterior: {task.name}",
+                                agent_name=agent.name,
+                                level="info"
+                            )
+                            continue
 
-                    total_tokens += tokens
-                    results.append({
-                        "task": task.name,
-                        "agent": agent.name,
-                        "output": result,
-                    })
+                        run.add_log(
+                            f"🚀 Iniciando tarea: {task.name}",
+                            agent_name=agent.name,
+                            level="info"
+                        )
+                        await self._commit()
+                        run_events.publish(run.id)
 
-                    run.add_log(
-                        f"✅ Tarea completada: {task.name}",
-                        agent_name=agent.name,
-                        level="success"
-                    )
-                    await self.db.commit()
+                        # Execute the task with the assigned agent
+                        self.task_usage = {
+                            "task": task.name, "calls": 0, "prompt_tokens": 0,
+                            "cached_tokens": 0, "cache_write_tokens": 0,
+                        }
+                        self.prompt_usage.append(self.task_usage)
+                        self.task_deadline = self.deadline.within(task_timeout, task.name)
+                        result, tokens = await self._execute_with_deadline(task, agent, results, run)
+                        set_attributes(
+                            task_span, tokens=tokens, output_chars=len(result or ""),
+                            cached_tokens=self.task_usage["cached_tokens"],
+                        )
+
+                        total_tokens += tokens
+                        results.append({
+                            "task": task.name,
+                            "agent": agent.name,
+                            "output": result,
+                        })
+                        self._record_task_output(run, results[-1], fingerprint, tokens)
+
+                        run.add_log(
+                            f"✅ Tarea completada: {task.name}",
+                            agent_name=agent.name,
+                            level="success"
+                        )
+                        await self._commit()
+                        run_events.publish(run.id)
 
                 # 3. Finalize run
-                final_result = "<br><hr><br>".join(
-                    f"## {r['task']}\n**Agente:** {r['agent']}\n\n{r['output']}"
-                    for r in results
-                )
+                final_result = self._format_final_result(results)
 
                 run.status = "completed"
                 run.result = final_result
@@ -121,12 +291,32 @@ class Orchestrator:
                 run.cost = self._estimate_cost(total_tokens)
                 run.completed_at = datetime.now(timezone.utc)
                 run.add_log("🎉 Ejecución completada exitosamente.", level="success")
+                if self.semantic_threshold is not None:
+                    stats = self.semantic_stats
+                    run.add_log(
+                        f"♻️ Caché semántica: {stats['hits']} aciertos, {stats['misses']} fallos, "
+                        f"{stats['saved_tokens']} tokens ahorrados.",
+                        level="info"
+                    )
+                if self.reuse_stats is not None:
+                    stats = self.reuse_stats
+                    run.add_log(
+                        f"♻️ Re-ejecución de cambios: {stats['reused']} tarea(s) reutilizadas, "
+                        f"{stats['executed']} ejecutadas, {stats['saved_tokens']} tokens ahorrados.",
+                        level="info"
+                    )
                 
                 # Send Email Report if configured
                 if crew.output_email:
                     run.add_log(f"📧 Enviando reporte por email a: {crew.output_email}", level="info")
-                    await send_workflow_report(crew.output_email, crew.name, final_result)
+                    with span("email", to=crew.output_email, bytes=len(final_result.encode("utf-8"))) as email_span:
+                        sent = await send_workflow_report(crew.output_email, crew.name, final_result)
+                        set_attributes(email_span, sent=bool(sent))
 
+                self._record_cache_stats(run)
+                if trace:
+                    trace.finish(run)
+                await offload_run_payloads_async(run)
                 await self.db.commit()
 
             except asyncio.CancelledError:
@@ -134,26 +324,119 @@ class Orchestrator:
                 run.result = "Ejecución cancelada por el usuario."
                 run.completed_at = datetime.now(timezone.utc)
                 run.add_log("🛑 La ejecución fue detenida manualmente.", level="warning")
+                self._record_cache_stats(run)
+                if trace:
+                    trace.finish(run, error=asyncio.CancelledError("cancelled"))
+                await offload_run_payloads_async(run)
                 await self.db.commit()
                 raise
+            except DeadlineExceeded as e:
+                run.status = "timeout"
+                run.result = f"Tiempo agotado: {str(e)}"
+                run.tokens_used = total_tokens
+                run.cost = self._estimate_cost(total_tokens)
+                run.completed_at = datetime.now(timezone.utc)
+                run.add_log(f"⏱️ {str(e)}; la ejecución se detuvo.", level="error")
+                skipped = len(task_items) - len(results) - (1 if e.task_name else 0)
+                if skipped > 0:
+                    run.add_log(f"⏭️ {skipped} tarea(s) restantes no se ejecutaron.", level="warning")
+                self._record_cache_stats(run)
+                if trace:
+                    trace.finish(run, error=e)
+                await offload_run_payloads_async(run)
+                await self.db.commit()
+            except TaskFailedError as e:
+                # A task without output stops the run: later tasks would only get an error as context
+                total_tokens += e.tokens
+                run.status = "failed"
+                run.result = f"Error: {str(e)}"
+                run.tokens_used = total_tokens
+                run.cost = self._estimate_cost(total_tokens)
+                run.completed_at = datetime.now(timezone.utc)
+                run.add_log(f"❌ {str(e)}", level="error")
+                skipped = len(task_items) - len(results) - 1
+                if skipped > 0:
+                    run.add_log(f"⏭️ {skipped} tarea(s) restantes no se ejecutaron.", level="warning")
+                self._record_cache_stats(run)
+                if trace:
+                    trace.finish(run, error=e)
+                await offload_run_payloads_async(run)
+                await self.db.commit()
             except Exception as e:
                 run.status = "failed"
                 run.result = f"Error: {str(e)}"
                 run.completed_at = datetime.now(timezone.utc)
                 run.add_log(f"❌ Error durante la ejecución: {str(e)}", level="error")
+                self._record_cache_stats(run)
+                if trace:
+                    trace.finish(run, error=e)
+                await offload_run_payloads_async(run)
                 await self.db.commit()
             finally:
                 # Unregister task
                 if run.id in Orchestrator._active_tasks:
                     del Orchestrator._active_tasks[run.id]
+                if cancel_watch:
+                    cancel_watch.cancel()
+                if trace:
+                    trace.detach()
+                run_events.publish(run.id)
             
             await self.db.refresh(run)
             return run
 
+    async def _execute_with_deadline(
+        self, task: Task, agent: Agent, previous_results: list[dict], run: Run
+    ) -> tuple[str, int]:
+        """Execute the task, cancelling it if `self.task_deadline` passes (raises DeadlineExceeded)."""
+        timeout = asyncio.timeout_at(self.task_deadline.at)
+        try:
+            async with timeout:
+                if task.kind == "map_reduce":
+                    return await self._execute_map_reduce(task, agent, previous_results, run)
+                return await self._execute_task(task, agent, previous_results, run)
+        except DeadlineExceeded as e:
+            if e.task_name is None:
+                raise self.task_deadline.error(task.name) from e
+            raise
+        except (TimeoutError, TaskFailedError) as e:
+            # Also when the LLM call hit its own (deadline-sized) timeout just before we did
+            if timeout.expired() or self.task_deadline.expired():
+                raise self.task_deadline.error(task.name) from e
+            raise
+
+    def _time_left(self, cap: float | None = None) -> float | None:
+        """Seconds left for the current task (at most `cap`), None when unlimited."""
+        return self.task_deadline.remaining(cap) if self.task_deadline else cap
+
+    def _deadline_hit(self) -> bool:
+        """The current task's deadline has (all but) passed: a timeout now is ours, not the provider's."""
+        left = self._time_left()
+        return left is not None and left <= DEADLINE_SLACK_SECONDS
+
     async def _execute_task(
         self, task: Task, agent: Agent, previous_results: list[dict], run: Run
     ) -> tuple[str, int]:
         """Execute a single task using an LLM via LiteLLM."""
+        # Function calling: scraping and web search become tools the model calls only if it needs them
+        function_calling = agent.tool_mode == "function_calling"
+        scraping_context = "" if function_calling else await self._prefetch_context(task, agent, run)
+
+        system_prompt, user_segments = self._build_prompts(task, agent, previous_results, run, scraping_context)
+
+        try:
+            tools = await self._agent_mcp_tools(agent, run)
+            if function_calling:
+                tools = {**self._builtin_tools(agent, run), **(tools or {})} or None
+            llm = await self._llm_settings(agent)
+            return await self._complete(llm, agent, system_prompt, user_segments, tools=tools)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            raise TaskFailedError(task.name, f"{agent.llm_model}: {str(e)}") from e
+
+    async def _prefetch_context(self, task: Task, agent: Agent, run: Run) -> str:
+        """Scraped pages of the agent's scraping skills and web search results, fetched before the LLM call."""
         # Handle Skills: Web Scraping
         skills_json = agent.skills or "[]"
         scraping_context = ""
@@ -161,10 +444,9 @@ class Orchestrator:
             skills_list = json.loads(skills_json)
             for skill in skills_list:
                 if skill.get('type') == 'scraping' and skill.get('target'):
-                    url = skill.get('target')
+                    url = render_inputs(skill.get('target'), self.inputs)
                     run.add_log(f"🌐 Scraping content from: {url}", agent_name=agent.name, level="info")
-                    from tools.scraper import scrape_url
-                    content = await scrape_url(url)
+                    content = await self._scrape(url)
                     scraping_context += f"\n\n### Contenido extraído de {url}:\n{content[:5000]}\n"
         except Exception as e:
             run.add_log(f"⚠️ Error in skill execution: {str(e)}", level="warning")
@@ -172,22 +454,659 @@ class Orchestrator:
         # Handle Web Search Capability
         if getattr(agent, 'web_search_enabled', False):
             try:
-                run.add_log(f"🔎 Buscando en la web sobre: {task.description[:50]}...", agent_name=agent.name, level="info")
-                from tools.search import search_web
+                query = render_inputs(task.description, self.inputs)[:200]  # Limit query length
+                run.add_log(f"🔎 Buscando en la web sobre: {query[:50]}...", agent_name=agent.name, level="info")
                 # Use task description as search query
-                search_results = await search_web(task.description[:200]) # Limit query length
+                search_results = await self._search(query)
                 scraping_context += f"\n\n### Resultados de Búsqueda Web:\n{search_results}\n"
             except Exception as e:
                 run.add_log(f"⚠️ Error en búsqueda web: {str(e)}", level="warning")
+        return scraping_context
 
-        # Build context from previous results
-        context = ""
-        if previous_results:
-            context = "\n\n### Resultados previos:\n" + "\n".join(
-                f"- **{r['task']}** ({r['agent']}): {r['output'][:500]}"
-                for r in previous_results
+    async def _scrape(self, url: str) -> str:
+        from tools.scraper import scrape_url
+        with span("scrape", url=url) as scrape_span:
+            content = await self._run_tool(
+                "scrape", url,
+                functools.partial(scrape_url, timeout=self._time_left(settings.SCRAPE_TIMEOUT_SECONDS)),
             )
+            set_attributes(scrape_span, bytes=len(content.encode("utf-8")))
+        return content
+
+    async def _search(self, query: str) -> str:
+        from tools.search import search_web
+        with span("search", query=query) as search_span:
+            results = await self._run_tool(
+                "search", query,
+                functools.partial(search_web, timeout=self._time_left(settings.SEARCH_TIMEOUT_SECONDS)),
+            )
+            set_attributes(search_span, bytes=len(results.encode("utf-8")))
+        return results
+
+    def _builtin_tools(self, agent: Agent, run: Run) -> dict:
+        """`scrape_url` and `search_web` as LLM tools, for agents in `function_calling` mode.
+
+        `search_web` is offered when web search is enabled; `scrape_url` when
+        it is or the agent has scraping skills, whose pages are listed in the
+        tool description instead of being fetched up front.
+        """
+        try:
+            pages = [
+                render_inputs(s["target"], self.inputs) for s in json.loads(agent.skills or "[]")
+                if s.get("type") == "scraping" and s.get("target")
+            ]
+        except ValueError:
+            pages = []
+        tools = {}
+
+        if pages or agent.web_search_enabled:
+            async def scrape(arguments: dict) -> str:
+                url = str(arguments.get("url") or "").strip()
+                if not url.startswith(("http://", "https://")):
+                    return "Error: indica una URL http(s) completa."
+                run.add_log(f"🌐 Scraping content from: {url}", agent_name=agent.name, level="info")
+                return await self._scrape(url)
+
+            description = "Descarga una página web y devuelve su texto."
+            if pages:
+                description += " Páginas configuradas para este agente: " + ", ".join(pages)
+            tools["scrape_url"] = ({
+                "type": "function",
+                "function": {
+                    "name": "scrape_url",
+                    "description": description[:1024],
+                    "parameters": {
+                        "type": "object",
+                        "properties": {"url": {"type": "string", "description": "URL completa (http/https)"}},
+                        "required": ["url"],
+                    },
+                },
+            }, scrape)
+
+        if agent.web_search_enabled:
+            async def search(arguments: dict) -> str:
+                query = str(arguments.get("query") or "").strip()[:200]
+                if not query:
+                    return "Error: indica una consulta."
+                run.add_log(f"🔎 Buscando en la web sobre: {query[:50]}...", agent_name=agent.name, level="info")
+                return await self._search(query)
+
+            tools["search_web"] = ({
+                "type": "function",
+                "function": {
+                    "name": "search_web",
+                    "description": "Busca en la web (DuckDuckGo) y devuelve títulos, resúmenes y enlaces.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {"query": {"type": "string", "description": "Consulta de búsqueda"}},
+                        "required": ["query"],
+                    },
+                },
+            }, search)
+        return tools
+
+    async def _agent_mcp_tools(self, agent: Agent, run: Run) -> dict | None:
+        """Tools of the MCP servers named by the agent's `mcp` skills (by name or id), None if there are none."""
+        try:
+            targets = [
+                s["target"].strip() for s in json.loads(agent.skills or "[]")
+                if s.get("type") == "mcp" and s.get("target")
+            ]
+        except ValueError:
+            return None
+        configs = []
+        for target in targets:
+            if self.plan and target in self.plan.mcp_servers:
+                config = self.plan.mcp_servers[target]
+            else:
+                with span("db.query", table="mcp_servers"):
+                    server = (await self.db.execute(
+                        select(MCPServer).where((MCPServer.name == target) | (MCPServer.id == target)).limit(1)
+                    )).scalar_one_or_none()
+                config = server_config(server) if server else None
+                if self.plan:
+                    self.plan.mcp_servers[target] = config
+            if config is None:
+                run.add_log(f"⚠️ Servidor MCP '{target}' no configurado.", agent_name=agent.name, level="warning")
+            else:
+                configs.append(config)
+        if not configs:
+            return None
+
+        with span("mcp.tools", servers=len(configs)) as tools_span:
+            tools = await mcp_tools(configs)
+            set_attributes(tools_span, tools=len(tools))
+
+        def logged(name: str, call):
+            async def wrapper(arguments: dict) -> str:
+                preview = json.dumps(arguments, ensure_ascii=False)
+                run.add_log(
+                    f"🔧 Herramienta {name}({preview[:120]})", agent_name=agent.name, level="info"
+                )
+                # At most what is left of the task's deadline
+                return await call(arguments, timeout=self._time_left(settings.MCP_CALL_TIMEOUT))
+            return wrapper
+
+        return {name: (schema, logged(name, call)) for name, (schema, call) in tools.items()} or None
+
+    async def _llm_settings(self, agent: Agent) -> tuple[str, str | None, str | None]:
+        """(model, api_base, api_key) for the agent's model, from LLMConfig or the defaults."""
+        if self.plan and agent.llm_model in self.plan.llm_settings:
+            return self.plan.llm_settings[agent.llm_model]
+        model_name = agent.llm_model.strip()
+        api_base = None
+
+        # Query LLMConfig for custom settings using the model identifier
+        with span("db.query", table="llm_configs"):
+            result = await self.db.execute(select(LLMConfig).where(LLMConfig.model_id == model_name))
+            llm_config = result.scalar_one_or_none()
+
+        custom_api_key = None
+        if llm_config:
+            if llm_config.base_url:
+                api_base = llm_config.base_url
+            if llm_config.api_key:
+                custom_api_key = llm_config.api_key
+
+            # Ensure model name has provider prefix for LiteLLM (e.g., 'ollama/llama3')
+            # But only if it doesn't already have a slash (which usually denotes a provider)
+            if "/" not in model_name:
+                model_name = f"{llm_config.provider}/{model_name}"
+
+        elif model_name.startswith("ollama/"):
+            api_base = settings.OLLAMA_API_BASE
+        elif "/" not in model_name:
+            # Fallback: if no config found and no prefix, default to ollama for local-looking models
+            model_name = f"ollama/{model_name}"
+            api_base = settings.OLLAMA_API_BASE
+
+        if self.plan:
+            self.plan.llm_settings[agent.llm_model] = (model_name, api_base, custom_api_key)
+        return model_name, api_base, custom_api_key
+
+    async def _run_tool(self, name: str, argument: str, call) -> str:
+        """`await call(argument)` once per run, shared with every run of the plan that asks for the same thing."""
+        results = self.plan.tool_results if self.plan else self.tool_results
+        key = (name, argument)
+        future = results.get(key)
+        if future is None:
+            future = results[key] = asyncio.ensure_future(call(argument))
+        # Shielded: cancelling one run must not cancel a fetch other runs are waiting on
+        return await asyncio.shield(future)
+
+    async def _complete(
+        self, llm: tuple[str, str | None, str | None], agent: Agent, system_prompt: str, user_segments: list[str],
+        retries: int | None = None, tools: dict | None = None,
+    ) -> tuple[str, int]:
+        """One chat completion through LiteLLM. Raises on provider errors.
+
+        With `tools` ({function name: (OpenAI tool schema, async call(arguments) -> str)})
+        the model may call them: the calls of a turn run concurrently (up to
+        TOOL_PARALLEL_CALLS at once), their results go back as `tool` messages
+        and the model is asked again, for at most TOOL_MAX_ROUNDS rounds and
+        TOOL_MAX_CALLS calls (the last round sends `tool_choice="none"`, so it
+        has to answer). Uses no database session, so several calls may run concurrently.
+        """
+        model_name = llm[0]
+        user_prompt = "".join(user_segments)
+
+        # Semantic cache: reuse the completion of a near-identical earlier prompt
+        namespace = vector = None
+        if self.semantic_threshold is not None:
+            with span("cache.lookup") as cache_span:
+                namespace = cache_namespace(self.crew_id, model_name, system_prompt, user_prompt)
+                vector = embed(user_prompt)
+                similarity, entry = await semantic_cache.lookup(namespace, vector, self.semantic_threshold)
+                set_attributes(cache_span, similarity=round(similarity, 4), hit=entry is not None)
+            self.semantic_stats["similarities"].append(similarity)
+            if entry is not None:
+                self.semantic_stats["hits"] += 1
+                self.semantic_stats["saved_tokens"] += entry["tokens"]
+                return entry["completion"], 0
+            self.semantic_stats["misses"] += 1
+
+        messages = prompt_messages(model_name, system_prompt, user_segments)
+        rounds = settings.TOOL_MAX_ROUNDS if tools else 0
+        calls_left = settings.TOOL_MAX_CALLS
+        parallel = asyncio.Semaphore(max(1, settings.TOOL_PARALLEL_CALLS))
+        total_tokens = 0
+
+        async def call_tool(call) -> str:
+            async with parallel:
+                return await self._call_tool(tools, call.function.name, call.function.arguments)
 
+        for round_index in range(rounds + 1):
+            final = round_index == rounds or calls_left <= 0
+            # The schemas still go with the final round: the history holds tool calls, and
+            # providers like Anthropic reject those without `tools=`. Some ignore
+            # tool_choice="none", so the model is also told to answer now.
+            if final and round_index > 0:
+                messages.append({
+                    "role": "user",
+                    "content": "Se alcanzó el límite de herramientas: responde ya con la respuesta final.",
+                })
+            message, tokens = await self._llm_call(
+                llm, agent, messages, tools if rounds else None, retries,
+                tool_choice="none" if final else None,
+            )
+            total_tokens += tokens
+            tool_calls = None if final else getattr(message, "tool_calls", None)
+            if not tool_calls:
+                break
+            messages.append({
+                "role": "assistant",
+                "content": message.content,
+                "tool_calls": [
+                    {
+                        "id": call.id,
+                        "type": "function",
+                        "function": {"name": call.function.name, "arguments": call.function.arguments or "{}"},
+                    }
+                    for call in tool_calls
+                ],
+            })
+            # The calls of one turn run concurrently; past TOOL_MAX_CALLS the model is told no
+            allowed = tool_calls[:calls_left]
+            calls_left -= len(allowed)
+            with span("tools", calls=len(allowed), refused=len(tool_calls) - len(allowed)):
+                results = await asyncio.gather(*(call_tool(call) for call in allowed))
+            results += [
+                f"Error: se alcanzó el límite de {settings.TOOL_MAX_CALLS} llamadas a herramientas."
+            ] * (len(tool_calls) - len(allowed))
+            for call, result in zip(tool_calls, results):
+                messages.append({"role": "tool", "tool_call_id": call.id, "content": result})
+
+        content = message.content
+        if vector is not None and content:
+            await semantic_cache.store(self.crew_id, namespace, vector, content, total_tokens)
+        return content, total_tokens
+
+    async def _llm_call(
+        self, llm: tuple[str, str | None, str | None], agent: Agent, messages: list[dict],
+        tools: dict | None = None, retries: int | None = None, tool_choice: str | None = None,
+    ):
+        """(response message, total tokens) of a single request.
+
+        Transient errors are retried `retries` times (LLM_RETRIES by default)
+        with jittered backoff, behind the model's circuit breaker: while the
+        provider is down this raises `CircuitOpenError` without calling it.
+        """
+        model_name, api_base, custom_api_key = llm
+        kwargs = {
+            "model": model_name,
+            "messages": messages,
+            "temperature": agent.temperature,
+            "max_tokens": int(agent.max_tokens),
+            # Retries are ours (call_with_retries); the provider SDK's would multiply them
+            "max_retries": 0,
+        }
+        if tools:
+            kwargs["tools"] = [schema for schema, _ in tools.values()]
+            if tool_choice:
+                kwargs["tool_choice"] = tool_choice
+        if api_base:
+            kwargs["api_base"] = api_base
+        if custom_api_key:
+            kwargs["api_key"] = custom_api_key
+
+        def log_retry(attempt: int, error: BaseException, delay: float):
+            logger.warning(f"LLM call to {model_name} failed ({str(error)}), retry {attempt} in {delay:.2f}s")
+
+        with span(
+            "llm", model=model_name, api_base=api_base or "",
+            prompt_chars=sum(len(m["content"]) for m in messages if isinstance(m.get("content"), str)),
+            tools=len(tools or ()),
+        ) as llm_span:
+            # Imported on first use: litellm takes seconds to import (see core/warmup.py)
+            import litellm
+
+            # Several base URLs: each attempt goes to the pool's least busy healthy endpoint
+            pool = endpoint_pools.get(model_name, api_base)
+
+            async def request(**overrides):
+                # Each attempt gets only what is left of the task's deadline
+                if self._deadline_hit():
+                    raise self.task_deadline.error()
+                timeout = self._time_left()
+                extra = {"timeout": timeout} if timeout is not None else {}
+                try:
+                    return await litellm.acompletion(**{**kwargs, **overrides}, **extra)
+                except Exception as e:
+                    # Cut short by our own deadline: not retried, and no failure for the breaker or the pool
+                    if is_transient(e) and self._deadline_hit():
+                        raise self.task_deadline.error() from e
+                    raise
+
+            def attempt():
+                if pool is None:
+                    return request()
+
+                def on_endpoint(url: str):
+                    set_attributes(llm_span, endpoint=url)
+                    return request(api_base=url)
+
+                return pool.call(on_endpoint)
+
+            response, attempts = await call_with_retries(
+                breaker_for(model_name, api_base),
+                attempt,
+                settings.LLM_RETRIES if retries is None else retries,
+                on_retry=log_retry,
+            )
+            set_attributes(llm_span, attempts=attempts)
+
+            tokens = response.usage.total_tokens if response.usage else 0
+            if response.usage:
+                cached, written = cached_prompt_tokens(response.usage)
+                set_attributes(
+                    llm_span,
+                    prompt_tokens=response.usage.prompt_tokens or 0,
+                    completion_tokens=response.usage.completion_tokens or 0,
+                    cached_tokens=cached,
+                    cache_write_tokens=written,
+                    tokens=tokens,
+                )
+                if self.task_usage is not None:
+                    self.task_usage["calls"] += 1
+                    self.task_usage["prompt_tokens"] += response.usage.prompt_tokens or 0
+                    self.task_usage["cached_tokens"] += cached
+                    self.task_usage["cache_write_tokens"] += written
+        return response.choices[0].message, tokens
+
+    async def _call_tool(self, tools: dict, name: str, raw_arguments: str | None) -> str:
+        """Result text of one tool call requested by the model (errors are returned to it as text)."""
+        with span("tool", tool=name) as tool_span:
+            if name not in tools:
+                return f"Error: la herramienta '{name}' no existe."
+            try:
+                arguments = json.loads(raw_arguments or "{}")
+            except ValueError:
+                return "Error: los argumentos no son JSON válido."
+            try:
+                result = await tools[name][1](arguments)
+            except Exception as e:
+                set_attributes(tool_span, error=str(e))
+                result = f"Error: {str(e)}"
+            set_attributes(tool_span, bytes=len(result.encode("utf-8")))
+        return result[:settings.TOOL_RESULT_MAX_CHARS]
+
+    # ─── Map-reduce tasks ───
+
+    def _map_items(self, task: Task, agent: Agent, previous_results: list[dict]) -> list[str]:
+        """Split the input of a map-reduce task into items.
+
+        Sources: `json` (task.map_input as a JSON array, or one item per line),
+        `skills` (the agent's scraping targets), `previous` (lines of the
+        previous task's output). `auto` takes the first of those that is not empty.
+        """
+        def from_input() -> list[str]:
+            raw = render_inputs(task.map_input, self.inputs).strip()
+            if not raw:
+                return []
+            try:
+                parsed = json.loads(raw)
+            except ValueError:
+                parsed = None
+            if isinstance(parsed, list):
+                return [v if isinstance(v, str) else json.dumps(v, ensure_ascii=False) for v in parsed]
+            return raw.splitlines()
+
+        def from_skills() -> list[str]:
+            try:
+                skills_list = json.loads(agent.skills or "[]")
+            except ValueError:
+                return []
+            return [
+                render_inputs(s["target"], self.inputs)
+                for s in skills_list if s.get("type") == "scraping" and s.get("target")
+            ]
+
+        def from_previous() -> list[str]:
+            if not previous_results:
+                return []
+            # Drop list markers ("- ", "* ", "1. ") so URLs and names come out clean
+            return [
+                re.sub(r"^\s*(?:[-*•]|\d+[.)])\s+", "", line)
+                for line in (previous_results[-1]["output"] or "").splitlines()
+            ]
+
+        sources = {"json": from_input, "skills": from_skills, "previous": from_previous}
+        source = task.map_source or "auto"
+        order = [sources[source]] if source in sources else [from_input, from_skills, from_previous]
+        for collect in order:
+            items = [item.strip() for item in collect() if item and item.strip()]
+            if items:
+                return items[:settings.MAP_MAX_ITEMS]
+        return []
+
+    async def _execute_map_reduce(
+        self, task: Task, agent: Agent, previous_results: list[dict], run: Run
+    ) -> tuple[str, int]:
+        """Run the task once per input item in parallel, then combine the partial outputs.
+
+        At most `map_concurrency` LLM calls are in flight; an item is retried
+        `map_retries` times with exponential backoff. The reduce step merges
+        partials in groups of `reduce_batch_size` (and REDUCE_MAX_CHARS) level by
+        level until one output is left, so no single call gets every partial.
+        """
+        items = self._map_items(task, agent, previous_results)
+        if not items:
+            run.add_log(
+                f"⚠️ Tarea '{task.name}' (map-reduce) no tiene elementos de entrada, se ejecuta como tarea simple.",
+                agent_name=agent.name, level="warning"
+            )
+            return await self._execute_task(task, agent, previous_results, run)
+
+        try:
+            llm = await self._llm_settings(agent)
+        except Exception as e:
+            raise TaskFailedError(task.name, f"{agent.llm_model}: {str(e)}") from e
+
+        concurrency = max(1, task.map_concurrency or settings.MAP_CONCURRENCY)
+        retries = max(0, task.map_retries if task.map_retries is not None else settings.MAP_RETRIES)
+        batch_size = max(2, task.reduce_batch_size or settings.REDUCE_BATCH_SIZE)
+        slots = asyncio.Semaphore(concurrency)
+        commit_lock = asyncio.Lock()
+        total_tokens = 0
+        done = 0
+
+        run.add_log(
+            f"🗂️ Map: {len(items)} elementos, {concurrency} en paralelo.",
+            agent_name=agent.name, level="info"
+        )
+        await self._commit()
+        run_events.publish(run.id)
+
+        async def progress():
+            async with commit_lock:
+                await self._commit()
+            run_events.publish(run.id)
+
+        async def with_retries(call) -> tuple[str, int]:
+            """(output, attempts); retries transient errors with jittered backoff, re-raises the last error.
+
+            An open circuit or a permanent error (auth, bad request) is raised at once.
+            """
+            for attempt in range(retries + 1):
+                try:
+                    async with slots:
+                        return await call(), attempt + 1
+                except Exception as e:
+                    if attempt == retries or not is_transient(e):
+                        raise
+                await asyncio.sleep(backoff_delay(attempt))
+
+        async def complete(system_prompt: str, user_segments: list[str]) -> str:
+            nonlocal total_tokens
+            # Retried per item by with_retries, so one level of retries only
+            output, tokens = await self._complete(llm, agent, system_prompt, user_segments, retries=0)
+            total_tokens += tokens
+            return output
+
+        async def map_item(index: int, item: str) -> str | None:
+            nonlocal done
+            label = item if len(item) <= 80 else item[:77] + "..."
+
+            async def attempt() -> str:
+                context = f"\n\n### Elemento {index + 1} de {len(items)}:\n{item}\n"
+                if item.startswith(("http://", "https://")) and " " not in item:
+                    content = await self._scrape(item)
+                    context += f"\n### Contenido extraído de {item}:\n{content[:5000]}\n"
+                return await complete(*self._build_prompts(task, agent, previous_results, run, context))
+
+            with span("map.item", index=index, item=label) as item_span:
+                try:
+                    output, attempts = await with_retries(attempt)
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    run.add_log(
+                        f"⚠️ Elemento {index + 1} falló: {str(e)}",
+                        agent_name=agent.name, level="warning"
+                    )
+                    await progress()
+                    return None
+                done += 1
+                set_attributes(item_span, attempts=attempts)
+                run.add_log(
+                    f"🧩 Elemento {index + 1}/{len(items)} completado ({done}/{len(items)}).",
+                    agent_name=agent.name, level="info"
+                )
+                await progress()
+                return output
+
+        with span("map", items=len(items), concurrency=concurrency) as map_span:
+            outputs = await asyncio.gather(*(map_item(i, item) for i, item in enumerate(items)))
+            partials = [
+                f"**{item[:200]}**\n{output}" for item, output in zip(items, outputs) if output is not None
+            ]
+            set_attributes(map_span, failed=len(items) - len(partials))
+
+        if not partials:
+            raise TaskFailedError(task.name, "todos los elementos del map fallaron", tokens=total_tokens)
+
+        async def reduce_batch(batch: list[str], level: int, final: bool) -> str:
+            instruction = (
+                "Combina los siguientes resultados parciales en una única respuesta que cumpla el output esperado."
+                if final else
+                "Combina los siguientes resultados parciales en un resumen intermedio; "
+                "conserva los datos concretos, se combinará después con otros resúmenes."
+            )
+            context = f"\n\n### {instruction}\n" + "\n\n".join(
+                f"#### Resultado parcial {i + 1}:\n{text}" for i, text in enumerate(batch)
+            )
+            prompts = self._build_prompts(task, agent, [], run, context)
+            with span("reduce", level=level, inputs=len(batch), final=final) as reduce_span:
+                output, attempts = await with_retries(lambda: complete(*prompts))
+                set_attributes(reduce_span, attempts=attempts)
+            return output
+
+        level = 0
+        while True:
+            level += 1
+            batches = self._reduce_batches(partials, batch_size, settings.REDUCE_MAX_CHARS)
+            run.add_log(
+                f"🔗 Reduce nivel {level}: {len(partials)} resultados en {len(batches)} llamadas.",
+                agent_name=agent.name, level="info"
+            )
+            await progress()
+            partials = await asyncio.gather(
+                *(reduce_batch(b, level, len(batches) == 1) for b in batches), return_exceptions=True
+            )
+            error = next((p for p in partials if isinstance(p, BaseException)), None)
+            if isinstance(error, DeadlineExceeded):
+                raise error
+            if error is not None:
+                raise TaskFailedError(task.name, f"reduce: {str(error)}", tokens=total_tokens) from error
+            if len(partials) == 1:
+                return partials[0], total_tokens
+
+    @staticmethod
+    def _reduce_batches(partials: list[str], batch_size: int, max_chars: int) -> list[list[str]]:
+        """Group partial outputs by count and character budget (at least two per group)."""
+        batches, current, size = [], [], 0
+        for text in partials:
+            text = text[:max_chars]
+            if current and (len(current) >= batch_size or (size + len(text) > max_chars and len(current) >= 2)):
+                batches.append(current)
+                current, size = [], 0
+            current.append(text)
+            size += len(text)
+        if current:
+            # A lone leftover joins the previous group so every level shrinks the list
+            if len(current) == 1 and batches:
+                batches[-1].append(current[0])
+            else:
+                batches.append(current)
+        return batches
+
+    async def _reusable_outputs(self, crew_id: str, run_id: str) -> dict[str, dict]:
+        """{fingerprint: task output} of the crew's last RERUN_LOOKBACK_RUNS runs (newest wins).
+
+        Failed and timed-out runs count too: the tasks they finished are reusable.
+        """
+        with span("db.query", table="runs"):
+            rows = (await self.db.execute(
+                select(Run.task_outputs)
+                .where(Run.crew_id == crew_id, Run.id != run_id, Run.task_outputs.is_not(None))
+                .order_by(Run.created_at.desc())
+                .limit(settings.RERUN_LOOKBACK_RUNS)
+            )).scalars().all()
+        outputs = {}
+        for row in reversed(rows):
+            for entry in json.loads(row):
+                outputs[entry["fingerprint"]] = entry
+        return outputs
+
+    def _record_task_output(self, run: Run, result: dict, fingerprint: str, tokens: int, reused: bool = False):
+        """Keep a finished task's output on the run (committed with the task) for later `changed` runs."""
+        self.task_outputs.append({**result, "fingerprint": fingerprint, "tokens": tokens})
+        run.task_outputs = json.dumps(self.task_outputs, ensure_ascii=False)
+        if self.reuse_stats is not None:
+            if reused:
+                self.reuse_stats["reused"] += 1
+                self.reuse_stats["saved_tokens"] += tokens
+                self.reuse_stats["tasks"].append(result["task"])
+            else:
+                self.reuse_stats["executed"] += 1
+
+    def _record_cache_stats(self, run: Run):
+        stats = {}
+        if self.semantic_threshold is not None:
+            stats["semantic"] = summarize_stats(self.semantic_stats)
+        if self.reuse_stats is not None:
+            stats["reuse"] = self.reuse_stats
+        if self.prompt_usage:
+            stats["prompt"] = {
+                "prompt_tokens": sum(t["prompt_tokens"] for t in self.prompt_usage),
+                "cached_tokens": sum(t["cached_tokens"] for t in self.prompt_usage),
+                "cache_write_tokens": sum(t["cache_write_tokens"] for t in self.prompt_usage),
+                "tasks": self.prompt_usage,
+            }
+        if stats:
+            run.cache_stats = json.dumps(stats, ensure_ascii=False)
+
+    async def _commit(self):
+        with span("db.commit"):
+            commit = asyncio.ensure_future(self.db.commit())
+            try:
+                await asyncio.shield(commit)
+            except asyncio.CancelledError:
+                # Cut off by a deadline or a stop: let the commit finish so the session stays usable
+                await asyncio.wait([commit])
+                raise
+
+    def _build_prompts(
+        self, task: Task, agent: Agent, previous_results: list[dict], run: Run, scraping_context: str
+    ) -> tuple[str, list[str]]:
+        """System prompt and user prompt segments for a task (pure: no I/O).
+
+        Laid out from most to least stable so provider prompt caches (Anthropic
+        breakpoints, OpenAI prefix caching, Ollama KV reuse) can reuse the
+        prefix: the system prompt only depends on the agent and crew; the user
+        segments are [task, run context (inputs, previous results), volatile
+        material (scraped pages, search results, map items)].
+        """
         system_prompt = (
             f"Eres {agent.name}, un agente de IA con el siguiente perfil:\n"
             f"**Rol:** {agent.role}\n"
@@ -216,65 +1135,34 @@ class Orchestrator:
         if run.crew.is_public:
             system_prompt += "\n**IMPORTANTE:** Como este es un servicio automatizado, intenta que tu respuesta final sea un objeto JSON válido si la tarea lo permite."
 
-        user_prompt = (
-            f"## Tarea: {task.name}\n\n"
-            f"{task.description}\n\n"
-            f"**Output esperado:** {task.expected_output}\n"
-            f"{scraping_context}"
-            f"{context}"
+        task_prompt = (
+            f"## Tarea: {render_inputs(task.name, self.inputs)}\n\n"
+            f"{render_inputs(task.description, self.inputs)}\n\n"
+            f"**Output esperado:** {render_inputs(task.expected_output, self.inputs)}\n"
         )
 
-        try:
-            # Check for dynamic LLM configuration
-            model_name = agent.llm_model.strip()
-            api_base = None
-            
-            # Query LLMConfig for custom settings using the model identifier
-            result = await self.db.execute(select(LLMConfig).where(LLMConfig.model_id == model_name))
-            llm_config = result.scalar_one_or_none()
-            
-            custom_api_key = None
-            if llm_config:
-                if llm_config.base_url:
-                    api_base = llm_config.base_url
-                if llm_config.api_key:
-                    custom_api_key = llm_config.api_key
-                
-                # Ensure model name has provider prefix for LiteLLM (e.g., 'ollama/llama3')
-                # But only if it doesn't already have a slash (which usually denotes a provider)
-                if "/" not in model_name:
-                    model_name = f"{llm_config.provider}/{model_name}"
-            
-            elif model_name.startswith("ollama/"):
-                api_base = settings.OLLAMA_API_BASE
-            elif "/" not in model_name:
-                # Fallback: if no config found and no prefix, default to ollama for local-looking models
-                model_name = f"ollama/{model_name}"
-                api_base = settings.OLLAMA_API_BASE
-
-            # Build kwargs
-            kwargs = {
-                "model": model_name,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                "temperature": agent.temperature,
-                "max_tokens": int(agent.max_tokens),
-            }
-            if api_base:
-                kwargs["api_base"] = api_base
-            if custom_api_key:
-                kwargs["api_key"] = custom_api_key
-
-            response = await litellm.acompletion(**kwargs)
+        run_context = ""
+        # Inputs the task texts do not mention are listed so the agent still sees them
+        extra_inputs = unreferenced_inputs(self.inputs, task.name, task.description, task.expected_output)
+        if extra_inputs:
+            run_context += "\n### Datos de entrada:\n" + "\n".join(
+                f"- **{k}:** {format_value(v)}" for k, v in extra_inputs.items()
+            ) + "\n"
+        # Build context from previous results
+        if previous_results:
+            run_context += "\n\n### Resultados previos:\n" + "\n".join(
+                f"- **{r['task']}** ({r['agent']}): {r['output'][:500]}"
+                for r in previous_results
+            ) + "\n"
 
-            content = response.choices[0].message.content
-            tokens = response.usage.total_tokens if response.usage else 0
-            return content, tokens
+        return system_prompt, [task_prompt, run_context, scraping_context]
 
-        except Exception as e:
-            return f"[Error ejecutando con {agent.llm_model}]: {str(e)}", 0
+    @staticmethod
+    def _format_final_result(results: list[dict]) -> str:
+        return "<br><hr><br>".join(
+            f"## {r['task']}\n**Agente:** {r['agent']}\n\n{r['output']}"
+            for r in results
+        )
 
     def _find_agent_for_task(self, task: Task, agents: list[Agent]) -> Agent | None:
         """Find the agent assigned to a task."""
@@ -290,9 +1178,43 @@ class Orchestrator:
         return round(tokens * 0.000015, 6)
     @classmethod
     def stop_run(cls, run_id: str):
-        """Cancels a running task by its run_id."""
+        """Cancels a running task by its run_id (only runs executing in this process)."""
         task = cls._active_tasks.get(run_id)
         if task:
             task.cancel()
             return True
         return False
+
+    @classmethod
+    async def request_stop(cls, db: AsyncSession, run_id: str) -> bool:
+        """Stop a run wherever it executes.
+
+        Runs of this process are cancelled right away; for the rest the row is
+        flagged and the worker executing it cancels it within
+        RUN_CANCEL_POLL_SECONDS (a pending run stops as soon as it starts).
+        False if the run is not pending or running.
+        """
+        if cls.stop_run(run_id):
+            return True
+        result = await db.execute(
+            update(Run)
+            .where(Run.id == run_id, Run.status.in_(("pending", "running")))
+            .values(cancel_requested_at=datetime.now(timezone.utc))
+        )
+        await db.commit()
+        return result.rowcount > 0
+
+    @staticmethod
+    async def _watch_cancel(run_id: str, task: asyncio.Task):
+        """Cancel `task` once the run's row is flagged by request_stop."""
+        from db.database import async_session
+
+        while True:
+            async with async_session() as session:
+                requested = (await session.execute(
+                    select(Run.cancel_requested_at).where(Run.id == run_id)
+                )).scalar_one_or_none()
+            if requested:
+                task.cancel()
+                return
+            await asyncio.sleep(settings.RUN_CANCEL_POLL_SECONDS)
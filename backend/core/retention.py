@@ -0,0 +1,289 @@
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete, text
+from sqlalchemy.orm import load_only, undefer
+
+from api.idempotency import purge_expired_keys
+from core.semantic_cache import purge_expired_entries
+from config import settings
+from db.database import async_session, engine
+from models.models import Crew, Run
+from utils.blob_store import blob_store, offload_run_payloads, read_run_result, read_run_logs
+
+logger = logging.getLogger(__name__)
+
+# Runs in these states are never expired, whatever the policy says
+ACTIVE_STATUSES = ("pending", "running")
+
+# Payloads read through the blob store (`result`, `logs`) and what `offload_run_payloads`
+# recomputes on import; every other column of `runs` is archived as is
+BLOB_FIELDS = {"result", "logs", "result_hash", "result_size", "result_preview", "logs_hash", "logs_size"}
+ARCHIVED_FIELDS = tuple(c.name for c in Run.__table__.columns if c.name not in BLOB_FIELDS)
+
+ARCHIVE_BATCH_SIZE = 500
+
+# Blobs younger than this may belong to a run that has not committed yet
+BLOB_GC_GRACE_SECONDS = 3600
+
+# Summary of the most recent maintenance pass (exposed through the config API)
+last_report: dict | None = None
+
+
+def _policy_for(crew: Crew) -> tuple[int | None, int | None, int | None]:
+    """(keep_last, keep_days, keep_failed_days), falling back to global defaults."""
+    keep_last = crew.retention_keep_last if crew.retention_keep_last is not None else settings.RUN_RETENTION_KEEP_LAST
+    keep_days = crew.retention_days if crew.retention_days is not None else settings.RUN_RETENTION_DAYS
+    keep_failed_days = (
+        crew.retention_failed_days if crew.retention_failed_days is not None
+        else settings.RUN_RETENTION_FAILED_DAYS
+    )
+    return keep_last, keep_days, keep_failed_days
+
+
+def select_expired(runs: list[Run], keep_last: int | None, keep_days: int | None,
+                   keep_failed_days: int | None, now: datetime) -> list[Run]:
+    """Pick the runs a policy no longer keeps.
+
+    `runs` must be ordered newest first. A run is kept if it is among the last
+    `keep_last`, or newer than `keep_days`, or failed and newer than
+    `keep_failed_days`. With neither `keep_last` nor `keep_days` set, nothing expires.
+    """
+    if keep_last is None and keep_days is None:
+        return []
+
+    expired = []
+    for index, run in enumerate(runs):
+        if run.status in ACTIVE_STATUSES:
+            continue
+        if keep_last is not None and index < keep_last:
+            continue
+        age = now - run.created_at
+        if keep_days is not None and age < timedelta(days=keep_days):
+            continue
+        if run.status in ("failed", "timeout") and keep_failed_days is not None and age < timedelta(days=keep_failed_days):
+            continue
+        expired.append(run)
+    return expired
+
+
+def _serialize_run(run: Run) -> dict:
+    record = {}
+    for field in ARCHIVED_FIELDS:
+        value = getattr(run, field)
+        record[field] = value.isoformat() if isinstance(value, datetime) else value
+    record["result"] = read_run_result(run)
+    record["logs"] = read_run_logs(run)
+    return record
+
+
+def write_archive(crew_id: str, runs: list[Run]) -> str:
+    """Export runs to `<RUN_ARCHIVE_PATH>/<crew_id>/<timestamp>.jsonl.gz` and return the path."""
+    directory = os.path.join(settings.RUN_ARCHIVE_PATH, crew_id)
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    path = os.path.join(directory, f"{stamp}.jsonl.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for run in runs:
+            f.write(json.dumps(_serialize_run(run), ensure_ascii=False) + "\n")
+    return path
+
+
+def list_archives() -> list[dict]:
+    archives = []
+    if not os.path.isdir(settings.RUN_ARCHIVE_PATH):
+        return archives
+    for crew_id in sorted(os.listdir(settings.RUN_ARCHIVE_PATH)):
+        directory = os.path.join(settings.RUN_ARCHIVE_PATH, crew_id)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".jsonl.gz"):
+                path = os.path.join(directory, name)
+                archives.append({
+                    "crew_id": crew_id,
+                    "file": f"{crew_id}/{name}",
+                    "size_bytes": os.path.getsize(path),
+                })
+    return archives
+
+
+async def import_archive(file: str) -> int:
+    """Re-insert the runs of an archive file (relative to RUN_ARCHIVE_PATH).
+
+    Runs whose id already exists, or whose crew no longer exists, are skipped.
+    Returns the number of runs restored.
+    """
+    root = os.path.realpath(settings.RUN_ARCHIVE_PATH)
+    path = os.path.realpath(os.path.join(root, file))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        raise FileNotFoundError(file)
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    restored = 0
+    async with async_session() as db:
+        crew_ids = {r["crew_id"] for r in records}
+        existing_crews = set((await db.execute(select(Crew.id).where(Crew.id.in_(crew_ids)))).scalars())
+        run_ids = [r["id"] for r in records]
+        existing_runs = set((await db.execute(select(Run.id).where(Run.id.in_(run_ids)))).scalars())
+
+        for record in records:
+            if record["id"] in existing_runs or record["crew_id"] not in existing_crews:
+                continue
+            # Archives written before a column existed simply leave it to its default
+            run = Run(**{
+                field: (datetime.fromisoformat(record[field])
+                        if field.endswith("_at") and record.get(field) else record.get(field))
+                for field in ARCHIVED_FIELDS if field in record
+            })
+            run.result = record.get("result", "")
+            run.logs = record.get("logs", "[]")
+            offload_run_payloads(run)
+            db.add(run)
+            restored += 1
+        await db.commit()
+    return restored
+
+
+async def apply_retention() -> dict:
+    """Archive and delete expired runs for every crew. Returns counts per crew."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    archived: dict[str, int] = {}
+
+    async with async_session() as db:
+        crews = (await db.execute(select(Crew))).scalars().all()
+        for crew in crews:
+            keep_last, keep_days, keep_failed_days = _policy_for(crew)
+            if keep_last is None and keep_days is None:
+                continue
+
+            runs = (await db.execute(
+                select(Run).options(load_only(
+                    Run.id, Run.status, Run.created_at,
+                ))
+                .where(Run.crew_id == crew.id)
+                .order_by(Run.created_at.desc(), Run.id.desc())
+            )).scalars().all()
+            expired = select_expired(runs, keep_last, keep_days, keep_failed_days, now)
+            if not expired:
+                continue
+
+            # Load full rows only for what is being archived, in bounded batches
+            expired_ids = [r.id for r in expired]
+            for start in range(0, len(expired_ids), ARCHIVE_BATCH_SIZE):
+                batch_ids = expired_ids[start:start + ARCHIVE_BATCH_SIZE]
+                full_runs = (await db.execute(
+                    select(Run).options(undefer("*")).where(Run.id.in_(batch_ids)).order_by(Run.created_at)
+                    .execution_options(populate_existing=True)
+                )).scalars().all()
+                path = write_archive(crew.id, full_runs)
+
+                await db.execute(delete(Run).where(Run.id.in_(batch_ids)))
+                await db.commit()
+                logger.info(f"🗄️ Archived {len(batch_ids)} runs of crew {crew.id} to {path}")
+            archived[crew.id] = len(expired_ids)
+
+    return archived
+
+
+async def _referenced_blobs() -> set[str]:
+    async with async_session() as db:
+        rows = await db.execute(select(Run.result_hash, Run.logs_hash))
+        return {h for row in rows for h in row if h}
+
+
+async def collect_orphan_blobs() -> int:
+    """Delete blobs no longer referenced by any run. Returns bytes freed on disk.
+
+    A blob is only deleted if it is unreferenced both before and after the scan
+    and has not been touched (written or deduplicated onto, see `BlobStore.put`)
+    within BLOB_GC_GRACE_SECONDS, checked again right before unlinking.
+    """
+    if not os.path.isdir(blob_store.root):
+        return 0
+    referenced = await _referenced_blobs()
+
+    cutoff = datetime.now().timestamp() - BLOB_GC_GRACE_SECONDS
+    candidates = []
+    for prefix in os.listdir(blob_store.root):
+        directory = os.path.join(blob_store.root, prefix)
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            digest = name[:-3]
+            if not name.endswith(".gz") or digest in referenced:
+                continue
+            if os.path.getmtime(os.path.join(directory, name)) > cutoff:
+                continue
+            candidates.append(digest)
+    if not candidates:
+        return 0
+
+    # Runs committed while we were scanning may have started referencing a candidate
+    referenced = await _referenced_blobs()
+    freed = 0
+    for digest in candidates:
+        if digest in referenced:
+            continue
+        try:
+            if os.path.getmtime(blob_store.path_for(digest)) > cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        freed += blob_store.delete(digest)
+    return freed
+
+
+async def compact_database() -> int:
+    """Return free SQLite pages to the filesystem. Returns bytes reclaimed.
+
+    Uses `PRAGMA incremental_vacuum`. Databases created before auto_vacuum was
+    enabled are converted once with a full VACUUM.
+    """
+    if not settings.DATABASE_URL.startswith("sqlite"):
+        return 0
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        page_size = (await conn.execute(text("PRAGMA page_size"))).scalar()
+        pages_before = (await conn.execute(text("PRAGMA page_count"))).scalar()
+        auto_vacuum = (await conn.execute(text("PRAGMA auto_vacuum"))).scalar()
+        if auto_vacuum != 2:
+            await conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+            await conn.execute(text("VACUUM"))
+        else:
+            await conn.execute(text("PRAGMA incremental_vacuum"))
+        pages_after = (await conn.execute(text("PRAGMA page_count"))).scalar()
+    return max(0, (pages_before - pages_after) * page_size)
+
+
+async def run_maintenance() -> dict:
+    """Retention + expired idempotency keys and cache entries + blob GC + compaction. Scheduled by CrewScheduler."""
+    global last_report
+    started = datetime.now(timezone.utc)
+    report = {
+        "started_at": started.isoformat(), "archived_runs": {}, "idempotency_keys_purged": 0,
+        "semantic_cache_entries_purged": 0, "blob_bytes_freed": 0, "db_bytes_reclaimed": 0,
+    }
+    try:
+        report["archived_runs"] = await apply_retention()
+        async with async_session() as db:
+            report["idempotency_keys_purged"] = await purge_expired_keys(db)
+        report["semantic_cache_entries_purged"] = await purge_expired_entries()
+        report["blob_bytes_freed"] = await collect_orphan_blobs()
+        report["db_bytes_reclaimed"] = await compact_database()
+        logger.info(
+            f"🧹 Maintenance done: {sum(report['archived_runs'].values())} runs archived, "
+            f"{report['blob_bytes_freed']} blob bytes freed, {report['db_bytes_reclaimed']} DB bytes reclaimed"
+        )
+    except Exception as e:
+        report["error"] = str(e)
+        logger.error(f"❌ Error during maintenance: {str(e)}")
+    report["finished_at"] = datetime.now(timezone.utc).isoformat()
+    last_report = report
+    return report
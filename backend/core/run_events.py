@@ -0,0 +1,32 @@
+import asyncio
+
+
+class RunEvents:
+    """In-process notifications of run progress (new logs, completion).
+
+    Waiters get an `asyncio.Event` that the orchestrator sets after each commit.
+    Only covers runs executing in this process; readers must still poll the
+    database as a fallback.
+    """
+
+    def __init__(self):
+        self._waiters: dict[str, set[asyncio.Event]] = {}
+
+    def subscribe(self, run_id: str) -> asyncio.Event:
+        event = asyncio.Event()
+        self._waiters.setdefault(run_id, set()).add(event)
+        return event
+
+    def unsubscribe(self, run_id: str, event: asyncio.Event):
+        waiters = self._waiters.get(run_id)
+        if waiters:
+            waiters.discard(event)
+            if not waiters:
+                del self._waiters[run_id]
+
+    def publish(self, run_id: str):
+        for event in self._waiters.get(run_id, ()):
+            event.set()
+
+
+run_events = RunEvents()
@@ -1,95 +1,485 @@
-from datetime import datetime, timezone
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import asyncio
+import hashlib
 import logging
+import os
+import socket
+import uuid
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.base import BaseTrigger
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, or_
+from sqlalchemy.exc import IntegrityError
 
 from db.database import async_session
-from models.models import Crew
+from models.models import Crew, Run, SchedulerLease
 from core.orchestrator import Orchestrator
+from core.retention import run_maintenance
+from config import settings
 
 logger = logging.getLogger(__name__)
 
+LEASE_NAME = "crew_scheduler"
+OVERLAP_POLICIES = ("skip", "queue", "replace")
+# "running" rows older than this are assumed orphaned by a crashed worker
+STALE_RUN_AFTER = timedelta(hours=24)
+QUEUE_POLL_SECONDS = 5
+# Upper bound on fires enumerated per crew by the load preview
+PREVIEW_MAX_FIRES = 20000
+
+
+class OffsetTrigger(BaseTrigger):
+    """Wraps a trigger and shifts every fire time by a fixed offset.
+
+    Lets `0 * * * *` on many crews land at different seconds of the hour
+    while each crew still fires at the same, predictable time every period.
+    """
+
+    def __init__(self, trigger: BaseTrigger, offset_seconds: int):
+        self.trigger = trigger
+        self.offset_seconds = offset_seconds
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        offset = timedelta(seconds=self.offset_seconds)
+        previous = previous_fire_time - offset if previous_fire_time else None
+        next_time = self.trigger.get_next_fire_time(previous, now - offset)
+        return next_time + offset if next_time else None
+
+    def __str__(self):
+        return f"{self.trigger} +{self.offset_seconds}s"
+
+    def __repr__(self):
+        return f"<OffsetTrigger ({self.trigger!r}, offset_seconds={self.offset_seconds})>"
+
+
+def schedule_offset(crew_id: str, window_seconds: int) -> int:
+    """Deterministic offset in [0, window) derived from the crew id."""
+    if window_seconds <= 0:
+        return 0
+    digest = hashlib.sha256(crew_id.encode()).digest()
+    return int.from_bytes(digest[:8], "big") % window_seconds
+
+
+def build_trigger(crew: Crew, spread_seconds: int | None = None) -> BaseTrigger | None:
+    """APScheduler trigger for a crew's schedule, spread by its offset.
+
+    Raises ValueError on an invalid schedule value. "once" schedules keep their
+    exact date; interval offsets never exceed the interval itself.
+    """
+    if spread_seconds is None:
+        spread_seconds = settings.SCHEDULER_SPREAD_SECONDS
+
+    if crew.schedule_type == "interval":
+        # Assuming schedule_value is minutes for interval
+        minutes = int(crew.schedule_value or 60)
+        trigger = IntervalTrigger(minutes=minutes)
+        window = min(spread_seconds, minutes * 60)
+    elif crew.schedule_type == "cron":
+        # Assuming schedule_value is a cron expression
+        trigger = CronTrigger.from_crontab(crew.schedule_value)
+        window = spread_seconds
+    elif crew.schedule_type == "once":
+        # Assuming schedule_value is an ISO datetime string
+        run_at = datetime.fromisoformat(crew.schedule_value)
+        if run_at.tzinfo is None:
+            run_at = run_at.replace(tzinfo=timezone.utc)
+        return DateTrigger(run_date=run_at)
+    else:
+        return None
+
+    offset = schedule_offset(crew.id, window)
+    return OffsetTrigger(trigger, offset) if offset else trigger
+
+
+def preview_load(crews: list[Crew], hours: int, spread_seconds: int | None = None,
+                 now: datetime | None = None) -> dict:
+    """Per-minute histogram of scheduled fires over the next `hours`."""
+    now = now or datetime.now(timezone.utc)
+    horizon = now + timedelta(hours=hours)
+    counts: Counter[datetime] = Counter()
+    for crew in crews:
+        try:
+            trigger = build_trigger(crew, spread_seconds)
+        except Exception:
+            continue
+        if trigger is None:
+            continue
+        previous = None
+        fire_time = trigger.get_next_fire_time(None, now)
+        for _ in range(PREVIEW_MAX_FIRES):
+            if fire_time is None or fire_time >= horizon:
+                break
+            minute = fire_time.astimezone(timezone.utc).replace(second=0, microsecond=0)
+            counts[minute] += 1
+            previous = fire_time
+            fire_time = trigger.get_next_fire_time(previous, fire_time + timedelta(microseconds=1))
+
+    total = sum(counts.values())
+    return {
+        "total_fires": total,
+        "peak_per_minute": max(counts.values(), default=0),
+        "busy_minutes": len(counts),
+        "minutes": [
+            {"minute": minute.isoformat(), "count": count}
+            for minute, count in sorted(counts.items())
+        ],
+    }
+
+
+async def run_scheduled_crew(crew_id: str):
+    """Job entry point. Module-level so the persistent job store can reference it."""
+    await scheduler._run_scheduled_crew(crew_id)
+
+
 class CrewScheduler:
+    """APScheduler wrapper that fires crew schedules exactly once across workers.
+
+    Every worker creates a CrewScheduler, but only the one holding the
+    `scheduler_leases` row (renewed every SCHEDULER_LEASE_SECONDS / 3) runs
+    jobs. Jobs live in a persistent SQLAlchemy job store so misfires during a
+    restart or leader change are caught up within the misfire grace time.
+    """
+
     def __init__(self):
-        self.scheduler = AsyncIOScheduler()
+        self.scheduler = AsyncIOScheduler(
+            jobstores={"default": SQLAlchemyJobStore(url=settings.SCHEDULER_JOBSTORE_URL)},
+            job_defaults={
+                "coalesce": True,
+                "misfire_grace_time": settings.SCHEDULER_MISFIRE_GRACE_SECONDS,
+            },
+        )
         self.orchestrator_instance = None
+        self.holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._lease_task: asyncio.Task | None = None
+        # crew_id -> "schedule_type|schedule_value|overlap|spread|queue_max" currently registered
+        self._signatures: dict[str, str] = {}
+        # crew_id -> lock of "queue" fires, and how many fires hold or wait on it
+        self._queue_locks: dict[str, asyncio.Lock] = {}
+        self._queue_users: Counter[str] = Counter()
+        self._last_sync = 0.0
+        # Global admission cap for scheduled runs (None = unlimited)
+        self._admission = (
+            asyncio.Semaphore(settings.SCHEDULER_MAX_CONCURRENT_RUNS)
+            if settings.SCHEDULER_MAX_CONCURRENT_RUNS > 0 else None
+        )
 
     def start(self):
+        """Start competing for the leader lease (needs a running event loop)."""
+        if self._lease_task is None:
+            self._lease_task = asyncio.create_task(self._lease_loop())
+            logger.info(f"Crew Scheduler started ({self.holder_id}).")
+
+    async def shutdown(self):
+        if self._lease_task:
+            self._lease_task.cancel()
+            self._lease_task = None
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        if self.is_leader:
+            await self._release_lease()
+            self.is_leader = False
+        logger.info("Crew Scheduler shut down.")
+
+    # ─── Leader lease ───
+
+    async def _lease_loop(self):
+        interval = max(1, settings.SCHEDULER_LEASE_SECONDS // 3)
+        while True:
+            try:
+                held = await self._try_acquire_lease()
+                if held and not self.is_leader:
+                    await self._become_leader()
+                elif not held and self.is_leader:
+                    self._step_down()
+                elif held:
+                    await self._maybe_sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scheduler lease error: {str(e)}")
+                if self.is_leader:
+                    self._step_down()
+            await asyncio.sleep(interval)
+
+    async def _try_acquire_lease(self) -> bool:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        expires_at = now + timedelta(seconds=settings.SCHEDULER_LEASE_SECONDS)
+        async with async_session() as db:
+            result = await db.execute(
+                update(SchedulerLease)
+                .where(
+                    SchedulerLease.name == LEASE_NAME,
+                    or_(SchedulerLease.holder == self.holder_id, SchedulerLease.expires_at < now),
+                )
+                .values(holder=self.holder_id, expires_at=expires_at)
+            )
+            if result.rowcount:
+                await db.commit()
+                return True
+            if await db.get(SchedulerLease, LEASE_NAME):
+                return False
+            db.add(SchedulerLease(name=LEASE_NAME, holder=self.holder_id, expires_at=expires_at))
+            try:
+                await db.commit()
+                return True
+            except IntegrityError:
+                await db.rollback()
+                return False
+
+    async def _release_lease(self):
+        async with async_session() as db:
+            await db.execute(
+                update(SchedulerLease)
+                .where(SchedulerLease.name == LEASE_NAME, SchedulerLease.holder == self.holder_id)
+                .values(expires_at=datetime(1970, 1, 1))
+            )
+            await db.commit()
+
+    async def _become_leader(self):
+        logger.info(f"👑 {self.holder_id} is now the scheduler leader")
+        self.is_leader = True
         if not self.scheduler.running:
             self.scheduler.start()
-            logger.info("Crew Scheduler started.")
+        else:
+            self.scheduler.resume()
+        await self.load_all_schedules()
+        self.schedule_maintenance()
 
-    def shutdown(self):
+    def _step_down(self):
+        logger.warning(f"{self.holder_id} lost the scheduler lease, pausing jobs")
+        self.is_leader = False
+        self._signatures.clear()
         if self.scheduler.running:
-            self.scheduler.shutdown()
-            logger.info("Crew Scheduler shut down.")
+            self.scheduler.pause()
+
+    async def _maybe_sync(self):
+        """Pick up schedule changes made through other workers."""
+        loop_time = asyncio.get_running_loop().time()
+        if loop_time - self._last_sync >= settings.SCHEDULER_SYNC_SECONDS:
+            await self.load_all_schedules()
+
+    # ─── Jobs ───
 
     async def _run_scheduled_crew(self, crew_id: str):
-        """Execute a crew in the background."""
+        """Execute a crew in the background, honouring its overlap policy."""
+        if not self.is_leader:
+            logger.info(f"Skipping scheduled crew {crew_id}: not the scheduler leader")
+            return
+
         logger.info(f"⏰ Executing scheduled crew: {crew_id}")
+        # Sessions are only held for the queries: waiting for the queue or a slot,
+        # and the run itself (process_run has its own), pin no pooled connection
         async with async_session() as db:
             crew = await db.get(Crew, crew_id)
             if not crew:
                 logger.error(f"Crew {crew_id} not found for scheduling.")
                 return
+            policy = crew.schedule_overlap if crew.schedule_overlap in OVERLAP_POLICIES else "skip"
 
-            orchestrator = Orchestrator(db)
-            try:
-                await orchestrator.execute_crew(crew)
-                logger.info(f"✅ Scheduled execution of crew {crew_id} finished.")
-            except Exception as e:
-                logger.error(f"❌ Error in scheduled execution of crew {crew_id}: {str(e)}")
+        if policy == "queue" and not await self._enter_queue(crew_id):
+            return
+        try:
+            async with async_session() as db:
+                active = await self._active_run_ids(db, crew_id)
+                if active and policy == "replace":
+                    # Also reaches runs executing in another worker (stopped within RUN_CANCEL_POLL_SECONDS)
+                    for run_id in active:
+                        await Orchestrator.request_stop(db, run_id)
+                    logger.info(f"🔁 Replacing {len(active)} in-flight run(s) of crew {crew_id}")
+            if active and policy == "skip":
+                logger.info(f"⏭️ Skipping scheduled crew {crew_id}: a run is still in progress")
+                return
+            if active and policy == "queue":
+                if not await self._wait_for_idle(crew_id):
+                    logger.warning(f"⏭️ Dropping queued run of crew {crew_id}: previous run did not finish in time")
+                    return
+
+            async with async_session() as db:
+                crew = await db.get(Crew, crew_id)
+                if not crew:
+                    logger.error(f"Crew {crew_id} not found for scheduling.")
+                    return
+                orchestrator = Orchestrator(db)
+                # Waiting for a slot shows as pending; process_run marks it running
+                run = await orchestrator.create_run(crew, status="running" if self._admission is None else "pending")
+
+            if self._admission is None:
+                await orchestrator.process_run(run.id, crew_id)
+            else:
+                if self._admission.locked():
+                    logger.info(f"🚦 Scheduled crew {crew_id} waiting for a free slot")
+                try:
+                    await self._admission.acquire()
+                except asyncio.CancelledError:
+                    await self._fail_unstarted(run.id)
+                    raise
+                try:
+                    await orchestrator.process_run(run.id, crew_id)
+                finally:
+                    self._admission.release()
+            logger.info(f"✅ Scheduled execution of crew {crew_id} finished.")
+        except asyncio.CancelledError:
+            logger.info(f"🛑 Scheduled execution of crew {crew_id} was cancelled.")
+        except Exception as e:
+            logger.error(f"❌ Error in scheduled execution of crew {crew_id}: {str(e)}")
+        finally:
+            if policy == "queue":
+                self._leave_queue(crew_id)
+
+    async def _enter_queue(self, crew_id: str) -> bool:
+        """Take the crew's queue lock; False if too many fires wait already or the wait ran out."""
+        lock = self._queue_locks.setdefault(crew_id, asyncio.Lock())
+        if lock.locked() and self._queue_users[crew_id] > settings.SCHEDULER_QUEUE_MAX:
+            logger.warning(f"⏭️ Skipping scheduled crew {crew_id}: {settings.SCHEDULER_QUEUE_MAX} fire(s) already queued")
+            return False
+        self._queue_users[crew_id] += 1
+        try:
+            await asyncio.wait_for(lock.acquire(), settings.SCHEDULER_MISFIRE_GRACE_SECONDS)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"⏭️ Dropping queued run of crew {crew_id}: previous run did not finish in time")
+            self._release_queue_user(crew_id)
+            return False
+        except BaseException:
+            self._release_queue_user(crew_id)
+            raise
+
+    def _leave_queue(self, crew_id: str):
+        self._queue_locks[crew_id].release()
+        self._release_queue_user(crew_id)
+
+    def _release_queue_user(self, crew_id: str):
+        # Drop the lock once nobody holds or waits on it, so the dict doesn't grow with every crew ever queued
+        self._queue_users[crew_id] -= 1
+        if self._queue_users[crew_id] <= 0:
+            del self._queue_users[crew_id]
+            self._queue_locks.pop(crew_id, None)
+
+    async def _fail_unstarted(self, run_id: str):
+        """Fail a run cancelled while it waited for an admission slot, so it is not left pending."""
+        async with async_session() as db:
+            await db.execute(
+                update(Run)
+                .where(Run.id == run_id, Run.status == "pending")
+                .values(
+                    status="failed",
+                    result="Error: la ejecución programada se canceló antes de empezar.",
+                    completed_at=datetime.now(timezone.utc),
+                )
+            )
+            await db.commit()
+
+    async def _active_run_ids(self, db: AsyncSession, crew_id: str) -> list[str]:
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - STALE_RUN_AFTER
+        result = await db.execute(
+            select(Run.id).where(
+                Run.crew_id == crew_id,
+                Run.status.in_(("pending", "running")),
+                Run.created_at >= since,
+            )
+        )
+        return list(result.scalars())
+
+    async def _wait_for_idle(self, crew_id: str) -> bool:
+        waited = 0
+        while waited < settings.SCHEDULER_MISFIRE_GRACE_SECONDS:
+            await asyncio.sleep(QUEUE_POLL_SECONDS)
+            waited += QUEUE_POLL_SECONDS
+            async with async_session() as db:
+                if not await self._active_run_ids(db, crew_id):
+                    return True
+        return False
 
     def schedule_crew(self, crew: Crew):
-        """Add or update a crew's schedule in the scheduler."""
+        """Add or update a crew's schedule in the scheduler.
+
+        Only acts on the leader; other workers' changes are picked up by the
+        leader's periodic sync.
+        """
+        if not self.is_leader:
+            return
+
         job_id = f"crew_{crew.id}"
-        
+        policy = crew.schedule_overlap if crew.schedule_overlap in OVERLAP_POLICIES else "skip"
+        signature = (
+            f"{crew.schedule_type}|{crew.schedule_value}|{policy}|{settings.SCHEDULER_SPREAD_SECONDS}"
+            f"|{settings.SCHEDULER_QUEUE_MAX}"
+        )
+        # Unchanged schedule: keep the (possibly persisted) job so its next run
+        # time, and any misfire to catch up, survive restarts and leader changes
+        existing = self.scheduler.get_job(job_id)
+        if existing and existing.name == signature:
+            self._signatures[crew.id] = signature
+            return
+
         # Remove existing job if any
         if self.scheduler.get_job(job_id):
             self.scheduler.remove_job(job_id)
+        self._signatures.pop(crew.id, None)
 
         if crew.schedule_type == "none":
             return
 
-        trigger = None
         try:
-            if crew.schedule_type == "interval":
-                # Assuming schedule_value is minutes for interval
-                minutes = int(crew.schedule_value or 60)
-                trigger = IntervalTrigger(minutes=minutes)
-            elif crew.schedule_type == "cron":
-                # Assuming schedule_value is a cron expression
-                trigger = CronTrigger.from_crontab(crew.schedule_value)
-            elif crew.schedule_type == "once":
-                # Assuming schedule_value is an ISO datetime string
-                run_at = datetime.fromisoformat(crew.schedule_value)
-                if run_at.tzinfo is None:
-                    run_at = run_at.replace(tzinfo=timezone.utc)
-                trigger = DateTrigger(run_date=run_at)
-
+            trigger = build_trigger(crew)
             if trigger:
                 self.scheduler.add_job(
-                    self._run_scheduled_crew,
+                    run_scheduled_crew,
                     trigger,
                     args=[crew.id],
                     id=job_id,
-                    replace_existing=True
+                    name=signature,
+                    replace_existing=True,
+                    # skip: never overlap; queue: up to SCHEDULER_QUEUE_MAX wait on the crew
+                    # lock; replace: the new instance cancels the running one
+                    max_instances={"skip": 1, "queue": 1 + settings.SCHEDULER_QUEUE_MAX}.get(policy, 2),
                 )
-                logger.info(f"📅 Scheduled crew {crew.id} ({crew.name}) with type {crew.schedule_type}")
+                self._signatures[crew.id] = signature
+                logger.info(f"📅 Scheduled crew {crew.id} ({crew.name}) with type {crew.schedule_type} ({policy})")
         except Exception as e:
             logger.error(f"Error scheduling crew {crew.id}: {str(e)}")
 
+    def unschedule_crew(self, crew_id: str):
+        if not self.is_leader:
+            return
+        job_id = f"crew_{crew_id}"
+        if self.scheduler.get_job(job_id):
+            self.scheduler.remove_job(job_id)
+        self._signatures.pop(crew_id, None)
+
+    def schedule_maintenance(self):
+        """Periodic run retention, blob GC and SQLite compaction."""
+        if settings.MAINTENANCE_INTERVAL_MINUTES <= 0 or not self.is_leader:
+            return
+        self.scheduler.add_job(
+            run_maintenance,
+            IntervalTrigger(minutes=settings.MAINTENANCE_INTERVAL_MINUTES),
+            id="maintenance",
+            replace_existing=True,
+            max_instances=1,
+        )
+        logger.info(f"🧹 Maintenance scheduled every {settings.MAINTENANCE_INTERVAL_MINUTES} minutes")
+
     async def load_all_schedules(self):
-        """Load all active schedules from the database on startup."""
+        """Reconcile jobs with the crews table (on election and periodically)."""
+        self._last_sync = asyncio.get_running_loop().time()
         async with async_session() as db:
             result = await db.execute(select(Crew).where(Crew.schedule_type != "none"))
             crews = result.scalars().all()
             for crew in crews:
                 self.schedule_crew(crew)
 
+        # Drop jobs of crews that were deleted or unscheduled elsewhere
+        scheduled_ids = {c.id for c in crews}
+        for job in self.scheduler.get_jobs():
+            if job.id.startswith("crew_") and job.id[len("crew_"):] not in scheduled_ids:
+                self.unschedule_crew(job.id[len("crew_"):])
+
 # Singleton instance
 scheduler = CrewScheduler()
@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import logging
+import math
+import re
+import zlib
+from array import array
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete
+
+from config import settings
+from db.database import async_session
+from models.models import SemanticCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# Embedding size: hashed features are folded into this many float32 dimensions
+DIMENSIONS = 1024
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+# Dates and times (2024-05-01, 2024-05-01T10:20:30Z, 10:20:30): volatile, not meaningful
+_TIMESTAMP = re.compile(
+    r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?"
+    r"|\b\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?\b"
+)
+
+
+_np = False  # numpy module, None when missing; False until first use
+
+
+def _numpy():
+    """NumPy, imported on first use so startup does not pay for it while the cache is unused.
+
+    None when not installed: pure-Python vectors give the same results, slower on large indexes.
+    """
+    global _np
+    if _np is False:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:
+            _np = None
+    return _np
+
+
+def _strip_timestamps(text: str) -> str:
+    return _TIMESTAMP.sub(" timestamp ", text)
+
+
+def embed(text: str):
+    """Local, CPU-only embedding of a prompt (signed feature hashing, L2-normalized).
+
+    Features are lowercase words and word bigrams with dates and times
+    collapsed, so prompts that only differ in timestamps or the order of a few
+    lines end up close together. Other numbers are kept (and also part of the
+    namespace, see `cache_namespace`). Deterministic across processes (crc32), needs
+    no model download. Returns a float32 NumPy vector, or an `array('f')`
+    without NumPy.
+    """
+    counts: dict[int, float] = {}
+    # Bigrams stay within a line, so reordering lines (e.g. search results) changes little
+    for line in _strip_timestamps(text.lower()).splitlines():
+        words = _WORD.findall(line)
+        for index, word in enumerate(words):
+            features = (word, f"{words[index - 1]} {word}") if index else (word,)
+            for feature in features:
+                h = zlib.crc32(feature.encode("utf-8"))
+                slot = h % DIMENSIONS
+                counts[slot] = counts.get(slot, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+
+    # Sublinear term frequency keeps long repeated boilerplate from dominating
+    weights = {slot: math.copysign(1 + math.log(abs(c)), c) for slot, c in counts.items() if c}
+    norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+    np = _numpy()
+    if np is not None:
+        vector = np.zeros(DIMENSIONS, dtype=np.float32)
+        for slot, w in weights.items():
+            vector[slot] = w / norm
+        return vector
+    vector = array("f", bytes(4 * DIMENSIONS))
+    for slot, w in weights.items():
+        vector[slot] = w / norm
+    return vector
+
+
+def to_bytes(vector) -> bytes:
+    return vector.tobytes()
+
+
+def from_bytes(raw: bytes):
+    np = _numpy()
+    if np is not None:
+        return np.frombuffer(raw, dtype=np.float32)
+    return array("f", raw)
+
+
+def cache_namespace(crew_id: str, model: str, system_prompt: str, user_prompt: str = "") -> str:
+    """Entries are only compared within a namespace: same crew, same model, same system
+    prompt and the same numbers in the user prompt (amounts, ids, inputs), so "precio 10"
+    never gets the completion of "precio 99" however similar the rest of the prompt is.
+    Crews never share completions, even with identical agents.
+    """
+    numbers = _NUMBER.findall(_strip_timestamps(user_prompt))
+    key = f"{crew_id}\n{model}\n{system_prompt}\n{' '.join(numbers)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class VectorIndex:
+    """Unit vectors of one namespace with their completions; nearest neighbour by cosine.
+
+    NumPy keeps them in one contiguous float32 matrix (a single mat-vec per
+    lookup); without it, a list of arrays scanned in Python.
+    """
+
+    def __init__(self):
+        self.entries: list[dict] = []  # {"completion", "tokens", "created_at"}
+        self._np = np = _numpy()
+        self._matrix = np.zeros((0, DIMENSIONS), dtype=np.float32) if np is not None else None
+        self._vectors: list = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, vector, entry: dict):
+        np = self._np
+        if np is not None:
+            if len(self.entries) == len(self._matrix):
+                grown = np.zeros((max(16, 2 * len(self._matrix)), DIMENSIONS), dtype=np.float32)
+                grown[:len(self._matrix)] = self._matrix
+                self._matrix = grown
+            self._matrix[len(self.entries)] = vector
+        else:
+            self._vectors.append(vector)
+        self.entries.append(entry)
+
+    def trim(self, max_entries: int, not_before: datetime | None = None):
+        """Drop expired entries and keep only the newest `max_entries` (entries are oldest first)."""
+        start = max(0, len(self.entries) - max_entries)
+        if not_before is not None:
+            while start < len(self.entries) and self.entries[start]["created_at"] < not_before:
+                start += 1
+        if start == 0:
+            return
+        self.entries = self.entries[start:]
+        if self._np is not None:
+            self._matrix = self._matrix[start:].copy()
+        else:
+            self._vectors = self._vectors[start:]
+
+    def nearest(self, vector) -> tuple[float, dict | None]:
+        if not self.entries:
+            return 0.0, None
+        np = self._np
+        if np is not None:
+            scores = self._matrix[:len(self.entries)] @ vector
+            best = int(np.argmax(scores))
+            return float(scores[best]), self.entries[best]
+        # Snapshot: without NumPy this runs in a worker thread while entries may be added
+        entries = self.entries
+        vectors = self._vectors[:len(entries)]
+        best, best_score = 0, -1.0
+        for index, candidate in enumerate(vectors):
+            score = sum(a * b for a, b in zip(candidate, vector))
+            if score > best_score:
+                best, best_score = index, score
+        return best_score, entries[best]
+
+
+class SemanticCache:
+    """Near-duplicate completion cache, persisted in `semantic_cache_entries`.
+
+    Each namespace (crew + model + system prompt + numbers of the prompt) is loaded
+    into memory on first use and kept per process; new entries are written
+    through to the database.
+    """
+
+    def __init__(self):
+        self._indexes: dict[str, VectorIndex] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def _cutoff(self) -> datetime:
+        return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=settings.SEMANTIC_CACHE_TTL_HOURS)
+
+    async def _index(self, namespace: str) -> VectorIndex:
+        index = self._indexes.get(namespace)
+        if index is not None:
+            return index
+        async with self._locks.setdefault(namespace, asyncio.Lock()):
+            if namespace not in self._indexes:
+                index = VectorIndex()
+                async with async_session() as session:
+                    rows = (await session.execute(
+                        select(SemanticCacheEntry)
+                        .where(
+                            SemanticCacheEntry.namespace == namespace,
+                            SemanticCacheEntry.created_at >= self._cutoff(),
+                        )
+                        .order_by(SemanticCacheEntry.created_at.desc())
+                        .limit(settings.SEMANTIC_CACHE_MAX_ENTRIES)
+                    )).scalars().all()
+                for row in reversed(rows):
+                    index.add(from_bytes(row.embedding), {
+                        "completion": row.completion, "tokens": row.tokens or 0, "created_at": row.created_at,
+                    })
+                self._indexes[namespace] = index
+        return self._indexes[namespace]
+
+    async def lookup(self, namespace: str, vector, threshold: float) -> tuple[float, dict | None]:
+        """(best similarity, entry or None if below `threshold`)."""
+        index = await self._index(namespace)
+        index.trim(settings.SEMANTIC_CACHE_MAX_ENTRIES, not_before=self._cutoff())
+        if _numpy() is not None:
+            similarity, entry = index.nearest(vector)
+        else:
+            # The pure-Python scan is slow on large indexes: keep it off the event loop
+            similarity, entry = await asyncio.to_thread(index.nearest, vector)
+        return similarity, entry if entry is not None and similarity >= threshold else None
+
+    async def store(self, crew_id: str, namespace: str, vector, completion: str, tokens: int):
+        index = await self._index(namespace)
+        created_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        index.add(vector, {"completion": completion, "tokens": tokens, "created_at": created_at})
+        index.trim(settings.SEMANTIC_CACHE_MAX_ENTRIES)
+        try:
+            async with async_session() as session:
+                session.add(SemanticCacheEntry(
+                    crew_id=crew_id, namespace=namespace, embedding=to_bytes(vector),
+                    completion=completion, tokens=tokens, created_at=created_at,
+                ))
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Error storing semantic cache entry: {str(e)}")
+
+    def clear(self):
+        self._indexes.clear()
+
+
+async def purge_expired_entries() -> int:
+    """Delete entries older than SEMANTIC_CACHE_TTL_HOURS. Returns how many were removed."""
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=settings.SEMANTIC_CACHE_TTL_HOURS)
+    async with async_session() as session:
+        result = await session.execute(
+            delete(SemanticCacheEntry).where(SemanticCacheEntry.created_at < cutoff)
+        )
+        await session.commit()
+        return result.rowcount or 0
+
+
+def new_stats() -> dict:
+    return {"hits": 0, "misses": 0, "saved_tokens": 0, "similarities": []}
+
+
+def summarize_stats(stats: dict) -> dict:
+    """Per-run counters stored on `Run.cache_stats["semantic"]`."""
+    similarities = stats["similarities"]
+    return {
+        "hits": stats["hits"],
+        "misses": stats["misses"],
+        "saved_tokens": stats["saved_tokens"],
+        "max_similarity": round(max(similarities), 4) if similarities else None,
+        "mean_similarity": round(sum(similarities) / len(similarities), 4) if similarities else None,
+    }
+
+
+semantic_cache = SemanticCache()
@@ -0,0 +1,243 @@
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Trace of the run being executed by the current asyncio task (None = not tracing)
+current_trace: ContextVar["RunTrace | None"] = ContextVar("current_trace", default=None)
+_current_span: ContextVar["dict | None"] = ContextVar("current_span", default=None)
+
+_otlp_lock = threading.Lock()
+
+
+class RunTrace:
+    """Hierarchical spans of one run (run > task > scrape / search / llm / db.commit / email).
+
+    Spans are plain dicts so the whole trace can be stored as JSON on the run:
+    `{"id", "parent", "name", "start_ns", "end_ns", "attrs", "status"}` with
+    Unix-epoch nanosecond timestamps.
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.trace_id = secrets.token_hex(16)
+        self.spans: list[dict] = []
+        self.root: dict | None = None
+        self._tokens = None
+        # Monotonic clock anchored to wall time, so durations never go negative
+        self._epoch_ns = time.time_ns()
+        self._perf_ns = time.perf_counter_ns()
+
+    def _now_ns(self) -> int:
+        return self._epoch_ns + (time.perf_counter_ns() - self._perf_ns)
+
+    def start_span(self, name: str, parent: dict | None = None, **attrs) -> dict:
+        span = {
+            "id": secrets.token_hex(8),
+            "parent": parent["id"] if parent else None,
+            "name": name,
+            "start_ns": self._now_ns(),
+            "end_ns": None,
+            "attrs": attrs,
+            "status": "ok",
+        }
+        self.spans.append(span)
+        return span
+
+    def end_span(self, span: dict, error: BaseException | None = None):
+        if span["end_ns"] is None:
+            span["end_ns"] = self._now_ns()
+        if error is not None:
+            span["status"] = "error"
+            span["attrs"]["error"] = str(error) or type(error).__name__
+
+    def as_dict(self) -> dict:
+        # Close anything left open (e.g. a cancelled task) so the timeline is complete
+        for record in self.spans:
+            self.end_span(record)
+        return {"trace_id": self.trace_id, "spans": self.spans}
+
+    def finish(self, run, error: BaseException | None = None):
+        """End the root span and store the trace on `run` (call before its final commit)."""
+        self.end_span(self.root, error=error)
+        set_attributes(self.root, run_status=run.status, tokens=run.tokens_used or 0)
+        stored = self.as_dict()
+        run.trace = json.dumps(stored, ensure_ascii=False)
+        export_otlp_file(run.id, stored)
+
+    def detach(self):
+        """Stop recording spans from the current context."""
+        if self._tokens:
+            current_trace.reset(self._tokens[0])
+            _current_span.reset(self._tokens[1])
+            self._tokens = None
+
+
+def start_run_trace(run_id: str, **attrs) -> RunTrace | None:
+    """Begin tracing a run in the current context; the root "run" span starts now.
+
+    Returns None when TRACING_ENABLED is off.
+    """
+    if not settings.TRACING_ENABLED:
+        return None
+    trace = RunTrace(run_id)
+    trace.root = trace.start_span("run", run_id=run_id, **attrs)
+    trace._tokens = (current_trace.set(trace), _current_span.set(trace.root))
+    return trace
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Record a child span of the current one. No-op outside a traced run.
+
+    Yields the span dict (or None) so callers can add attributes once known.
+    """
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    record = trace.start_span(name, _current_span.get(), **attrs)
+    token = _current_span.set(record)
+    try:
+        yield record
+    except BaseException as e:
+        trace.end_span(record, error=e)
+        raise
+    finally:
+        _current_span.reset(token)
+        trace.end_span(record)
+
+
+def set_attributes(record: dict | None, **attrs):
+    """Add attributes to a span yielded by `span()` (tolerates None)."""
+    if record is not None:
+        record["attrs"].update(attrs)
+
+
+# ─── Export formats ───
+
+def _assign_lanes(spans: list[dict]) -> dict[str, int]:
+    """Thread lane per span id so that spans on one lane nest strictly.
+
+    Chrome draws events of a thread as a stack, so two overlapping siblings
+    (parallel tasks, concurrent map items) on the same `tid` render on top of
+    each other. A span goes on its parent's lane when it fits inside what is
+    open there, otherwise on the first lane where it fits, otherwise a new one.
+    """
+    lanes: list[list[int]] = []  # per lane, end_ns of the spans still open on it
+    lane_of: dict[str, int] = {}
+    for s in spans:
+        start, end = s["start_ns"], s["end_ns"] or s["start_ns"]
+
+        def fits(lane: int) -> bool:
+            stack = lanes[lane]
+            while stack and stack[-1] <= start:
+                stack.pop()
+            return not stack or end <= stack[-1]
+
+        parent_lane = lane_of.get(s["parent"])
+        candidates = ([parent_lane] if parent_lane is not None else []) + list(range(len(lanes)))
+        lane = next((lane for lane in candidates if fits(lane)), None)
+        if lane is None:
+            lanes.append([])
+            lane = len(lanes) - 1
+        lanes[lane].append(end)
+        lane_of[s["id"]] = lane
+    return lane_of
+
+
+def to_chrome_trace(run_id: str, stored: dict) -> dict:
+    """Chrome trace-event JSON (loads in chrome://tracing and ui.perfetto.dev).
+
+    Complete ("X") events; nesting follows from time containment, and spans
+    that run concurrently go on separate thread lanes.
+    """
+    spans = sorted(stored["spans"], key=lambda s: (s["start_ns"], -(s["end_ns"] or s["start_ns"])))
+    lane_of = _assign_lanes(spans)
+    events = [{
+        "name": "process_name", "ph": "M", "pid": 1, "tid": 1,
+        "args": {"name": f"run {run_id}"},
+    }]
+    for lane in sorted(set(lane_of.values())):
+        events.append({
+            "name": "thread_name", "ph": "M", "pid": 1, "tid": lane + 1,
+            "args": {"name": "run" if lane == 0 else f"lane {lane}"},
+        })
+    for s in spans:
+        end_ns = s["end_ns"] or s["start_ns"]
+        events.append({
+            "name": s["name"],
+            "cat": s["name"].split(".")[0],
+            "ph": "X",
+            "ts": s["start_ns"] / 1000,
+            "dur": (end_ns - s["start_ns"]) / 1000,
+            "pid": 1,
+            "tid": lane_of[s["id"]] + 1,
+            "args": {**s["attrs"], "status": s["status"], "span_id": s["id"], "parent_span_id": s["parent"]},
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"trace_id": stored["trace_id"]}}
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(run_id: str, stored: dict) -> dict:
+    """OTLP/JSON `ExportTraceServiceRequest` for the run's spans."""
+    spans = []
+    for s in stored["spans"]:
+        record = {
+            "traceId": stored["trace_id"],
+            "spanId": s["id"],
+            "name": s["name"],
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(s["start_ns"]),
+            "endTimeUnixNano": str(s["end_ns"] or s["start_ns"]),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s["attrs"].items()],
+            "status": {"code": 2 if s["status"] == "error" else 1},
+        }
+        if s["parent"]:
+            record["parentSpanId"] = s["parent"]
+        spans.append(record)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": settings.TRACE_SERVICE_NAME}},
+                {"key": "run.id", "value": {"stringValue": run_id}},
+            ]},
+            "scopeSpans": [{"scope": {"name": "agentforge.orchestrator"}, "spans": spans}],
+        }]
+    }
+
+
+def export_otlp_file(run_id: str, stored: dict):
+    """Append the trace as one OTLP/JSON line to TRACE_OTLP_FILE (if configured).
+
+    The file can be tailed by an OpenTelemetry Collector `otlpjsonfile` receiver.
+    """
+    path = settings.TRACE_OTLP_FILE
+    if not path:
+        return
+    try:
+        line = json.dumps(to_otlp(run_id, stored), ensure_ascii=False)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with _otlp_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except Exception as e:
+        logger.error(f"Error exporting trace of run {run_id} to {path}: {str(e)}")
@@ -0,0 +1,33 @@
+import asyncio
+import importlib
+import logging
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# Provider, tool, email and vector libraries imported on first use instead of at startup.
+# litellm alone takes seconds; the API answers /api/health without any of them.
+HEAVY_MODULES = ("litellm", "bs4", "duckduckgo_search", "markdown2", "numpy")
+
+
+async def warm_up_imports(modules: tuple[str, ...] = HEAVY_MODULES) -> dict[str, float]:
+    """Import heavy modules in a worker thread once the server is up.
+
+    Lets the first run skip the import cost without delaying startup.
+    Returns seconds spent per module (0 if it was already imported).
+    """
+    timings = {}
+    for name in modules:
+        if name in sys.modules:
+            timings[name] = 0.0
+            continue
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(importlib.import_module, name)
+        except Exception as e:
+            logger.warning(f"Warm-up import of {name} failed: {str(e)}")
+            continue
+        timings[name] = round(time.perf_counter() - started, 3)
+    logger.info(f"🔥 Heavy imports warmed up: {timings}")
+    return timings
@@ -36,6 +36,10 @@ async def init_db():
                 connection.execute(text("ALTER TABLE agents ADD COLUMN task_description TEXT"))
             if "task_expected_output" not in columns:
                 connection.execute(text("ALTER TABLE agents ADD COLUMN task_expected_output TEXT"))
+            if "web_search_enabled" not in columns:
+                connection.execute(text("ALTER TABLE agents ADD COLUMN web_search_enabled BOOLEAN DEFAULT 0"))
+            if "tool_mode" not in columns:
+                connection.execute(text("ALTER TABLE agents ADD COLUMN tool_mode TEXT DEFAULT 'prefetch'"))
             
             # Migration: Add scheduling and publicity to crews table
             res = connection.execute(text("PRAGMA table_info(crews)"))
@@ -44,15 +48,92 @@ async def init_db():
                 connection.execute(text("ALTER TABLE crews ADD COLUMN schedule_type TEXT DEFAULT 'none'"))
             if "schedule_value" not in crew_columns:
                 connection.execute(text("ALTER TABLE crews ADD COLUMN schedule_value TEXT"))
+            if "schedule_overlap" not in crew_columns:
+                connection.execute(text("ALTER TABLE crews ADD COLUMN schedule_overlap TEXT DEFAULT 'skip'"))
             if "is_public" not in crew_columns:
                 connection.execute(text("ALTER TABLE crews ADD COLUMN is_public BOOLEAN DEFAULT 0"))
             if "output_email" not in crew_columns:
                 connection.execute(text("ALTER TABLE crews ADD COLUMN output_email TEXT"))
+            if "retention_keep_last" not in crew_columns:
+                connection.execute(text("ALTER TABLE crews ADD COLUMN retention_keep_last INTEGER"))
+            if "retention_days" not in crew_columns:
+                connection.execute(text("ALTER TABLE crews ADD COLUMN retention_days INTEGER"))
+            if "retention_failed_days" not in crew_columns:
+                connection.execute(text("ALTER TABLE crews ADD COLUMN retention_failed_days INTEGER"))
+            if "version" not in crew_columns:
+                connection.execute(text("ALTER TABLE crews ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+            if "semantic_cache_enabled" not in crew_columns:
+                connection.execute(text("ALTER TABLE crews ADD COLUMN semantic_cache_enabled BOOLEAN DEFAULT 0"))
+            if "semantic_cache_threshold" not in crew_columns:
+                connection.execute(text("ALTER TABLE crews ADD COLUMN semantic_cache_threshold FLOAT"))
+            if "run_timeout_seconds" not in crew_columns:
+                connection.execute(text("ALTER TABLE crews ADD COLUMN run_timeout_seconds INTEGER"))
+            if "task_timeout_seconds" not in crew_columns:
+                connection.execute(text("ALTER TABLE crews ADD COLUMN task_timeout_seconds INTEGER"))
             
+            # Migration: Map-reduce task settings
+            res = connection.execute(text("PRAGMA table_info(tasks)"))
+            task_columns = [row[1] for row in res]
+            if "kind" not in task_columns:
+                connection.execute(text("ALTER TABLE tasks ADD COLUMN kind VARCHAR(20) DEFAULT 'single'"))
+            if "map_source" not in task_columns:
+                connection.execute(text("ALTER TABLE tasks ADD COLUMN map_source VARCHAR(20) DEFAULT 'auto'"))
+            if "map_input" not in task_columns:
+                connection.execute(text("ALTER TABLE tasks ADD COLUMN map_input TEXT"))
+            if "map_concurrency" not in task_columns:
+                connection.execute(text("ALTER TABLE tasks ADD COLUMN map_concurrency INTEGER"))
+            if "map_retries" not in task_columns:
+                connection.execute(text("ALTER TABLE tasks ADD COLUMN map_retries INTEGER"))
+            if "reduce_batch_size" not in task_columns:
+                connection.execute(text("ALTER TABLE tasks ADD COLUMN reduce_batch_size INTEGER"))
+
             # Migration: Add api_key to llm_configs table
             res = connection.execute(text("PRAGMA table_info(llm_configs)"))
             llm_columns = [row[1] for row in res]
             if "api_key" not in llm_columns:
                 connection.execute(text("ALTER TABLE llm_configs ADD COLUMN api_key TEXT"))
+
+            # Migration: Blob store references on runs
+            res = connection.execute(text("PRAGMA table_info(runs)"))
+            run_columns = [row[1] for row in res]
+            if "result_hash" not in run_columns:
+                connection.execute(text("ALTER TABLE runs ADD COLUMN result_hash VARCHAR(64)"))
+            if "result_size" not in run_columns:
+                connection.execute(text("ALTER TABLE runs ADD COLUMN result_size INTEGER DEFAULT 0"))
+            if "result_preview" not in run_columns:
+                connection.execute(text("ALTER TABLE runs ADD COLUMN result_preview TEXT DEFAULT ''"))
+            if "logs_hash" not in run_columns:
+                connection.execute(text("ALTER TABLE runs ADD COLUMN logs_hash VARCHAR(64)"))
+            if "logs_size" not in run_columns:
+                connection.execute(text("ALTER TABLE runs ADD COLUMN logs_size INTEGER DEFAULT 0"))
+            if "log_seq" not in run_columns:
+                connection.execute(text("ALTER TABLE runs ADD COLUMN log_seq INTEGER DEFAULT 0"))
+            if "trace" not in run_columns:
+                connection.execute(text("ALTER TABLE runs ADD COLUMN trace TEXT"))
+            if "inputs" not in run_columns:
+                connection.execute(text("ALTER TABLE runs ADD COLUMN inputs TEXT"))
+            if "batch_id" not in run_columns:
+                connection.execute(text("ALTER TABLE runs ADD COLUMN batch_id VARCHAR"))
+            if "batch_index" not in run_columns:
+                connection.execute(text("ALTER TABLE runs ADD COLUMN batch_index INTEGER"))
+            if "cache_stats" not in run_columns:
+                connection.execute(text("ALTER TABLE runs ADD COLUMN cache_stats TEXT"))
+            if "mode" not in run_columns:
+                connection.execute(text("ALTER TABLE runs ADD COLUMN mode TEXT DEFAULT 'full'"))
+            if "task_outputs" not in run_columns:
+                connection.execute(text("ALTER TABLE runs ADD COLUMN task_outputs TEXT"))
+            if "cancel_requested_at" not in run_columns:
+                connection.execute(text("ALTER TABLE runs ADD COLUMN cancel_requested_at DATETIME"))
+
+            # Migration: Indexes for paginated run listings and crew aggregates
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_runs_crew_created ON runs (crew_id, created_at, id)"
+            ))
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_runs_batch ON runs (batch_id, batch_index)"
+            ))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS ix_agents_crew_id ON agents (crew_id)"))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS ix_tasks_crew_id ON tasks (crew_id)"))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS ix_crews_updated_at ON crews (updated_at)"))
                 
         await conn.run_sync(run_migrations)
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
@@ -6,19 +7,50 @@ from config import settings
 from db.database import init_db
 from api.routes.crews import router as crews_router
 from api.routes.runs import router as runs_router
+from api.routes.batches import router as batches_router
 from api.routes.services import router as services_router
 from api.routes.config import router as config_router
 from core.scheduler import scheduler
+from core.batches import fail_interrupted_batches
+from core.warmup import warm_up_imports
+from core.llm_resilience import breaker_states
+from core.endpoint_pool import endpoint_pools
+from core.mcp_pool import mcp_pool, server_config
+from api.responses import DefaultJSONResponse
+
+
+async def start_mcp_servers():
+    from sqlalchemy import select
+    from db.database import async_session
+    from models.models import MCPServer
+
+    async with async_session() as session:
+        servers = (await session.execute(select(MCPServer))).scalars().all()
+    await mcp_pool.start_all([server_config(s) for s in servers])
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
-    # Start background scheduler
+    # Batches run in-process: pending runs of batches cut by a restart will never start
+    await fail_interrupted_batches()
+    # Start background scheduler (jobs only fire in the worker holding the leader lease)
     scheduler.start()
-    await scheduler.load_all_schedules()
+    # Health checks of multi-endpoint LLM pools (/api/tags)
+    endpoint_pools.start()
+    # MCP server sessions stay open for the app's lifetime; start them in the background
+    mcp_startup = asyncio.create_task(start_mcp_servers()) if settings.MCP_START_ON_BOOT else None
+    # Heavy libraries load lazily; pre-import them off the event loop so the
+    # first run does not pay for it
+    warmup = asyncio.create_task(warm_up_imports()) if settings.WARMUP_IMPORTS else None
     yield
-    scheduler.shutdown()
+    if warmup and not warmup.done():
+        warmup.cancel()
+    if mcp_startup and not mcp_startup.done():
+        mcp_startup.cancel()
+    await mcp_pool.close_all()
+    await endpoint_pools.stop()
+    await scheduler.shutdown()
 
 
 app = FastAPI(
@@ -26,6 +58,7 @@ app = FastAPI(
     version=settings.APP_VERSION,
     description="Plataforma visual de orquestación multi-agente",
     lifespan=lifespan,
+    default_response_class=DefaultJSONResponse,
 )
 
 app.add_middleware(
@@ -38,13 +71,19 @@ app.add_middleware(
 
 app.include_router(crews_router)
 app.include_router(runs_router)
+app.include_router(batches_router)
 app.include_router(services_router)
 app.include_router(config_router)
 
 
 @app.get("/api/health")
 async def health():
-    return {"status": "ok", "app": settings.APP_NAME, "version": settings.APP_VERSION}
+    return {
+        "status": "ok",
+        "app": settings.APP_NAME,
+        "version": settings.APP_VERSION,
+        "llm_circuits": breaker_states(),
+    }
 
 
 @app.get("/api/llm-models")
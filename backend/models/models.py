@@ -1,8 +1,8 @@
 import uuid
 import json
 from datetime import datetime, timezone
-from sqlalchemy import Column, String, Text, Float, DateTime, ForeignKey, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Text, Float, Integer, DateTime, ForeignKey, Boolean, Index, LargeBinary
+from sqlalchemy.orm import relationship, deferred
 from db.database import Base
 
 
@@ -18,7 +18,7 @@ class Agent(Base):
     __tablename__ = "agents"
 
     id = Column(String, primary_key=True, default=generate_uuid)
-    crew_id = Column(String, ForeignKey("crews.id", ondelete="CASCADE"), nullable=False)
+    crew_id = Column(String, ForeignKey("crews.id", ondelete="CASCADE"), nullable=False, index=True)
     name = Column(String(100), nullable=False)
     role = Column(String(200), nullable=False)
     goal = Column(Text, nullable=False)
@@ -35,6 +35,7 @@ class Agent(Base):
     task_description = Column(Text, nullable=True)
     task_expected_output = Column(Text, nullable=True)
     web_search_enabled = Column(Boolean, default=False)
+    tool_mode = Column(String(20), default="prefetch")  # prefetch | function_calling
     created_at = Column(DateTime, default=utcnow)
 
     crew = relationship("Crew", back_populates="agents")
@@ -45,12 +46,19 @@ class Task(Base):
     __tablename__ = "tasks"
 
     id = Column(String, primary_key=True, default=generate_uuid)
-    crew_id = Column(String, ForeignKey("crews.id", ondelete="CASCADE"), nullable=False)
+    crew_id = Column(String, ForeignKey("crews.id", ondelete="CASCADE"), nullable=False, index=True)
     agent_id = Column(String, ForeignKey("agents.id", ondelete="SET NULL"), nullable=True)
     name = Column(String(200), nullable=False)
     description = Column(Text, nullable=False)
     expected_output = Column(Text, default="")
     order = Column(Float, default=0)
+    # "single" or "map_reduce" (fan the task out over a list of inputs, then combine)
+    kind = Column(String(20), default="single")
+    map_source = Column(String(20), default="auto")  # auto | skills | previous | json
+    map_input = Column(Text, nullable=True)  # JSON array or one item per line
+    map_concurrency = Column(Integer, nullable=True)
+    map_retries = Column(Integer, nullable=True)
+    reduce_batch_size = Column(Integer, nullable=True)
     # Visual position on canvas
     position_x = Column(Float, default=200)
     position_y = Column(Float, default=0)
@@ -70,26 +78,70 @@ class Crew(Base):
     # Scheduling fields
     schedule_type = Column(String(20), default="none")  # none | once | interval | cron
     schedule_value = Column(String(100), nullable=True)
+    schedule_overlap = Column(String(20), default="skip")  # skip | queue | replace
     is_public = Column(Boolean, default=False)
     output_email = Column(String(200), nullable=True)
+    # Run retention (NULL = use the global default from settings)
+    retention_keep_last = Column(Integer, nullable=True)
+    retention_days = Column(Integer, nullable=True)
+    retention_failed_days = Column(Integer, nullable=True)
+    # Semantic prompt cache: reuse a completion when a new prompt is this similar (NULL = global default)
+    semantic_cache_enabled = Column(Boolean, default=False)
+    semantic_cache_threshold = Column(Float, nullable=True)
+    # Deadlines in seconds for a whole run and for each task (NULL = global default, 0 = none)
+    run_timeout_seconds = Column(Integer, nullable=True)
+    task_timeout_seconds = Column(Integer, nullable=True)
     # Canvas state stored as JSON (edges, viewport, etc.)
     canvas_state = Column(Text, default="{}")
+    # Bumped on every graph change; used for optimistic concurrency of bulk saves
+    version = Column(Integer, default=1, nullable=False)
     created_at = Column(DateTime, default=utcnow)
-    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow, index=True)
 
     agents = relationship("Agent", back_populates="crew", cascade="all, delete-orphan")
     tasks = relationship("Task", back_populates="crew", cascade="all, delete-orphan")
     runs = relationship("Run", back_populates="crew", cascade="all, delete-orphan")
 
 
+# Run statuses after which a run will not change any more
+RUN_FINISHED_STATUSES = ("completed", "failed", "timeout")
+
+
 class Run(Base):
     __tablename__ = "runs"
+    __table_args__ = (
+        # Keyset pagination of a crew's history: (crew_id, created_at DESC, id DESC)
+        Index("ix_runs_crew_created", "crew_id", "created_at", "id"),
+        Index("ix_runs_batch", "batch_id", "batch_index"),
+    )
 
     id = Column(String, primary_key=True, default=generate_uuid)
     crew_id = Column(String, ForeignKey("crews.id", ondelete="CASCADE"), nullable=False)
     status = Column(String(20), default="pending")  # pending | running | completed | failed
     result = Column(Text, default="")
     logs = Column(Text, default="[]")
+    log_seq = Column(Integer, default=0)  # number of log entries, bumped by add_log
+    # Set when result/logs were offloaded to the blob store (see utils/blob_store.py)
+    result_hash = Column(String(64), nullable=True)
+    result_size = Column(Integer, default=0)
+    result_preview = Column(Text, default="")
+    logs_hash = Column(String(64), nullable=True)
+    logs_size = Column(Integer, default=0)
+    # Span timeline JSON (see core/tracing.py); deferred so normal run loads skip it
+    trace = deferred(Column(Text, nullable=True))
+    # Input parameters (JSON object) referenced as {{name}} in task texts
+    inputs = Column(Text, nullable=True)
+    # Set for runs started by a batch (POST /api/crews/{id}/batches)
+    batch_id = Column(String, nullable=True)
+    batch_index = Column(Integer, nullable=True)
+    # Prompt cache counters of this run (JSON, see core/semantic_cache.py)
+    cache_stats = Column(Text, nullable=True)
+    # full | changed (reuse the outputs of tasks whose fingerprint did not change)
+    mode = Column(String(20), default="full")
+    # Output and fingerprint of each finished task (JSON, see core/fingerprints.py); read by `changed` runs
+    task_outputs = deferred(Column(Text, nullable=True))
+    # Set to ask the worker executing the run to stop it (see Orchestrator.request_stop)
+    cancel_requested_at = Column(DateTime, nullable=True)
     tokens_used = Column(Float, default=0)
     cost = Column(Float, default=0)
     started_at = Column(DateTime, nullable=True)
@@ -107,6 +159,42 @@ class Run(Base):
             "message": message,
         })
         self.logs = json.dumps(current_logs)
+        self.log_seq = (self.log_seq or 0) + 1
+
+
+class IdempotencyKey(Base):
+    """Client-supplied `Idempotency-Key` mapped to the run it created."""
+    __tablename__ = "idempotency_keys"
+
+    scope = Column(String(200), primary_key=True)  # endpoint + crew, e.g. "runs:<crew_id>"
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    run_id = Column(String, nullable=True)  # NULL while the first request is still in progress
+    created_at = Column(DateTime, default=utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class SemanticCacheEntry(Base):
+    """A completion and the embedding of the prompt that produced it."""
+    __tablename__ = "semantic_cache_entries"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    crew_id = Column(String, ForeignKey("crews.id", ondelete="CASCADE"), nullable=False)
+    # sha256 of model + system prompt: only prompts for the same model and agent are compared
+    namespace = Column(String(64), nullable=False, index=True)
+    embedding = Column(LargeBinary, nullable=False)  # float32, L2-normalized
+    completion = Column(Text, nullable=False)
+    tokens = Column(Integer, default=0)
+    created_at = Column(DateTime, default=utcnow, index=True)
+
+
+class SchedulerLease(Base):
+    """Leader lease: only the worker holding it runs scheduled jobs."""
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String(50), primary_key=True)
+    holder = Column(String(200), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
 
 
 class LLMConfig(Base):
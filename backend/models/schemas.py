@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
+import json
+from pydantic import BaseModel, Field, field_validator
+from typing import Any, Optional, List
 from datetime import datetime
 
 
@@ -19,6 +20,8 @@ class AgentCreate(BaseModel):
     is_manager: bool = False
     task_description: Optional[str] = None
     task_expected_output: Optional[str] = None
+    web_search_enabled: bool = False
+    tool_mode: str = "prefetch"  # prefetch | function_calling
 
 
 class AgentUpdate(BaseModel):
@@ -35,6 +38,8 @@ class AgentUpdate(BaseModel):
     is_manager: Optional[bool] = None
     task_description: Optional[str] = None
     task_expected_output: Optional[str] = None
+    web_search_enabled: Optional[bool] = None
+    tool_mode: Optional[str] = None
 
 
 class AgentResponse(BaseModel):
@@ -53,6 +58,8 @@ class AgentResponse(BaseModel):
     is_manager: bool
     task_description: Optional[str]
     task_expected_output: Optional[str]
+    web_search_enabled: Optional[bool] = False
+    tool_mode: Optional[str] = "prefetch"
     created_at: datetime
 
     class Config:
@@ -67,6 +74,12 @@ class TaskCreate(BaseModel):
     expected_output: str = ""
     agent_id: Optional[str] = None
     order: int = 0
+    kind: str = "single"  # single | map_reduce
+    map_source: str = "auto"  # auto | skills | previous | json
+    map_input: Optional[str] = None
+    map_concurrency: Optional[int] = None
+    map_retries: Optional[int] = None
+    reduce_batch_size: Optional[int] = None
     position_x: float = 200
     position_y: float = 0
 
@@ -77,6 +90,12 @@ class TaskUpdate(BaseModel):
     expected_output: Optional[str] = None
     agent_id: Optional[str] = None
     order: Optional[int] = None
+    kind: Optional[str] = None
+    map_source: Optional[str] = None
+    map_input: Optional[str] = None
+    map_concurrency: Optional[int] = None
+    map_retries: Optional[int] = None
+    reduce_batch_size: Optional[int] = None
     position_x: Optional[float] = None
     position_y: Optional[float] = None
 
@@ -89,6 +108,12 @@ class TaskResponse(BaseModel):
     description: str
     expected_output: str
     order: float
+    kind: Optional[str] = "single"
+    map_source: Optional[str] = "auto"
+    map_input: Optional[str] = None
+    map_concurrency: Optional[int] = None
+    map_retries: Optional[int] = None
+    reduce_batch_size: Optional[int] = None
     position_x: float
     position_y: float
     created_at: datetime
@@ -105,8 +130,16 @@ class CrewCreate(BaseModel):
     process: str = "sequential"
     schedule_type: str = "none"
     schedule_value: Optional[str] = None
+    schedule_overlap: str = "skip"
     is_public: bool = False
     output_email: Optional[str] = None
+    retention_keep_last: Optional[int] = None
+    retention_days: Optional[int] = None
+    retention_failed_days: Optional[int] = None
+    semantic_cache_enabled: bool = False
+    semantic_cache_threshold: Optional[float] = Field(None, ge=0, le=1)
+    run_timeout_seconds: Optional[int] = Field(None, ge=0)
+    task_timeout_seconds: Optional[int] = Field(None, ge=0)
 
 
 class CrewUpdate(BaseModel):
@@ -115,8 +148,16 @@ class CrewUpdate(BaseModel):
     process: Optional[str] = None
     schedule_type: Optional[str] = None
     schedule_value: Optional[str] = None
+    schedule_overlap: Optional[str] = None
     is_public: Optional[bool] = None
     output_email: Optional[str] = None
+    retention_keep_last: Optional[int] = None
+    retention_days: Optional[int] = None
+    retention_failed_days: Optional[int] = None
+    semantic_cache_enabled: Optional[bool] = None
+    semantic_cache_threshold: Optional[float] = Field(None, ge=0, le=1)
+    run_timeout_seconds: Optional[int] = Field(None, ge=0)
+    task_timeout_seconds: Optional[int] = Field(None, ge=0)
     canvas_state: Optional[str] = None
 
 
@@ -127,9 +168,18 @@ class CrewResponse(BaseModel):
     process: str
     schedule_type: str
     schedule_value: Optional[str]
+    schedule_overlap: Optional[str] = "skip"
     is_public: bool
     output_email: Optional[str]
+    retention_keep_last: Optional[int] = None
+    retention_days: Optional[int] = None
+    retention_failed_days: Optional[int] = None
+    semantic_cache_enabled: Optional[bool] = False
+    semantic_cache_threshold: Optional[float] = None
+    run_timeout_seconds: Optional[int] = None
+    task_timeout_seconds: Optional[int] = None
     canvas_state: str
+    version: int = 1
     agents: List[AgentResponse] = []
     tasks: List[TaskResponse] = []
     created_at: datetime
@@ -146,18 +196,113 @@ class CrewListResponse(BaseModel):
     process: str
     agent_count: int = 0
     task_count: int = 0
+    last_run_status: Optional[str] = None
+    last_run_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
 
 
+class CrewPageResponse(BaseModel):
+    items: List[CrewListResponse] = []
+    next_cursor: Optional[str] = None
+
+
+# ─── Bulk Graph Save ───
+
+class AgentUpsert(AgentUpdate):
+    # Unknown ids (e.g. temporary ids minted by the editor) create a new agent
+    id: Optional[str] = None
+
+
+class TaskUpsert(TaskUpdate):
+    id: Optional[str] = None
+
+
+class GraphPatchOp(BaseModel):
+    """JSON-patch-style operation. Paths: `/crew/<field>`, `/agents/<id>`,
+    `/agents/<id>/<field>`, `/tasks/<id>`, `/tasks/<id>/<field>`."""
+    op: str  # add | replace | remove
+    path: str
+    value: Optional[Any] = None
+
+
+class CrewGraphSave(BaseModel):
+    base_version: int
+    crew: Optional[CrewUpdate] = None
+    agents: List[AgentUpsert] = []
+    tasks: List[TaskUpsert] = []
+    deleted_agent_ids: List[str] = []
+    deleted_task_ids: List[str] = []
+    patch: List[GraphPatchOp] = []
+
+
+class CrewGraphSaveResponse(BaseModel):
+    version: int
+    crew: Optional[dict] = None  # only the crew fields that changed
+    agents: List[AgentResponse] = []
+    tasks: List[TaskResponse] = []
+    deleted_agent_ids: List[str] = []
+    deleted_task_ids: List[str] = []
+    id_map: dict[str, str] = {}  # client id -> server id for created rows
+
+
 # ─── Run Schemas ───
 
-class RunResponse(BaseModel):
+class RunCreate(BaseModel):
+    # Referenced as {{name}} in task names, descriptions and expected outputs
+    inputs: Optional[dict[str, Any]] = None
+    # "changed": reuse the outputs of earlier runs for tasks whose fingerprint did not change
+    mode: str = "full"  # full | changed
+
+
+class RunBase(BaseModel):
     id: str
     crew_id: str
     status: str
     result: str
-    logs: str
+    result_size: Optional[int] = 0
+    # True when `result` is only the preview of an offloaded result (full text at .../result)
+    result_truncated: bool = False
+    inputs: Optional[dict[str, Any]] = None
+    batch_id: Optional[str] = None
+    mode: Optional[str] = "full"
+    cache_stats: Optional[dict[str, Any]] = None
+    tokens_used: float
+    cost: float
+    started_at: Optional[datetime]
+    completed_at: Optional[datetime]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+    @field_validator("inputs", "cache_stats", mode="before")
+    @classmethod
+    def parse_inputs(cls, value):
+        if isinstance(value, str):
+            return json.loads(value) if value else None
+        return value
+
+
+class RunResponse(RunBase):
+    # Stored as a JSON string on the row; returned as a native list of entries
+    logs: List[dict[str, Any]] = []
+
+    @field_validator("logs", mode="before")
+    @classmethod
+    def parse_logs(cls, value):
+        if isinstance(value, str):
+            return json.loads(value or "[]")
+        return value
+
+
+class RunSummaryResponse(BaseModel):
+    """Run row without the heavy `result` / `logs` columns (used for listings)."""
+    id: str
+    crew_id: str
+    status: str
+    result_preview: Optional[str] = ""
+    result_size: Optional[int] = 0
     tokens_used: float
     cost: float
     started_at: Optional[datetime]
@@ -168,6 +313,11 @@ class RunResponse(BaseModel):
         from_attributes = True
 
 
+class RunPageResponse(BaseModel):
+    items: List[RunSummaryResponse] = []
+    next_cursor: Optional[str] = None
+
+
 # ─── Config Schemas ───
 
 class LLMConfigBase(BaseModel):
@@ -195,6 +345,10 @@ class LLMConfigResponse(LLMConfigBase):
         from_attributes = True
 
 
+class ArchiveImportRequest(BaseModel):
+    file: str
+
+
 class MCPServerBase(BaseModel):
     name: str
     command: str
@@ -216,3 +370,22 @@ class MCPServerResponse(MCPServerBase):
 
     class Config:
         from_attributes = True
+
+
+# ─── Batch Schemas ───
+
+class BatchCreate(BaseModel):
+    inputs: List[dict[str, Any]]
+    concurrency: Optional[int] = Field(None, ge=1)
+
+
+class BatchStatusResponse(BaseModel):
+    batch_id: str
+    crew_id: str
+    total: int
+    pending: int
+    running: int
+    completed: int
+    failed: int
+    timeout: int = 0
+    active: bool
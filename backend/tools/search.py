@@ -1,13 +1,20 @@
-from duckduckgo_search import DDGS
+import asyncio
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 
-async def search_web(query: str, max_results: int = 5) -> str:
+async def search_web(query: str, max_results: int = 5, timeout: float = 10.0) -> str:
     """Perform a web search using DuckDuckGo and return summarized results."""
     try:
+        from duckduckgo_search import DDGS
+
         logger.info(f"🔎 Buscando en web: {query}")
-        results = DDGS().text(query, max_results=max_results)
+        # DDGS is blocking: run it in a thread so the event loop (and deadlines) keep going
+        ddgs = DDGS(timeout=max(1, math.ceil(timeout)))
+        results = await asyncio.wait_for(
+            asyncio.to_thread(ddgs.text, query, max_results=max_results), timeout
+        )
         
         if not results:
             return "No se encontraron resultados en la web."
@@ -0,0 +1,151 @@
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+import zlib
+from typing import Iterator
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_CHARS = 500
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobStore:
+    """Content-addressed, gzip-compressed blobs on local disk.
+
+    Blobs live at `<root>/<sha[:2]>/<sha>.gz`, so identical payloads (e.g. the same
+    report produced by two scheduled runs) are written once and shared.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}.gz")
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path_for(digest))
+
+    def put(self, data: bytes) -> str:
+        """Store `data` and return its sha256 hex digest. Only touches the file if already stored."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            try:
+                # Fresh mtime: orphan GC spares young blobs, and this one is about to be referenced again
+                os.utime(path)
+                return digest
+            except FileNotFoundError:
+                pass  # collected in between: write it again
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+                gz.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest
+
+    def open_stream(self, digest: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield the decompressed blob in chunks without loading it all in memory."""
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        with open(self.path_for(digest), "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                data = decompressor.decompress(chunk)
+                if data:
+                    yield data
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+    def get(self, digest: str) -> bytes:
+        return b"".join(self.open_stream(digest))
+
+    def delete(self, digest: str) -> int:
+        """Remove a blob, returning the bytes freed on disk."""
+        path = self.path_for(digest)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except FileNotFoundError:
+            return 0
+
+
+blob_store = BlobStore(settings.BLOB_STORE_PATH)
+
+
+def offload_run_payloads(run) -> None:
+    """Move a finished run's `result` and `logs` to the blob store when they exceed
+    `settings.BLOB_INLINE_MAX_BYTES`. Small payloads stay inline in the row.
+
+    Always refreshes `result_size` / `result_preview` so listings can show them
+    without touching the heavy columns.
+    """
+    result = run.result or ""
+    result_bytes = result.encode("utf-8")
+    run.result_size = len(result_bytes)
+    run.result_preview = result[:PREVIEW_CHARS]
+    if len(result_bytes) > settings.BLOB_INLINE_MAX_BYTES:
+        run.result_hash = blob_store.put(result_bytes)
+        run.result = ""
+
+    logs_bytes = (run.logs or "[]").encode("utf-8")
+    if len(logs_bytes) > settings.BLOB_INLINE_MAX_BYTES:
+        run.logs_hash = blob_store.put(logs_bytes)
+        run.logs_size = len(logs_bytes)
+        run.logs = "[]"
+
+
+async def offload_run_payloads_async(run) -> None:
+    """`offload_run_payloads` in a worker thread: hashing, gzip and the write would stall the event loop."""
+    await asyncio.to_thread(offload_run_payloads, run)
+
+
+def read_run_result(run) -> str:
+    """Full result text, whether inline or offloaded."""
+    if run.result_hash:
+        return _read_blob_text(run.result_hash, run.result_preview or "")
+    return run.result or ""
+
+
+def read_run_logs(run) -> str:
+    """Full logs JSON string, whether inline or offloaded."""
+    if run.logs_hash:
+        return _read_blob_text(run.logs_hash, "[]")
+    return run.logs or "[]"
+
+
+async def read_run_result_async(run) -> str:
+    """`read_run_result` with the blob read and inflated in a worker thread."""
+    if run.result_hash:
+        return await asyncio.to_thread(_read_blob_text, run.result_hash, run.result_preview or "")
+    return run.result or ""
+
+
+async def read_run_logs_async(run) -> str:
+    """`read_run_logs` with the blob read and inflated in a worker thread."""
+    if run.logs_hash:
+        return await asyncio.to_thread(_read_blob_text, run.logs_hash, "[]")
+    return run.logs or "[]"
+
+
+def _read_blob_text(digest: str, fallback: str) -> str:
+    try:
+        return blob_store.get(digest).decode("utf-8")
+    except FileNotFoundError:
+        logger.error(f"Blob {digest} is missing from {blob_store.root}")
+        return fallback
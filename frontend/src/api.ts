@@ -24,6 +24,7 @@ export interface Agent {
     task_description?: string
     task_expected_output?: string
     web_search_enabled?: boolean
+    tool_mode?: 'prefetch' | 'function_calling'
     created_at: string
 }
 
@@ -35,6 +36,12 @@ export interface Task {
     description: string
     expected_output: string
     order: number
+    kind: 'single' | 'map_reduce'
+    map_source: 'auto' | 'skills' | 'previous' | 'json'
+    map_input: string | null
+    map_concurrency: number | null
+    map_retries: number | null
+    reduce_batch_size: number | null
     position_x: number
     position_y: number
     created_at: string
@@ -47,15 +54,50 @@ export interface Crew {
     process: string
     schedule_type: string
     schedule_value: string | null
+    schedule_overlap?: string
     is_public: boolean
     output_email?: string
+    retention_keep_last?: number | null
+    retention_days?: number | null
+    retention_failed_days?: number | null
+    semantic_cache_enabled?: boolean
+    semantic_cache_threshold?: number | null
+    run_timeout_seconds?: number | null
+    task_timeout_seconds?: number | null
     canvas_state: string
+    version: number
     agents: Agent[]
     tasks: Task[]
     created_at: string
     updated_at: string
 }
 
+export interface GraphPatchOp {
+    op: 'add' | 'replace' | 'remove'
+    path: string
+    value?: any
+}
+
+export interface CrewGraphSave {
+    base_version: number
+    crew?: Partial<Crew>
+    agents?: (Partial<Agent> & { id?: string })[]
+    tasks?: (Partial<Task> & { id?: string })[]
+    deleted_agent_ids?: string[]
+    deleted_task_ids?: string[]
+    patch?: GraphPatchOp[]
+}
+
+export interface CrewGraphSaveResult {
+    version: number
+    crew: Partial<Crew> | null
+    agents: Agent[]
+    tasks: Task[]
+    deleted_agent_ids: string[]
+    deleted_task_ids: string[]
+    id_map: Record<string, string>
+}
+
 export interface CrewListItem {
     id: string
     name: string
@@ -63,16 +105,58 @@ export interface CrewListItem {
     process: string
     agent_count: number
     task_count: number
+    last_run_status: string | null
+    last_run_at: string | null
     created_at: string
     updated_at: string
 }
 
+export interface CrewPage {
+    items: CrewListItem[]
+    next_cursor: string | null
+}
+
+export interface CrewListParams {
+    limit?: number
+    cursor?: string
+    q?: string
+}
+
 export interface Run {
     id: string
     crew_id: string
     status: string
     result: string
-    logs: string
+    logs: LogEntry[]
+    result_size?: number
+    // `result` is only a preview of a large result; runsApi.result() has the full text
+    result_truncated?: boolean
+    inputs?: Record<string, any> | null
+    batch_id?: string | null
+    mode?: 'full' | 'changed'
+    cache_stats?: {
+        reuse?: { reused: number; executed: number; saved_tokens: number; tasks: string[] }
+        semantic?: { hits: number; misses: number; saved_tokens: number; max_similarity: number | null; mean_similarity: number | null }
+        prompt?: {
+            prompt_tokens: number
+            cached_tokens: number
+            cache_write_tokens: number
+            tasks: { task: string; calls: number; prompt_tokens: number; cached_tokens: number; cache_write_tokens: number }[]
+        }
+    } | null
+    tokens_used: number
+    cost: number
+    started_at: string | null
+    completed_at: string | null
+    created_at: string
+}
+
+export interface RunSummary {
+    id: string
+    crew_id: string
+    status: string
+    result_preview: string
+    result_size: number
     tokens_used: number
     cost: number
     started_at: string | null
@@ -80,6 +164,19 @@ export interface Run {
     created_at: string
 }
 
+export interface RunPage {
+    items: RunSummary[]
+    next_cursor: string | null
+}
+
+export interface RunListParams {
+    limit?: number
+    cursor?: string
+    status?: string
+    created_after?: string
+    created_before?: string
+}
+
 export interface LogEntry {
     timestamp: string
     agent: string
@@ -109,13 +206,16 @@ export interface MCPServer {
 // ─── API Functions ───
 
 export const crewsApi = {
-    list: () => api.get<CrewListItem[]>('/crews').then(r => r.data),
+    list: (params: CrewListParams = {}) =>
+        api.get<CrewPage>('/crews', { params }).then(r => r.data),
     get: (id: string) => api.get<Crew>(`/crews/${id}`).then(r => r.data),
     create: (data: { name: string; description?: string; process?: string }) =>
         api.post<Crew>('/crews', data).then(r => r.data),
     update: (id: string, data: Partial<Crew>) =>
         api.put<Crew>(`/crews/${id}`, data).then(r => r.data),
     delete: (id: string) => api.delete(`/crews/${id}`),
+    saveGraph: (id: string, data: CrewGraphSave) =>
+        api.put<CrewGraphSaveResult>(`/crews/${id}/graph`, data).then(r => r.data),
 }
 
 export const agentsApi = {
@@ -137,18 +237,49 @@ export const tasksApi = {
 }
 
 export const runsApi = {
-    list: (crewId: string) =>
-        api.get<Run[]>(`/crews/${crewId}/runs`).then(r => r.data),
-    start: (crewId: string) =>
-        api.post<Run>(`/crews/${crewId}/runs`).then(r => r.data),
+    list: (crewId: string, params: RunListParams = {}) =>
+        api.get<RunPage>(`/crews/${crewId}/runs`, { params }).then(r => r.data),
+    // `inputs` fill the {{name}} placeholders of the task texts; mode 'changed' reuses unchanged tasks
+    start: (crewId: string, inputs?: Record<string, any>, mode: 'full' | 'changed' = 'full') =>
+        api.post<Run>(`/crews/${crewId}/runs`, inputs || mode !== 'full' ? { inputs, mode } : undefined).then(r => r.data),
     async get(crewId: string, runId: string): Promise<Run> {
         const res = await api.get(`/crews/${crewId}/runs/${runId}`)
         return res.data
     },
+    // Full result text (streamed by the server for large results)
+    result: (crewId: string, runId: string) =>
+        api.get<string>(`/crews/${crewId}/runs/${runId}/result`, { responseType: 'text' }).then(r => r.data),
     async stop(crewId: string, runId: string): Promise<any> {
         const res = await api.post(`/crews/${crewId}/runs/${runId}/stop`)
         return res.data
-    }
+    },
+    // Chrome trace-event JSON (open in ui.perfetto.dev)
+    trace: (crewId: string, runId: string) =>
+        api.get<{ traceEvents: any[] }>(`/crews/${crewId}/runs/${runId}/trace`).then(r => r.data),
+}
+
+export interface BatchStatus {
+    batch_id: string
+    crew_id: string
+    total: number
+    pending: number
+    running: number
+    completed: number
+    failed: number
+    timeout: number
+    active: boolean
+}
+
+export const batchesApi = {
+    // Without streaming: 202 with the batch id; follow progress with `get`
+    start: (crewId: string, inputs: Record<string, any>[], concurrency?: number) =>
+        api.post<{ batch_id: string; total: number; concurrency: number }>(
+            `/crews/${crewId}/batches`, { inputs, concurrency }, { params: { stream: false } },
+        ).then(r => r.data),
+    get: (crewId: string, batchId: string) =>
+        api.get<BatchStatus>(`/crews/${crewId}/batches/${batchId}`).then(r => r.data),
+    stop: (crewId: string, batchId: string) =>
+        api.post(`/crews/${crewId}/batches/${batchId}/stop`).then(r => r.data),
 }
 
 export const configApi = {
@@ -161,6 +292,7 @@ export const configApi = {
     createMcp: (data: Partial<MCPServer>) => api.post<MCPServer>('/config/mcp', data).then(r => r.data),
     updateMcp: (id: string, data: Partial<MCPServer>) => api.put<MCPServer>(`/config/mcp/${id}`, data).then(r => r.data),
     deleteMcp: (id: string) => api.delete(`/config/mcp/${id}`),
+    mcpTools: (id: string) => api.get<{ name: string; description?: string }[]>(`/config/mcp/${id}/tools`).then(r => r.data),
 }
 
 export const llmApi = {